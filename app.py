@@ -19,18 +19,33 @@ from source.app.routes.cross_exam import router as cross_exam_router
 from source.app.routes.auth import router as sign_up_router
 from source.app.routes.auth import router as login_router
 from source.app.routes.auth import router as logout_router
+from source.app.routes.system import router as system_router
+from source.app.routes.metrics import router as metrics_router
+from source.app.routes.jobs import router as jobs_router
 from fastapi.middleware.cors import CORSMiddleware
 from source.app.database import Base, engine
+from source.app.services.call_ollama import init_ollama_client, close_ollama_client
+from source.app.services.metrics import MetricsMiddleware, mark_worker_dead
+from source.app.services.warmup import start_warmup, stop_warmup
+from source.app.services.jobs import start_job_workers, stop_job_workers
+from source.app.services.tracing import TracingMiddleware, TRACE_HEADER
 from contextlib import asynccontextmanager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Lifespan event handler to create database tables on startup."""
+    """Lifespan event handler to create database tables, the Ollama client pool and start warm-up."""
     print("Creating tables...")
     Base.metadata.create_all(bind=engine)
     print("Tables created.")
+    await init_ollama_client()
+    start_warmup()  # Runs in the background; /api/system/ready reports when it is done
+    start_job_workers()
     yield  # Application runs after this point
+    await stop_job_workers()
+    await stop_warmup()
+    await close_ollama_client()
+    mark_worker_dead()
 
 # Create FastAPI app
 app = FastAPI(
@@ -60,7 +75,13 @@ app.add_middleware(
     allow_origins=origins,  # ✅ Must specify exact domain
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"],)
+    allow_headers=["*"],
+    expose_headers=[TRACE_HEADER],)
+
+# Added last so they wrap everything: request durations include CORS handling, and the
+# route label and trace are set for all the work below. Tracing is outermost.
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # API Routes
 @app.get("/")
@@ -88,6 +109,9 @@ app.include_router(cross_exam_router, prefix="/api/cross-exam")
 app.include_router(sign_up_router, prefix="/api/auth")
 app.include_router(login_router, prefix="/api/auth")
 app.include_router(logout_router, prefix="/api/auth")
+app.include_router(system_router, prefix="/api/system")
+app.include_router(jobs_router, prefix="/api/jobs")
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,403 @@
+"""
+End-to-end load test for every router registered in app.py.
+
+Drives each endpoint with synthetic PDFs at a fixed concurrency and reports latency
+percentiles, throughput, error counts and server RSS per endpoint as JSON, so runs
+can be diffed between releases.
+
+    # start the mock Ollama and the app, run every scenario, write the report
+    python benchmarks/load_test.py --spawn --concurrency 8 --requests 40 --output bench.json
+
+    # against an already running server (pass its pid to get RSS figures)
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --server-pid 1234 --only summary,query
+
+With --spawn the app talks to benchmarks/mock_ollama.py, so results measure this
+backend (extraction, indexing, formatting, queueing) rather than a model. The
+remaining settings (.env or environment) are inherited by the spawned app.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import fitz
+import httpx
+from dotenv import load_dotenv
+
+ROOT = Path(__file__).resolve().parent.parent
+load_dotenv(ROOT / ".env")
+
+CASE_HEADER = [
+    "IN THE HIGH COURT OF JUDICATURE AT BOMBAY",
+    "CIVIL APPEAL NO. {n} OF 2023",
+    "Ramesh Kumar ... APPELLANT",
+    "VERSUS",
+    "State of Maharashtra ... RESPONDENT",
+    "HON'BLE MR. JUSTICE A. B. SHARMA",
+    "DATE OF JUDGMENT: 12.03.2024",
+]
+
+CLAUSES = [
+    "The Vendor hereby conveys the property described in the Schedule to the Vendee.",
+    "The sale consideration of Rs. {amount} has been paid in full by the Vendee.",
+    "The Vendor assures that the property is free from all encumbrances and claims.",
+    "The Respondent contended that the agreement was not registered under the Registration Act, 1908.",
+    "The Appellant relied on Section 53A of the Transfer of Property Act, 1882.",
+    "Possession of the property shall be handed over on the date of registration.",
+    "Any dispute arising out of this deed shall be subject to the jurisdiction of the courts at Mumbai.",
+    "The Court finds that the evidence on record does not support the claim of adverse possession.",
+    "The lessee shall pay a monthly rent of Rs. {amount} on or before the fifth day of each month.",
+    "The ORDER of the trial court is set aside and the DECREE is modified accordingly.",
+]
+
+def make_pdf(pages: int, seed: int = 0, revision: int = 0) -> bytes:
+    """A legal-looking PDF (reads as a case file). `revision` rewrites some lines, for diff endpoints."""
+    rng = random.Random(seed)
+    document = fitz.open()
+    for page_number in range(pages):
+        page = document.new_page()
+        lines = [line.format(n=seed + 1) for line in CASE_HEADER] if page_number == 0 else []
+        while len(lines) < 45:
+            line = rng.choice(CLAUSES).format(amount=rng.randint(1, 99) * 100000)
+            if revision and rng.random() < 0.15:
+                line = line.replace("shall", "may").replace("full", "part")
+            lines.append(f"{len(lines) + 1}. {line}")
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), "\n".join(lines), fontsize=8)
+    data = document.tobytes()
+    document.close()
+    return data
+
+class Scenario:
+    """One endpoint under test. `build(context, i)` returns the httpx request kwargs for request i."""
+
+    def __init__(self, name: str, method: str, path: str, build: Callable[[Dict, int], Dict],
+                 setup: Optional[Callable] = None, sse: bool = False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.build = build
+        self.setup = setup
+        self.sse = sse
+
+def _pdf_file(context: Dict, field: str = "file", key: str = "pdf") -> Dict:
+    return {field: (f"bench_{uuid.uuid4().hex[:8]}.pdf", context[key], "application/pdf")}
+
+async def _start_court_session(client: httpx.AsyncClient, context: Dict):
+    response = await client.post(
+        "/api/custom-ai-proceedings/start_custom_ai_proceedings",
+        files=_pdf_file(context),
+        data={"user_role": "Plaintiff Attorney", "court": "civil"},
+    )
+    context["court_session_id"] = response.json().get("session_id", str(uuid.uuid4()))
+
+async def _start_document_chat(client: httpx.AsyncClient, context: Dict):
+    response = await client.post(
+        "/api/legal-bot/legal_bot",
+        files=_pdf_file(context),
+        data={"question": "What is this document about?", "with_file": "true"},
+    )
+    context["chat_session_id"] = response.json().get("session_id", str(uuid.uuid4()))
+
+def build_scenarios() -> List[Scenario]:
+    query = {"domain": "Property Sale & Purchase", "sub_domain": "Sale Deed", "prompt": "Draft a sale deed."}
+    return [
+        Scenario("draft_document", "GET", "/api/legal-draft/draft_document", lambda c, i: {}),
+        Scenario("query", "POST", "/api/query-process/query", lambda c, i: {"json": query}),
+        Scenario("query_stream", "POST", "/api/query-process/query?stream=true", lambda c, i: {"json": query}, sse=True),
+        Scenario("summary", "POST", "/api/summary/summarize_file",
+                 lambda c, i: {"files": _pdf_file(c), "data": {"analysis_type": "summary"}}),
+        Scenario("summary_stream", "POST", "/api/summary/summarize_file?stream=true",
+                 lambda c, i: {"files": _pdf_file(c), "data": {"analysis_type": "summary"}}, sse=True),
+        Scenario("summary_long", "POST", "/api/summary/summarize_file",
+                 lambda c, i: {"files": _pdf_file(c, key="long_pdf"), "data": {"analysis_type": "legal_analysis"}}),
+        Scenario("custom_doc", "POST", "/api/custom-doc/generate_custom_draft",
+                 lambda c, i: {"data": {"document_type": "Rental Agreement", "input_text": f"Tenant number {i}, rent Rs. 25,000"}}),
+        Scenario("compare_documents", "POST", "/api/compare-doc/compare_documents",
+                 lambda c, i: {"files": {**_pdf_file(c, "file1"), **_pdf_file(c, "file2", "revised_pdf")}}),
+        Scenario("redline_highlight", "POST", "/api/redline-analysis/redline_analysis",
+                 lambda c, i: {"files": {**_pdf_file(c, "file1"), **_pdf_file(c, "file2", "revised_pdf")}, "data": {"deep_search": "false"}}),
+        Scenario("redline_deep_search", "POST", "/api/redline-analysis/redline_analysis",
+                 lambda c, i: {"files": {**_pdf_file(c, "file1"), **_pdf_file(c, "file2", "revised_pdf")}, "data": {"deep_search": "true"}}),
+        Scenario("legal_bot_general", "POST", "/api/legal-bot/legal_bot",
+                 lambda c, i: {"data": {"question": f"What is adverse possession? ({i})", "session_id": str(uuid.uuid4())}}),
+        Scenario("legal_bot_upload", "POST", "/api/legal-bot/legal_bot",
+                 lambda c, i: {"files": _pdf_file(c), "data": {"question": "Summarize the dispute.", "with_file": "true", "session_id": str(uuid.uuid4())}}),
+        Scenario("legal_bot_document_chat", "POST", "/api/legal-bot/legal_bot",
+                 lambda c, i: {"data": {"question": f"Who is the respondent? ({i})", "with_file": "true", "session_id": c["chat_session_id"]}},
+                 setup=_start_document_chat),
+        Scenario("legal_bot_stream", "POST", "/api/legal-bot/legal_bot/stream",
+                 lambda c, i: {"data": {"question": f"Explain specific performance. ({i})", "session_id": str(uuid.uuid4())}}, sse=True),
+        Scenario("legal_bot_faq", "POST", "/api/legal-bot/legal_bot/faq", lambda c, i: {"files": _pdf_file(c)}),
+        Scenario("get_session_id", "GET", "/api/legal-bot/legal_bot/get_session_id", lambda c, i: {}),
+        Scenario("clear_history", "DELETE", "/api/legal-bot/legal_bot/clear_history",
+                 lambda c, i: {"data": {"session_id": str(uuid.uuid4()), "with_file": "false"}}),
+        Scenario("ai_proceedings", "POST", "/api/ai-proceedings/ai_proceedings",
+                 lambda c, i: {"files": _pdf_file(c), "data": {"court": "civil"}}),
+        Scenario("custom_ai_proceedings_start", "POST", "/api/custom-ai-proceedings/start_custom_ai_proceedings",
+                 lambda c, i: {"files": _pdf_file(c), "data": {"user_role": "Plaintiff Attorney", "court": "civil"}}),
+        Scenario("custom_ai_proceedings_input", "POST", "/api/user-input-custom-ai/start_custom_ai_proceedings/input_custom_ai_proceedings",
+                 lambda c, i: {"data": {"user_role": "Plaintiff Attorney", "message": f"My Lord, exhibit {i} shows payment.", "session_id": c["court_session_id"]}},
+                 setup=_start_court_session),
+        Scenario("custom_ai_proceedings_conclude", "POST", "/api/conclude-custom-ai-proceedings/conclude_custom_ai_proceedings",
+                 lambda c, i: {"data": {"session_id": c["court_session_id"]}}, setup=_start_court_session),
+        Scenario("upload_drafts", "POST", "/api/upload-drafts/upload_drafts/",
+                 lambda c, i: {"files": _pdf_file(c), "data": {"domain": "bench", "file_name": f"draft_{i}.pdf"}}),
+        Scenario("list_drafts", "GET", "/api/upload-drafts/list_drafts/", lambda c, i: {}),
+        Scenario("save_draft", "POST", "/api/save-drafts/save_draft",
+                 lambda c, i: {"files": {"draft_content": ("draft.html", b"<p>Draft</p>", "text/html")}, "data": {"domain_name": "bench", "is_new_domain": "true"}}),
+        Scenario("cross_exam", "POST", "/api/cross-exam/cross_exam",
+                 lambda c, i: {"files": _pdf_file(c), "data": {"interviewer": "Defence Counsel", "interviewee": "Witness"}}),
+        Scenario("auth_signup", "POST", "/api/auth/signup",
+                 lambda c, i: {"json": {"username": f"bench_{c['run_id']}_{i}", "mail_id": f"bench_{c['run_id']}_{i}@example.com",
+                                        "password": "bench-password", "first_name": "Bench"}}),
+        Scenario("auth_login", "POST", "/api/auth/login",
+                 lambda c, i: {"json": {"identifier": f"bench_{c['run_id']}_{i}", "password": "bench-password"}}),
+        Scenario("auth_logout", "POST", "/api/auth/logout", lambda c, i: {}),
+        Scenario("system_llm_cache_stats", "GET", "/api/system/llm_cache/stats", lambda c, i: {}),
+        Scenario("system_scheduler_stats", "GET", "/api/system/scheduler/stats", lambda c, i: {}),
+        Scenario("system_backends_stats", "GET", "/api/system/backends/stats", lambda c, i: {}),
+    ]
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """RSS of a process and all its descendants (uvicorn workers), read from /proc."""
+    total, pending, seen = 0, [pid], set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            if current == pid:
+                return None
+    return total
+
+async def _sample_rss(pid: Optional[int], samples: List[int], stop: asyncio.Event):
+    while pid and not stop.is_set():
+        rss = _rss_bytes(pid)
+        if rss is not None:
+            samples.append(rss)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.05)
+        except asyncio.TimeoutError:
+            pass
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return round(ordered[index] * 1000, 2)
+
+def _is_error(status_code: int, body: bytes) -> bool:
+    """Most routes report failures as a 200 with an `error` key, so the body is checked too."""
+    if status_code >= 400:
+        return True
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return b"event: error" in body
+    return isinstance(data, dict) and "error" in data
+
+async def _send(client: httpx.AsyncClient, scenario: Scenario, kwargs: Dict) -> Dict:
+    started = time.perf_counter()
+    first_event = None
+    try:
+        async with client.stream(scenario.method, scenario.path, **kwargs) as response:
+            body = b""
+            async for chunk in response.aiter_bytes():
+                if scenario.sse and first_event is None and b"data:" in chunk:
+                    first_event = time.perf_counter() - started
+                body += chunk
+        return {"latency": time.perf_counter() - started, "first_event": first_event,
+                "error": _is_error(response.status_code, body), "status": response.status_code}
+    except httpx.HTTPError as e:
+        return {"latency": time.perf_counter() - started, "first_event": None, "error": True, "status": type(e).__name__}
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, context: Dict, requests: int,
+                       concurrency: int, server_pid: Optional[int]) -> Dict:
+    if scenario.setup:
+        await scenario.setup(client, context)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int) -> Dict:
+        async with semaphore:
+            return await _send(client, scenario, scenario.build(context, i))
+
+    samples: List[int] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(server_pid, samples, stop))
+    rss_before = _rss_bytes(server_pid) if server_pid else None
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    rss_after = _rss_bytes(server_pid) if server_pid else None
+
+    latencies = [result["latency"] for result in results]
+    first_events = [result["first_event"] for result in results if result["first_event"] is not None]
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[str(result["status"])] = statuses.get(str(result["status"]), 0) + 1
+    report = {
+        "method": scenario.method,
+        "path": scenario.path,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for result in results if result["error"]),
+        "status_codes": statuses,
+        "latency_ms": {
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            "max": round(max(latencies) * 1000, 2) if latencies else None,
+        },
+        "throughput_rps": round(requests / elapsed, 3) if elapsed else None,
+        "rss_mb": {
+            "before": round(rss_before / 2**20, 1) if rss_before else None,
+            "peak": round(max(samples) / 2**20, 1) if samples else None,
+            "after": round(rss_after / 2**20, 1) if rss_after else None,
+        },
+    }
+    if scenario.sse:
+        report["first_event_ms"] = {"p50": _percentile(first_events, 50), "p95": _percentile(first_events, 95), "p99": _percentile(first_events, 99)}
+    return report
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _wait_until_up(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+async def _spawn(args) -> List[subprocess.Popen]:
+    """Starts the mock Ollama and the app (uvicorn) on free ports, pointing the app at the mock."""
+    mock_port, app_port = _free_port(), _free_port()
+    model = os.getenv("DEFAULT_MODEL") or "llama3"
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    mock = subprocess.Popen([
+        sys.executable, str(ROOT / "benchmarks" / "mock_ollama.py"), "--port", str(mock_port),
+        "--ttft", str(args.ttft), "--tokens-per-sec", str(args.tokens_per_sec),
+        "--response-tokens", str(args.response_tokens), "--error-rate", str(args.error_rate),
+        "--models", model if ":" in model else f"{model}:latest",
+    ])
+    env = {
+        **os.environ,
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{mock_port}",
+        "LLM_CACHE_ENABLED": "true" if args.cache else "false",
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite3"),
+    }
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=str(ROOT), env=env,
+    )
+    args.base_url = f"http://127.0.0.1:{app_port}"
+    args.server_pid = app.pid
+    await _wait_until_up(f"http://127.0.0.1:{mock_port}/api/version", 30)
+    await _wait_until_up(f"{args.base_url}/openapi.json", args.startup_timeout)
+    return [app, mock]
+
+async def main_async(args) -> Dict:
+    processes = await _spawn(args) if args.spawn else []
+    try:
+        context = {
+            "run_id": uuid.uuid4().hex[:8],
+            "pdf": make_pdf(args.pages, seed=1),
+            "revised_pdf": make_pdf(args.pages, seed=1, revision=1),
+            "long_pdf": make_pdf(args.pages * 10, seed=2),
+        }
+        scenarios = build_scenarios()
+        if args.only:
+            wanted = {name.strip() for name in args.only.split(",")}
+            scenarios = [scenario for scenario in scenarios if scenario.name in wanted]
+
+        report = {
+            "meta": {
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "base_url": args.base_url,
+                "requests_per_endpoint": args.requests,
+                "concurrency": args.concurrency,
+                "pdf_pages": args.pages,
+                "spawned": args.spawn,
+                "mock": {"ttft": args.ttft, "tokens_per_sec": args.tokens_per_sec,
+                         "response_tokens": args.response_tokens, "error_rate": args.error_rate} if args.spawn else None,
+            },
+            "endpoints": {},
+        }
+        timeout = httpx.Timeout(args.timeout, connect=10.0)
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout, limits=limits) as client:
+            for scenario in scenarios:
+                result = await run_scenario(client, scenario, context, args.requests, args.concurrency, args.server_pid)
+                report["endpoints"][scenario.name] = result
+                print(f"{scenario.name:32s} p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+                      f"rps={result['throughput_rps']} errors={result['errors']}", file=sys.stderr)
+        return report
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test for the legal assistant API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--server-pid", type=int, default=None, help="app process to report RSS for (set automatically with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="start the mock Ollama and the app instead of using --base-url")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when spawning")
+    parser.add_argument("--cache", action="store_true", help="leave the LLM response cache on when spawning")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=5, help="pages in the synthetic PDFs")
+    parser.add_argument("--only", default=None, help="comma-separated scenario names")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout in seconds")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--list", action="store_true", help="list scenario names and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for scenario in build_scenarios():
+            print(f"{scenario.name:32s} {scenario.method:6s} {scenario.path}")
+        return
+
+    report = asyncio.run(main_async(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Stand-in Ollama server for benchmarks and local development.
+
+Implements the parts of the Ollama API this backend uses: /api/generate and /api/chat
+(streaming and non-streaming), /api/tags, /api/embed (and the older /api/embeddings),
+/api/ps and /api/version. Generation timing and failures are configurable, so load
+tests measure this backend rather than a model.
+
+    python benchmarks/mock_ollama.py --port 11434 --ttft 0.3 --tokens-per-sec 40 --error-rate 0.01
+
+Point the backend at it with OLLAMA_BASE_URL=http://127.0.0.1:11434 (or list several
+mock instances, comma-separated, to exercise backend load balancing).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import struct
+import time
+from typing import AsyncIterator, Dict, List
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+settings = {
+    "ttft": 0.2,              # seconds before the first token
+    "tokens_per_sec": 50.0,   # generation speed after the first token
+    "response_tokens": 64,    # tokens per generated response
+    "error_rate": 0.0,        # fraction of requests answered with HTTP 500
+    "stream_error_rate": 0.0, # fraction of streams that fail with an error chunk midway
+    "embedding_dim": 384,
+    "models": ["llama3:latest", "nomic-embed-text:latest"],
+}
+
+WORDS = (
+    "the court held that agreement party clause deed property section act evidence "
+    "petitioner respondent appeal order judgment registration consideration possession "
+    "liability obligation tenant lessor buyer seller witness hearing decree"
+).split()
+
+app = FastAPI(title="Mock Ollama")
+
+def _response_tokens(prompt: str) -> List[str]:
+    """Canned tokens shaped like what the calling prompt asks for (JSON, proceedings lines or prose)."""
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    count = settings["response_tokens"]
+    if "JSON array" in prompt:
+        item = {"type": "modified", "line_number": 1, "original": "old clause", "modified": "new clause",
+                "Significance": "Minor", "description": " ".join(rng.choice(WORDS) for _ in range(8))}
+        text = json.dumps([item, {**item, "type": "added", "content": "new clause"}])
+        return [text[i:i + 8] for i in range(0, len(text), 8)]
+    if "speaker||designation||speech" in prompt:
+        lines = [f"{speaker}||{speaker}||{' '.join(rng.choice(WORDS) for _ in range(10))}\n"
+                 for speaker in ("Narrator", "Judge", "Plaintiff Attorney", "Defendant Attorney", "Judge", "Narrator")]
+        return [token for line in lines for token in line.split(" ")]
+    tokens = []
+    for i in range(count):
+        word = rng.choice(WORDS)
+        tokens.append(("\n\n" if i and i % 24 == 0 else " ") + word if i else word.capitalize())
+    return tokens
+
+def _inject_error():
+    if settings["error_rate"] and random.random() < settings["error_rate"]:
+        return JSONResponse(status_code=500, content={"error": "mock ollama: injected failure"})
+    return None
+
+def _timings(prompt: str, eval_count: int, started: float) -> Dict:
+    total = int((time.monotonic() - started) * 1e9)
+    return {
+        "total_duration": total,
+        "load_duration": 0,
+        "prompt_eval_count": max(1, len(prompt) // 4),
+        "prompt_eval_duration": int(settings["ttft"] * 1e9),
+        "eval_count": eval_count,
+        "eval_duration": max(0, total - int(settings["ttft"] * 1e9)),
+    }
+
+async def _generate_tokens(tokens: List[str]) -> AsyncIterator[str]:
+    await asyncio.sleep(settings["ttft"])
+    fail_at = len(tokens) // 2 if random.random() < settings["stream_error_rate"] else None
+    for i, token in enumerate(tokens):
+        if i == fail_at:
+            raise RuntimeError("mock ollama: injected stream failure")
+        if i:
+            await asyncio.sleep(1 / settings["tokens_per_sec"])
+        yield token
+
+def _ndjson(chunks: AsyncIterator[Dict]) -> StreamingResponse:
+    async def lines():
+        async for chunk in chunks:
+            yield json.dumps(chunk) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    error = _inject_error()
+    if error:
+        return error
+    model, prompt = body.get("model"), body.get("prompt") or ""
+    started = time.monotonic()
+    tokens = _response_tokens(prompt)
+
+    if body.get("stream", True):
+        async def chunks():
+            try:
+                async for token in _generate_tokens(tokens):
+                    yield {"model": model, "response": token, "done": False}
+            except RuntimeError as e:
+                yield {"error": str(e)}
+                return
+            yield {"model": model, "response": "", "done": True, "done_reason": "stop", **_timings(prompt, len(tokens), started)}
+        return _ndjson(chunks())
+
+    await asyncio.sleep(settings["ttft"] + (len(tokens) - 1) / settings["tokens_per_sec"])
+    return {"model": model, "response": "".join(tokens), "done": True, "done_reason": "stop", **_timings(prompt, len(tokens), started)}
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    error = _inject_error()
+    if error:
+        return error
+    model = body.get("model")
+    prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+    started = time.monotonic()
+    tokens = _response_tokens(prompt)
+
+    if body.get("stream", True):
+        async def chunks():
+            try:
+                async for token in _generate_tokens(tokens):
+                    yield {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+            except RuntimeError as e:
+                yield {"error": str(e)}
+                return
+            yield {"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                   "done_reason": "stop", **_timings(prompt, len(tokens), started)}
+        return _ndjson(chunks())
+
+    await asyncio.sleep(settings["ttft"] + (len(tokens) - 1) / settings["tokens_per_sec"])
+    return {"model": model, "message": {"role": "assistant", "content": "".join(tokens)}, "done": True,
+            "done_reason": "stop", **_timings(prompt, len(tokens), started)}
+
+def _embedding(text: str) -> List[float]:
+    """Deterministic unit vector derived from the text, so identical inputs embed identically."""
+    values, seed = [], hashlib.sha256(text.encode("utf-8")).digest()
+    while len(values) < settings["embedding_dim"]:
+        seed = hashlib.sha256(seed).digest()
+        values.extend(value / 2**31 for value in struct.unpack("<8i", seed))
+    values = values[:settings["embedding_dim"]]
+    norm = math.sqrt(sum(value * value for value in values)) or 1.0
+    return [value / norm for value in values]
+
+@app.post("/api/embed")
+async def embed(request: Request):
+    body = await request.json()
+    error = _inject_error()
+    if error:
+        return error
+    inputs = body.get("input", "")
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    return {"model": body.get("model"), "embeddings": [_embedding(text) for text in inputs]}
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    return {"embedding": _embedding(body.get("prompt", ""))}
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": name, "model": name, "size": 0, "details": {}} for name in settings["models"]]}
+
+@app.get("/api/ps")
+async def ps():
+    return {"models": [{"name": name, "model": name, "size_vram": 0} for name in settings["models"]]}
+
+@app.get("/api/version")
+async def version():
+    return {"version": "0.0.0-mock"}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft", type=float, default=settings["ttft"], help="seconds to the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=settings["tokens_per_sec"])
+    parser.add_argument("--response-tokens", type=int, default=settings["response_tokens"])
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"], help="fraction of requests failing with HTTP 500")
+    parser.add_argument("--stream-error-rate", type=float, default=settings["stream_error_rate"], help="fraction of streams failing midway")
+    parser.add_argument("--embedding-dim", type=int, default=settings["embedding_dim"])
+    parser.add_argument("--models", default=",".join(settings["models"]), help="comma-separated models reported by /api/tags")
+    args = parser.parse_args()
+
+    settings.update(
+        ttft=args.ttft,
+        tokens_per_sec=args.tokens_per_sec,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        stream_error_rate=args.stream_error_rate,
+        embedding_dim=args.embedding_dim,
+        models=[name.strip() for name in args.models.split(",") if name.strip()],
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
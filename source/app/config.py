@@ -1,4 +1,6 @@
+import multiprocessing
 import os
+import tempfile
 from dotenv import load_dotenv
 import torch
 
@@ -11,6 +13,10 @@ DEFAULT_MODEL = os.getenv("DEFAULT_MODEL")
 if not OLLAMA_BASE_URL:
     raise ValueError("OLLAMA_BASE_URL is not set. Please set it in the environment variables or .env file.")
 
+# OLLAMA_BASE_URL may list several comma-separated backends; OLLAMA_BASE_URL itself stays the first one
+OLLAMA_BASE_URLS = [url.strip().rstrip("/") for url in OLLAMA_BASE_URL.split(",") if url.strip()]
+OLLAMA_BASE_URL = OLLAMA_BASE_URLS[0]
+
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER")
 FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
@@ -24,6 +30,130 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
+# Uploads are copied to disk in UPLOAD_CHUNK_SIZE pieces and rejected (413) beyond MAX_UPLOAD_BYTES (0: no limit)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Spreadsheets and slide decks are read row by row (CSV files TABULAR_CHUNK_ROWS rows at a time). Converted to .docx,
+# they are written TABULAR_BATCH_ROWS rows per paragraph; conversion and text extraction keep TABULAR_MAX_ROWS rows (0: all).
+TABULAR_CHUNK_ROWS = int(os.getenv("TABULAR_CHUNK_ROWS", "10000"))
+TABULAR_BATCH_ROWS = int(os.getenv("TABULAR_BATCH_ROWS", "500"))
+TABULAR_MAX_ROWS = int(os.getenv("TABULAR_MAX_ROWS", "50000"))
+
+# Optional embedding server shared by all workers (python -m source.app.services.embedding_server). When
+# EMBEDDING_SERVER_SOCKET is set, workers send texts to it over that Unix socket instead of loading the model themselves;
+# requests from all workers are batched together there.
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "120"))
+
+# Documents indexed at the same time share the model's forward passes: a request waits up to EMBEDDING_BATCH_WAIT_MS
+# for others, and a batch stops growing at EMBEDDING_BATCH_MAX_ITEMS texts. Off, each request embeds on its own.
+EMBEDDING_BATCHING_ENABLED = os.getenv("EMBEDDING_BATCHING_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "256"))
+
 # Ensure directories exist (this logic remains in config.py as it's part of setup)
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
\ No newline at end of file
+os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
+
+# Ollama HTTP client pool (shared per worker, created in the app lifespan)
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20"))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "600"))
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))
+
+# Ollama backend health checks (a failing backend is ejected from routing until it recovers)
+OLLAMA_HEALTH_CHECK_INTERVAL = float(os.getenv("OLLAMA_HEALTH_CHECK_INTERVAL", "10"))
+OLLAMA_HEALTH_CHECK_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_CHECK_TIMEOUT", "3"))
+OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "2"))
+
+# Server-Sent-Events streaming
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+
+# LLM response cache (SQLite file shared by all workers)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("cache", "llm_cache.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Extracted text of uploaded documents, per page, keyed by the SHA-256 of the file (SQLite file shared by all workers)
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", os.path.join("cache", "extraction_cache.sqlite3"))
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# PDF text extraction runs in up to EXTRACTION_WORKERS extraction processes per worker (0: in a thread instead).
+# Documents are split into EXTRACTION_PAGES_PER_TASK page ranges extracted in parallel; an extraction process that takes
+# longer than EXTRACTION_TASK_TIMEOUT seconds on a range is killed, and one may allocate EXTRACTION_MEMORY_LIMIT_MB at most.
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACTION_PAGES_PER_TASK = int(os.getenv("EXTRACTION_PAGES_PER_TASK", "25"))
+EXTRACTION_TASK_TIMEOUT = float(os.getenv("EXTRACTION_TASK_TIMEOUT", "120"))
+EXTRACTION_MEMORY_LIMIT_MB = int(os.getenv("EXTRACTION_MEMORY_LIMIT_MB", "1024"))
+
+# LLM admission control (per worker: Ollama sees up to workers x limit concurrent generations)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+LLM_MODEL_CONCURRENCY = {
+    model.strip(): int(limit)
+    for model, _, limit in (item.partition("=") for item in os.getenv("LLM_MODEL_CONCURRENCY", "").split(",") if "=" in item)
+}
+LLM_MAX_QUEUE_DEPTH = int(os.getenv("LLM_MAX_QUEUE_DEPTH", "32"))
+
+# Prompt token budgeting. Exact counts are opt-in: LLM_TOKENIZERS maps models to a Hugging Face tokenizer
+# ("model=hf_repo_or_tokenizer.json,...", e.g. llama3=/models/llama3/tokenizer.json). Models not listed, which is all of
+# them by default, get an estimate of four characters per token instead.
+# num_ctx is picked per request from LLM_NUM_CTX_SIZES; keep the list short since Ollama reloads the model on every change.
+LLM_TOKENIZERS = {
+    model.strip(): name.strip()
+    for model, _, name in (item.partition("=") for item in os.getenv("LLM_TOKENIZERS", "").split(",") if "=" in item)
+}
+LLM_NUM_CTX_SIZES = sorted(int(size) for size in os.getenv("LLM_NUM_CTX_SIZES", "2048,4096,8192,16384").split(",") if size.strip())
+LLM_OUTPUT_TOKENS = int(os.getenv("LLM_OUTPUT_TOKENS", "1024"))
+
+# Map-reduce summarization of documents that don't fit the model context
+SUMMARY_MAX_INPUT_TOKENS = int(os.getenv("SUMMARY_MAX_INPUT_TOKENS", "6000"))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+
+# legal_bot multi-file uploads: files are compressed only when together they exceed the index budget
+LEGAL_BOT_INDEX_TOKEN_BUDGET = int(os.getenv("LEGAL_BOT_INDEX_TOKEN_BUDGET", "100000"))
+LEGAL_BOT_COMPRESS_CONCURRENCY = int(os.getenv("LEGAL_BOT_COMPRESS_CONCURRENCY", "4"))
+
+# Start-up warm-up and model keep-alive: models are loaded with OLLAMA_KEEP_ALIVE (also sent with every generation)
+# and re-touched every OLLAMA_KEEP_ALIVE_REFRESH seconds, which must stay below the keep-alive duration.
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_MODELS = [model.strip() for model in os.getenv("WARMUP_MODELS", DEFAULT_MODEL or "").split(",") if model.strip()]
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_KEEP_ALIVE_REFRESH = float(os.getenv("OLLAMA_KEEP_ALIVE_REFRESH", "600"))
+OLLAMA_LOAD_TIMEOUT = float(os.getenv("OLLAMA_LOAD_TIMEOUT", "300"))
+
+# Background jobs for long generations (SQLite queue shared by all workers). JOB_CONCURRENCY jobs run per worker,
+# at BATCH priority; a job whose worker stops heart-beating for JOB_STALE_AFTER seconds is run again elsewhere.
+JOB_STORAGE_PATH = os.getenv("JOB_STORAGE_PATH", "jobs")
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "1"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "5"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+
+# Request tracing: every response carries an X-Trace-Id header; requests slower than the threshold are appended
+# with their full span tree to a size-rotated JSONL file shared by all workers. The endpoints that return traces
+# (/api/system/traces/...) expose request paths and timings without authentication, so they are off unless enabled.
+TRACE_ENDPOINTS_ENABLED = os.getenv("TRACE_ENDPOINTS_ENABLED", "false").lower() == "true"
+TRACE_SLOW_THRESHOLD_MS = float(os.getenv("TRACE_SLOW_THRESHOLD_MS", "5000"))
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join("logs", "slow_traces.jsonl"))
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "5"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))
+
+# Prometheus metrics: each uvicorn worker writes its samples to files in this directory and /metrics merges them.
+# The default is one directory per server (keyed by the pid of the uvicorn supervisor that spawned the workers, or of the
+# single server process). The first worker of a new server clears what earlier runs left in it, so set
+# PROMETHEUS_MULTIPROC_DIR to a directory used only for these metrics. It must be set before prometheus_client is imported.
+METRICS_SERVER_PID = (multiprocessing.parent_process() or multiprocessing.current_process()).pid
+METRICS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "legal_assistant_metrics", str(METRICS_SERVER_PID))
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = METRICS_DIR
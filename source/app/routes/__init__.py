@@ -16,6 +16,9 @@ from .cross_exam import router as cross_exam_router
 from .auth import router as sign_up_router
 from .auth import router as login_router
 from .auth import router as logout_router
+from .system import router as system_router
+from .metrics import router as metrics_router
+from .jobs import router as jobs_router
 
 __all__ = ['draft_router',
            'query_router',
@@ -26,4 +29,5 @@ __all__ = ['draft_router',
            'ai_proceedings_router',
            'custom_ai_proceedings_router', 'input_custom_ai_proceedings_router', 'conclude_custom_ai_proceedings_router',
            'cross_exam_router',
-           'sign_up_router', 'login_router', 'logout_router']
\ No newline at end of file
+           'sign_up_router', 'login_router', 'logout_router',
+           'system_router', 'metrics_router', 'jobs_router']
\ No newline at end of file
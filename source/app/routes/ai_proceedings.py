@@ -1,48 +1,24 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
-from ..services import extract_text_from_file_path, is_likely_case_file, parse_conversation
+from ..services import extract_text_from_file_path, save_upload, is_likely_case_file, parse_conversation
 from ..services.auth_service import authorize
 from ..config import DEFAULT_MODEL, UPLOAD_FOLDER, OLLAMA_BASE_URL
 from langchain.prompts import PromptTemplate
-from langchain_ollama import OllamaLLM
 import os
-import aiofiles
-from typing import Optional
+from typing import Dict, Optional
 from ..services import preprocess_text
+from ..services.ollama_llm import ManagedOllamaLLM
+from ..services.llm_scheduler import QueueFullError
+from ..services.token_budget import budget_prompt
+from ..services.jobs import job_handler, new_job_id, save_job_upload, submit_job
 
 router = APIRouter()
 
-llm = OllamaLLM(base_url=OLLAMA_BASE_URL, model=DEFAULT_MODEL)
+llm = ManagedOllamaLLM(base_url=OLLAMA_BASE_URL, model=DEFAULT_MODEL)
 
-@router.post("/ai_proceedings")
-# @authorize()
-async def ai_proceedings(
-    request: Request,
-    file: UploadFile = File(...),
-    model: Optional[str] = Form(DEFAULT_MODEL),
-    court: Optional[str] = Form(None),
-    current_user=None
-):
-    """
-    Endpoint to handle AI proceedings.
-    """
-    try:
-        """Endpoint to upload a case file."""
-        if not file.filename.endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Only PDF files are supported")
-        
-        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        async with aiofiles.open(file_path, "wb") as f:
-            while chunk := await file.read(1024):
-                await f.write(chunk)
-        
-        document_text = await extract_text_from_file_path(file_path)
-        case_text = preprocess_text(document_text)
-        if not is_likely_case_file(case_text):
-            raise HTTPException(status_code=400, detail="The uploaded file does not appear to be a court case or judgment.")
-
-
-        if court == "civil":
-            prompt = PromptTemplate(
+def build_proceedings_prompt(court: Optional[str], case_text: str) -> str:
+    """Courtroom simulation prompt for the given court type and case text."""
+    if court == "civil":
+        prompt = PromptTemplate(
     input_variables=["case_text"],
     template=f"""You are simulating a **Civil Court Proceeding in India** such as a dispute over property, contract, or defamation as a story narrated by a narrator. Keep it in a very detailed and realistic manner.
 
@@ -74,8 +50,8 @@ Here's the case file to generate the response from:
 \"\"\"{case_text}\"\"\"
 """)
     
-        elif court == "criminal":
-            prompt = PromptTemplate(
+    elif court == "criminal":
+        prompt = PromptTemplate(
     input_variables=["case_text"],
     template=f"""You are simulating a **Criminal Court Proceeding in India** under the Indian Penal Code. Keep it in a very detailed and realistic manner. The trial must include witness testimonies, direct and cross-examinations, and statements under CrPC.
 
@@ -106,8 +82,8 @@ Include:
 **IMPORTANT:** Do not include any additional text, explanations, JSON, markdown, or extra formatting. Only generate the lines in the specified format, one per line.
             CASE DESCRIPTION:
             {case_text}""")
-        else:
-            prompt = PromptTemplate(
+    else:
+        prompt = PromptTemplate(
     input_variables=["case_text"],
     template= f"""You are a legal AI assistant with expert knowledge of Indian law and judicial proceedings.
 
@@ -163,25 +139,88 @@ Include:
             CASE DESCRIPTION:
             {case_text}
             """)
+    return prompt.format(case_text=case_text)
+
+
+async def run_ai_proceedings(file_path: str, court: Optional[str], digest: Optional[str] = None) -> Dict:
+    """Generates the courtroom proceedings for a saved case file (`digest`: its SHA-256, if known)."""
+    document_text = await extract_text_from_file_path(file_path, digest)
+    case_text = preprocess_text(document_text)
+    if not is_likely_case_file(case_text):
+        raise HTTPException(status_code=400, detail="The uploaded file does not appear to be a court case or judgment.")
+
+    # Proceedings are long narratives, so more of the context is kept for the output
+    formatted_prompt, options = budget_prompt(
+        lambda case_text: build_proceedings_prompt(court, case_text),
+        {"case_text": case_text},
+        DEFAULT_MODEL,
+        output_tokens=4096
+    )
+    response = await llm.ainvoke(formatted_prompt, options=options)
+    try:
+        conversation = parse_conversation(response)
+        if not conversation:
+            raise ValueError("No valid conversation entries parsed.")
+        return {
+            "conversation": conversation
+        }
+    except Exception as e:
+        return {
+            "error": "Failed to parse conversation response.",
+            "raw_response": response,
+            "details": str(e)
+        }
+
+@job_handler("ai_proceedings")
+async def ai_proceedings_job(params: Dict, progress) -> Dict:
+    await progress("Generating proceedings")
+    return await run_ai_proceedings(params["file_path"], params.get("court"))
+
+@router.post("/ai_proceedings")
+# @authorize()
+async def ai_proceedings(
+    request: Request,
+    file: UploadFile = File(...),
+    model: Optional[str] = Form(DEFAULT_MODEL),
+    court: Optional[str] = Form(None),
+    current_user=None
+):
+    """
+    Endpoint to handle AI proceedings.
+    """
+    try:
+        """Endpoint to upload a case file."""
+        if not file.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are supported")
+        
+        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
+        digest = await save_upload(file, file_path)
 
-        formatted_prompt = prompt.format(case_text=case_text)
-        response = llm.invoke(formatted_prompt)
-        try:
-            conversation = parse_conversation(response)
-            if not conversation:
-                raise ValueError("No valid conversation entries parsed.")
-            return {
-                "conversation": conversation
-            }
-        except Exception as e:
-            return {
-                "error": "Failed to parse conversation response.",
-                "raw_response": response,
-                "details": str(e)
-            }
+        return await run_ai_proceedings(file_path, court, digest)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        return ({
+            'error': str(e),
+            'error_type': str(type(e).__name__),
+            'error_file_details': f'Error on line {e.__traceback__.tb_lineno} inside {__file__}'
+        })
+
+@router.post("/ai_proceedings/jobs")
+async def submit_ai_proceedings_job(
+    file: UploadFile = File(...),
+    court: Optional[str] = Form(None)
+):
+    """Queues the proceedings generation as a background job; poll /api/jobs/{job_id} for progress and the result."""
+    try:
+        if not file.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are supported")
+        job_id = new_job_id()
+        file_path = await save_job_upload(job_id, file)
+        return await submit_job("ai_proceedings", {"file_path": file_path, "court": court}, job_id)
     except Exception as e:
         return ({
             'error': str(e),
             'error_type': str(type(e).__name__),
             'error_file_details': f'Error on line {e.__traceback__.tb_lineno} inside {__file__}'
-        })
\ No newline at end of file
+        })
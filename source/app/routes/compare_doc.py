@@ -1,26 +1,17 @@
-from fastapi import APIRouter, UploadFile, File, Form, Response, Request
+from fastapi import APIRouter, UploadFile, File, Form, Response, Request, Query
 #from ..services.auth_service import authorize
 from typing import Optional
+import asyncio
 from ..services import call_ollama_api, extract_text_from_file, format_response
+from ..services.token_budget import budget_prompt
+from ..services.sse import wants_event_stream, stream_generation
+from ..services.llm_scheduler import QueueFullError
 from ..config import DEFAULT_MODEL
 
 router = APIRouter()
 
-@router.post("/compare_documents")
-#@authorize()
-async def compare_documents(
-    request: Request,
-    file1: UploadFile = File(...),
-    model: Optional[str] = Form(DEFAULT_MODEL),
-    file2: UploadFile = File(...),
-    current_user=None
-):
-    """Compares two real estate legal documents and returns a structured comparison."""
-    try:
-        content1 = extract_text_from_file(file1)
-        content2 = extract_text_from_file(file2)
-
-        prompt = f""" You are a legal expert specializing in real estate laws across India. Your task is to analyze and compare two uploaded legal documents, considering key legal, financial, and regulatory aspects. The documents may include sale deeds, lease agreements, gift deeds, mortgage deeds, rental agreements, power of attorney, partition deeds, or other real estate-related contracts.
+def build_comparison_prompt(content1: str, content2: str) -> str:
+    return f""" You are a legal expert specializing in real estate laws across India. Your task is to analyze and compare two uploaded legal documents, considering key legal, financial, and regulatory aspects. The documents may include sale deeds, lease agreements, gift deeds, mortgage deeds, rental agreements, power of attorney, partition deeds, or other real estate-related contracts.
 
 Comparison Parameters:
 
@@ -47,14 +38,35 @@ Legal & Compliance Issues Noted
 State-Specific Considerations
 Summary of Risks & Recommendations
 Provide a detailed analysis of the comparison, highlighting any significant differences, gaps, or risks. Ensure your analysis is thorough and considers the complexities of the Indian legal landscape.
-        Document 1: {content1}
-        Document 2: {content2}"""
+    Document 1: {content1}
+    Document 2: {content2}"""
+
+@router.post("/compare_documents")
+#@authorize()
+async def compare_documents(
+    request: Request,
+    file1: UploadFile = File(...),
+    model: Optional[str] = Form(DEFAULT_MODEL),
+    file2: UploadFile = File(...),
+    stream: Optional[bool] = Query(False),
+    current_user=None
+):
+    """Compares two real estate legal documents and returns a structured comparison."""
+    try:
+        content1, content2 = await asyncio.gather(extract_text_from_file(file1), extract_text_from_file(file2))
+
+        # Both documents have the same priority, so an oversized pair is trimmed in proportion to length
+        prompt, options = budget_prompt(build_comparison_prompt, {"content1": content1, "content2": content2}, model)
 
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            "options": options
         }
+
+        if wants_event_stream(request, stream):
+            return stream_generation(payload)
     
         response = await call_ollama_api("api/generate", method="POST", json_data=payload)
         raw_response = response.get("response", "")
@@ -62,6 +74,8 @@ Provide a detailed analysis of the comparison, highlighting any significant diff
 
         return Response(content=formatted_response, media_type="text/html")
     
+    except QueueFullError:
+        raise
     except Exception as e:
         return ({
             'error': str(e),
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
 from ..services.auth_service import authorize
 from typing import Optional
-from ..services import extract_text_from_file_path, is_likely_case_file, parse_conversation, preprocess_text, get_court_proceedings_conversation_chain, court_proceedings_conversation_chain, extract_conversational_lines_from_chat_history
+from ..services import extract_text_from_file_path, save_upload, is_likely_case_file, parse_conversation, preprocess_text, get_court_proceedings_conversation_chain, court_proceedings_conversation_chain, extract_conversational_lines_from_chat_history
+from ..services.llm_scheduler import QueueFullError
+from ..services.metrics import stage
+from ..services.tracing import trace_config
 from ..config import UPLOAD_FOLDER
-import aiofiles
+import asyncio
 import os
 import uuid
 
@@ -37,17 +40,15 @@ async def start_custom_ai_proceedings(
             if not file.filename.endswith(".pdf"):
                 raise HTTPException(status_code=400, detail="Only PDF files are supported")
             file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-            async with aiofiles.open(file_path, "wb") as f:
-                while chunk := await file.read(1024):
-                    await f.write(chunk)
-            document_text = await extract_text_from_file_path(file_path)
+            digest = await save_upload(file, file_path)
+            document_text = await extract_text_from_file_path(file_path, digest)
             case_text = preprocess_text(document_text)
 
         if not is_likely_case_file(case_text):
             raise HTTPException(status_code=400, detail="The uploaded file does not appear to be a court case or judgment.")
         
         # Create conversation chain with case file
-        conversation_chain = court_proceedings_conversation_chain(session_id, case_text)
+        conversation_chain = await asyncio.to_thread(court_proceedings_conversation_chain, session_id, case_text)
 
         # Generate initial judge statement
         initial_prompt = (
@@ -66,7 +67,8 @@ async def start_custom_ai_proceedings(
             **IMPORTANT:** Do not include any additional text, explanations, JSON, markdown, or extra formatting.
                             Only generate the lines in the specified format, one per line.'''
             )
-        result = await conversation_chain.ainvoke({"question": initial_prompt})
+        with stage("court_chain"):
+            result = await conversation_chain.ainvoke({"question": initial_prompt}, config=trace_config())
         parsed_conversation = parse_conversation(result['answer'].strip())
         
         return {
@@ -75,6 +77,8 @@ async def start_custom_ai_proceedings(
             "conversation": parsed_conversation
         }
     
+    except QueueFullError:
+        raise
     except Exception as e:
         return ({
             'error': str(e),
@@ -107,13 +111,16 @@ async def input_custom_ai_proceedings(
             # "Ensure the flow is logical and designations are appropriate (e.g., 'Judge', 'Public Prosecutor', 'Defense Attorney', 'Witness'). "
             # "**Strictly follow this format. Do not include any additional text, explanations, or commentary outside the specified format.**"
         )
-        result = await conversation.ainvoke({"question": prompt})
+        with stage("court_chain"):
+            result = await conversation.ainvoke({"question": prompt}, config=trace_config())
         parsed_conversation = extract_conversational_lines_from_chat_history(result['chat_history'])
 
         return {"result": result,
                 "parsed_conversation": parsed_conversation
                 }
     
+    except QueueFullError:
+        raise
     except Exception as e:
         return ({
             'error': str(e),
@@ -138,13 +145,16 @@ async def conclude_custom_ai_proceedings(session_id: str = Form(...)):
             "Defense Attorney||Defense Attorney||Thank you, Your Honor.\n"
             # "**Strictly follow this format. Do not include any additional text, explanations, or commentary outside the specified format.**"
         )
-        result = await conversation.ainvoke({"question": prompt})
+        with stage("court_chain"):
+            result = await conversation.ainvoke({"question": prompt}, config=trace_config())
         parsed_conversation = extract_conversational_lines_from_chat_history(result['chat_history'])
 
         return {"result": result,
                 "parsed_conversation": parsed_conversation
                 }
     
+    except QueueFullError:
+        raise
     except Exception as e:
         return ({
             'error': str(e),
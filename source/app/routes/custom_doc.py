@@ -1,10 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Response, Request
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Response, Request, Query
 from ..services.auth_service import authorize
 from typing import Optional
 import json
 from ..services.format_res import format_response
 from ..services.call_ollama import call_ollama_api
 from ..services.custom_prompt import customised_prompt
+from ..services.sse import wants_event_stream, stream_generation
+from ..services.llm_scheduler import QueueFullError
 from ..config import DEFAULT_MODEL
 
 router = APIRouter()
@@ -18,6 +20,7 @@ async def generate_document_format(
     input_text: Optional[str] = Form(None),
     options: Optional[str] = Form(None),
     model: Optional[str] = Form(DEFAULT_MODEL),
+    stream: Optional[bool] = Query(False),
     current_user = None
 ):
     """
@@ -52,6 +55,9 @@ async def generate_document_format(
             "stream": False
         }
 
+        if wants_event_stream(request, stream):
+            return stream_generation(payload)
+
         response = await call_ollama_api("api/generate", method="POST", json_data=payload)
         raw_response = response.get("response", "")
         formatted_response = format_response(raw_response)
@@ -60,6 +66,8 @@ async def generate_document_format(
 
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid options format. Please provide a valid JSON.")
+    except QueueFullError:
+        raise
     except Exception as e:
         return ({
             'error': str(e),
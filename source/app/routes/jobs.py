@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from ..services.jobs import get_job, get_job_result, cancel_job
+
+router = APIRouter()
+
+@router.get("/{job_id}")
+async def job_status(job_id: str):
+    """Status and progress of a background job."""
+    return await get_job(job_id)
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str):
+    """Result of a finished job; 409 while it is still queued or running, or if it failed or was cancelled."""
+    return await get_job_result(job_id)
+
+@router.post("/{job_id}/cancel")
+async def job_cancel(job_id: str):
+    """Cancels a queued job, or asks the worker running it to stop."""
+    return await cancel_job(job_id)
@@ -1,16 +1,25 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
 #from ..services.auth_service import authorize
 from fastapi.responses import JSONResponse
-from typing import Optional, List, Union
-import aiofiles
-from ..services import extract_text_from_file_path, get_or_create_conversation_chain, clear_session_history, get_session_conversation_chain, get_general_conversation_chain, update_general_chat_history, call_ollama_api
-from ..config import DEFAULT_MODEL, UPLOAD_FOLDER
+from typing import Dict, Optional, List, Tuple, Union
+import asyncio
+from ..services import TABULAR_EXTENSIONS, extract_text_from_file_path, temporary_upload, get_or_create_conversation_chain, clear_session_history, get_session_conversation_chain, get_general_conversation_chain, update_general_chat_history, update_document_chat_history, stream_conversation_answer, call_ollama_api
+from ..services.sse import sse_event, event_stream_response
+from ..services.llm_scheduler import QueueFullError, BATCH, check_admission
+from ..services.token_budget import count_tokens, budget_prompt
+from ..services.metrics import stage
+from ..services.tracing import trace_config
+from ..services.jobs import job_handler, new_job_id, save_job_upload, submit_job
+from ..config import DEFAULT_MODEL, LEGAL_BOT_INDEX_TOKEN_BUDGET, LEGAL_BOT_COMPRESS_CONCURRENCY
 from ..constants.prompts import PROMPTS
 import os
 import uuid
 
 router = APIRouter()
 
+# Documents that can be asked about: spreadsheets and decks are read row by row into text like PDFs
+DOCUMENT_EXTENSIONS = (".pdf",) + TABULAR_EXTENSIONS
+
 async def get_sesh_id(session_id: Optional[str] = Form(None)):
     """Dependency to get or create a session ID."""
     if session_id:
@@ -20,55 +29,136 @@ async def get_sesh_id(session_id: Optional[str] = Form(None)):
 
 async def compress_text_via_prompt(text: str) -> str:
     # Modify this function to use your actual LLM client
-    prompt = f"""
+    prompt, options = budget_prompt(
+        lambda text: f"""
     Minimize the following combined legal documents without changing their meaning or removing critical context.
     Note: Don't add anything extra like I don't want to know what you did just the output only, and I do appreciate what you did but that's not what I want as an output, I just want the compressed text only. Don't write "Here is the minimized combined legal document".
     Documents:
     {text}
-    """
+    """,
+        {"text": text},
+        DEFAULT_MODEL,
+        output_tokens=4096
+    )
     # Send to model and process response
     payload = {
         "model": DEFAULT_MODEL,
         "prompt": prompt,
-        "stream": False
+        "stream": False,
+        "options": options
     }
         
-    response = await call_ollama_api("api/generate", method="POST", json_data=payload)
+    response = await call_ollama_api("api/generate", method="POST", json_data=payload, priority=BATCH)
     # print(f"Response: {response['response']}")
     return response['response']
 
 
-async def process_uploaded_files(files: List[UploadFile]) -> str:
-    texts = []
+async def _save_and_extract(file: UploadFile) -> Tuple[str, str]:
+    # A file of its own per upload: files of one request, or of concurrent requests, may share a name
+    async with temporary_upload(file) as (file_path, digest):
+        return file.filename, await extract_text_from_file_path(file_path, digest)
+
+async def _extract(file_path: str) -> Tuple[str, str]:
+    return os.path.basename(file_path), await extract_text_from_file_path(file_path)
 
-    # Save and extract text from each file
+def _total_tokens(texts: List[str]) -> int:
+    """Sum of the token counts of `texts`, each tokenized on its own (run it off the event loop)."""
+    return sum(count_tokens(text) for text in texts)
+
+async def _tree_compress(texts: List[Tuple[str, str]]) -> str:
+    """
+    Compresses the files pairwise, level by level, with at most LEGAL_BOT_COMPRESS_CONCURRENCY
+    generations at a time, stopping as soon as the result fits the index budget.
+    """
+    semaphore = asyncio.Semaphore(LEGAL_BOT_COMPRESS_CONCURRENCY)
+
+    async def compress(pair: List[str]) -> str:
+        async with semaphore:
+            return await compress_text_via_prompt("\n\n".join(pair))
+
+    nodes = [f"--- {filename} ---\n{text}" for filename, text in texts]
+    while len(nodes) > 1:
+        nodes = await asyncio.gather(*(compress(nodes[i:i+2]) for i in range(0, len(nodes), 2)))
+        # Only the new, compressed nodes are tokenized
+        if await asyncio.to_thread(_total_tokens, nodes) <= LEGAL_BOT_INDEX_TOKEN_BUDGET:
+            break
+    return "\n\n".join(nodes)
+
+async def process_uploaded_files(files: List[UploadFile]) -> Tuple[str, Optional[List[Tuple[str, str]]]]:
+    """
+    Saves and extracts all uploaded files concurrently and returns the combined text.
+    When several files together fit the index budget they are not compressed, and the
+    per-file (filename, text) documents are returned too so each can be indexed on its own.
+    """
     for file in files:
-        if not file.filename.endswith(".pdf"):
-            raise HTTPException(status_code=400, detail="Only PDF files are supported")
-
-        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        async with aiofiles.open(file_path, "wb") as f:
-            while chunk := await file.read(1024):
-                await f.write(chunk)
-
-        text = await extract_text_from_file_path(file_path)
-        texts.append((file.filename, text))
-
-    # If more than 1 file, compress in pairs
-    if len(texts) > 1:
-        compressed_chunks = []
-        i = 0
-        while i < len(texts):
-            chunk = texts[i:i+2]  # Handle 1 or 2 files at a time
-            combined_text = "\n\n".join(f"--- {file.filename} ---\n{text}" for file.filename, text in chunk)
-            compressed = await compress_text_via_prompt(combined_text)
-            compressed_chunks.append(compressed)
-            i += 2
-        return "\n\n".join(compressed_chunks)
+        if not file.filename.lower().endswith(DOCUMENT_EXTENSIONS):
+            raise HTTPException(status_code=400, detail="Only PDF, CSV, XLSX and PPTX files are supported")
 
-    else:
+    texts = await asyncio.gather(*(_save_and_extract(file) for file in files))
+    return await combine_texts(texts)
+
+async def process_file_paths(file_paths: List[str]) -> Tuple[str, Optional[List[Tuple[str, str]]]]:
+    """`process_uploaded_files` for files already on disk."""
+    texts = await asyncio.gather(*(_extract(file_path) for file_path in file_paths))
+    return await combine_texts(texts)
+
+async def combine_texts(texts: List[Tuple[str, str]]) -> Tuple[str, Optional[List[Tuple[str, str]]]]:
+    if len(texts) == 1:
         # Single file — no compression
-        return texts[0][1]
+        return texts[0][1], None
+
+    sections = [f"--- {filename} ---\n{text}" for filename, text in texts]
+    if await asyncio.to_thread(_total_tokens, sections) <= LEGAL_BOT_INDEX_TOKEN_BUDGET:
+        return "\n\n".join(sections), list(texts)
+    return await _tree_compress(texts), None
+
+def resolve_question(
+    question: str,
+    preset_prompt: Optional[str],
+    interviewer: Optional[str],
+    interviewee: Optional[str],
+    combined_text: Optional[str]
+) -> str:
+    """Expands a preset prompt into the question sent to the chain, or returns the question as-is."""
+    if not preset_prompt:
+        return question
+
+    selected_prompt = PROMPTS.get("Analysis_Prompts", {}).get(preset_prompt)
+
+    if not selected_prompt:
+        raise HTTPException(status_code=400, detail=f"Invalid preset prompt: {preset_prompt}")
+
+    # For cross-exam prompt (requires interviewer and interviewee)
+    if preset_prompt == "cross_exam_prompts":
+        if not interviewer or not interviewee:
+            raise HTTPException(status_code=400, detail="Interviewer and interviewee are required for cross-examination prompt.")
+        return selected_prompt.format(
+            interviewer=interviewer,
+            interviewee=interviewee,
+            content=combined_text)
+
+    # For all other prompts
+    if '{content}' in selected_prompt and not combined_text:
+        raise HTTPException(status_code=400, detail="Document content required for preset prompt.")
+    return selected_prompt.format(content=combined_text)
+
+@job_handler("legal_bot")
+async def legal_bot_job(params: Dict, progress) -> Dict:
+    """Answers a question about several uploaded documents (document mode), as a background job."""
+    session_id = params["session_id"]
+    await progress("Extracting documents", 0.0)
+    combined_text, documents = await process_file_paths(params["file_paths"])
+    question = resolve_question(
+        params["question"], params.get("preset_prompt"), params.get("interviewer"), params.get("interviewee"), combined_text
+    )
+    await progress("Indexing documents", 0.4)
+    conversation = await asyncio.to_thread(get_or_create_conversation_chain, session_id, combined_text, documents)
+    if not conversation:
+        raise HTTPException(status_code=500, detail="Failed to initialize conversation chain.")
+    await progress("Generating answer", 0.6)
+    with stage("rag_chain"):
+        response = await conversation.ainvoke({'question': question}, config=trace_config())
+    return {"answer": response['answer'], "session_id": session_id}
 
 @router.post("/legal_bot")
 #@authorize()
@@ -85,39 +175,23 @@ async def legal_bot(
 ):
     try:
         combined_text = None
+        documents = None
 
         # If a file is uploaded, extract its text
         if file:
             files = [file] if isinstance(file, UploadFile) else file
-            combined_text = await process_uploaded_files(files)
+            combined_text, documents = await process_uploaded_files(files)
         
-        if preset_prompt:
-            selected_prompt = PROMPTS.get("Analysis_Prompts", {}).get(preset_prompt)
-
-            if not selected_prompt:
-                raise HTTPException(status_code=400, detail=f"Invalid preset prompt: {preset_prompt}")
-
-            # For cross-exam prompt (requires interviewer and interviewee)
-            if preset_prompt == "cross_exam_prompts":
-                if not interviewer or not interviewee:
-                    raise HTTPException(status_code=400, detail="Interviewer and interviewee are required for cross-examination prompt.")
-                question = selected_prompt.format(
-                    interviewer=interviewer,
-                    interviewee=interviewee,
-                    content=combined_text)
-            else:
-                # For all other prompts
-                if '{content}' in selected_prompt and not combined_text:
-                    raise HTTPException(status_code=400, detail="Document content required for preset prompt.")
-                question = selected_prompt.format(content=combined_text)
+        question = resolve_question(question, preset_prompt, interviewer, interviewee, combined_text)
         if with_file:
             if combined_text:
-                conversation = get_or_create_conversation_chain(session_id, combined_text)
+                conversation = await asyncio.to_thread(get_or_create_conversation_chain, session_id, combined_text, documents)
                 if conversation:
                     print("\n====== Sending Query to LLM (Document Mode) ======")
                     print("User Question:", question)
 
-                    response = await conversation.ainvoke({'question': question})
+                    with stage("rag_chain"):
+                        response = await conversation.ainvoke({'question': question}, config=trace_config())
 
                     print("\n====== RAW MODEL RESPONSE (Document Mode) ======")
                     print(response)
@@ -131,7 +205,8 @@ async def legal_bot(
                     print("\n====== Sending Query to LLM (Existing Doc Session) ======")
                     print("User Question:", question)
 
-                    response = await existing_conversation.ainvoke({'question': question})
+                    with stage("rag_chain"):
+                        response = await existing_conversation.ainvoke({'question': question}, config=trace_config())
 
                     print("\n====== RAW MODEL RESPONSE (Existing Doc Session) ======")
                     print(response)
@@ -142,29 +217,6 @@ async def legal_bot(
         else:
             general_conversation = get_general_conversation_chain(session_id)
 
-            # print("\n====== Sending Query to LLM (General Mode) ======")
-            # print("User Question:", question)
-
-            # print("\n✅ MODEL STREAMING STARTED...")
-
-            # final_answer = ""
-
-            # #🔥 STREAM RESPONSE FROM MODEL
-            # stream = await general_conversation.ainvoke_stream({'question': question})
-
-            # async for chunk in stream:
-            #     token = chunk.get("content") or chunk.get("output") or ""
-            #     print(token, end="", flush=True)
-            #     final_answer += token
-
-            # print("\n✅ MODEL STREAM COMPLETE ✅")
-            # print("\n====== FINAL CLEAN RESPONSE ======")
-            # print(final_answer)
-
-            # update_general_chat_history(session_id, general_conversation.memory)
-
-            # return {"answer": final_answer, "session_id": session_id}
-
         # if with_file:
         #     if combined_text:
         #         conversation = get_or_create_conversation_chain(session_id, combined_text)
@@ -193,7 +245,8 @@ async def legal_bot(
             # update_general_chat_history(session_id, general_conversation.memory) # Update history
             # return {"answer": response['answer'], "session_id": session_id}
             print('response is generating...')
-            response = await general_conversation.ainvoke({'input': question})
+            with stage("general_chain"):
+                response = await general_conversation.ainvoke({'input': question})
             print("\n✅ MODEL RAW RESPONSE ✅", flush=True)
             print(response)
 
@@ -207,6 +260,97 @@ async def legal_bot(
 
             return {"answer": final_answer.strip(), "session_id": session_id}
 
+    except QueueFullError:
+        raise
+    except Exception as e:
+        print(e)
+        return {
+            'error': str(e),
+            'error_type': str(type(e).__name__),
+            'error_file_details': f'Error on line {e.__traceback__.tb_lineno} inside {__file__}',
+            'session_id': session_id
+        }
+
+@router.post("/legal_bot/jobs")
+async def submit_legal_bot_job(
+    question: str = Form(...),
+    preset_prompt: Optional[str] = Form(None),
+    interviewee: Optional[str] = Form(None),
+    interviewer: Optional[str] = Form(None),
+    file: Union[UploadFile, List[UploadFile]] = File(...),
+    session_id: str = Depends(get_sesh_id)
+):
+    """Queues a document-mode question over one or more PDFs as a background job; poll /api/jobs/{job_id}."""
+    try:
+        files = [file] if isinstance(file, UploadFile) else file
+        for upload in files:
+            if not upload.filename.lower().endswith(DOCUMENT_EXTENSIONS):
+                raise HTTPException(status_code=400, detail="Only PDF, CSV, XLSX and PPTX files are supported")
+        job_id = new_job_id()
+        params = {
+            "file_paths": [await save_job_upload(job_id, upload) for upload in files],
+            "question": question,
+            "preset_prompt": preset_prompt,
+            "interviewer": interviewer,
+            "interviewee": interviewee,
+            "session_id": session_id
+        }
+        return {**await submit_job("legal_bot", params, job_id), "session_id": session_id}
+    except Exception as e:
+        print(e)
+        return {
+            'error': str(e),
+            'error_type': str(type(e).__name__),
+            'error_file_details': f'Error on line {e.__traceback__.tb_lineno} inside {__file__}',
+            'session_id': session_id
+        }
+
+@router.post("/legal_bot/stream")
+async def legal_bot_stream(
+    request: Request,
+    question: str = Form(...),
+    preset_prompt: Optional[str] = Form(None),
+    interviewee: Optional[str] = Form(None),
+    interviewer: Optional[str] = Form(None),
+    file: Optional[Union[UploadFile, List[UploadFile]]] = File(None),
+    with_file: Optional[bool] = Form(None),
+    session_id: str = Depends(get_sesh_id),
+    current_user=None
+):
+    """
+    Streaming variant of /legal_bot. Sends a `session` event, then `token` events as the
+    answer is generated, and a final `done` event with the full answer once the chat
+    history has been saved.
+    """
+    try:
+        combined_text = None
+        documents = None
+
+        if file:
+            files = [file] if isinstance(file, UploadFile) else file
+            combined_text, documents = await process_uploaded_files(files)
+
+        question = resolve_question(question, preset_prompt, interviewer, interviewee, combined_text)
+
+        if with_file:
+            if combined_text:
+                conversation = await asyncio.to_thread(get_or_create_conversation_chain, session_id, combined_text, documents)
+                if not conversation or isinstance(conversation, dict):
+                    raise HTTPException(status_code=500, detail="Failed to initialize conversation chain.")
+            else:
+                conversation = get_session_conversation_chain(session_id)
+                if not conversation:
+                    raise HTTPException(status_code=400, detail="Please upload a PDF file first to ask questions about it.")
+            inputs = {'question': question}
+        else:
+            conversation = get_general_conversation_chain(session_id)
+            inputs = {'input': question}
+
+        # Reject before the 200 event stream starts if the model's queue is already full
+        check_admission(DEFAULT_MODEL)
+
+    except QueueFullError:
+        raise
     except Exception as e:
         print(e)
         return {
@@ -215,6 +359,33 @@ async def legal_bot(
             'error_file_details': f'Error on line {e.__traceback__.tb_lineno} inside {__file__}',
             'session_id': session_id
         }
+
+    async def events():
+        yield sse_event({"session_id": session_id}, "session")
+
+        answer = ""
+        output = {}
+        async for kind, value in stream_conversation_answer(conversation, inputs):
+            if kind == "token":
+                answer += value
+                yield sse_event({"text": value}, "token")
+            else:
+                output = value
+
+        if not answer:
+            # Nothing was streamed (e.g. the LLM call was served without tokens); send the final text at once
+            answer = output.get("answer") or output.get("response") or ""
+            if answer:
+                yield sse_event({"text": answer}, "token")
+
+        if with_file:
+            update_document_chat_history(session_id, conversation.memory)
+        else:
+            update_general_chat_history(session_id, conversation.memory)
+
+        yield sse_event({"answer": answer.strip(), "session_id": session_id}, "done")
+
+    return event_stream_response(events())
     
 @router.delete("/legal_bot/clear_history")
 async def clear_history(session_id: str = Form(...), with_file: bool = Form(False)):
@@ -238,31 +409,35 @@ async def faq(file: UploadFile = File(...)):
         if file:
             if not file.filename.endswith(".pdf"):
                 raise HTTPException(status_code=400, detail="Only PDF files are supported")
-            file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-            async with aiofiles.open(file_path, "wb") as f:
-                while chunk := await file.read(1024):
-                    await f.write(chunk)
-            document_text = await extract_text_from_file_path(file_path)
+            async with temporary_upload(file) as (file_path, digest):
+                document_text = await extract_text_from_file_path(file_path, digest)
             if not document_text:
                 raise HTTPException(status_code=400, detail="Failed to extract text from the uploaded file.")
-            prompt = f"""You are a legal expert specialized in Indian law. Based on the provided document, generate a list of frequently asked questions (FAQs) that a user might have regarding the content of the document. The FAQs should be relevant and specific to the document's subject matter.
+            prompt, options = budget_prompt(
+                lambda document_text: f"""You are a legal expert specialized in Indian law. Based on the provided document, generate a list of frequently asked questions (FAQs) that a user might have regarding the content of the document. The FAQs should be relevant and specific to the document's subject matter.
             Note: Do not answer the questions just formulate the questions pertaining to the document. Just list the questions without any additional text or formatting.
-            The document content is: {document_text}"""
+            The document content is: {document_text}""",
+                {"document_text": document_text},
+                DEFAULT_MODEL
+            )
         
         # Send to model and process response
         payload = {
             "model": DEFAULT_MODEL,
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            "options": options
         }
         
-        response = await call_ollama_api("api/generate", method="POST", json_data=payload)
+        response = await call_ollama_api("api/generate", method="POST", json_data=payload, priority=BATCH)
         raw_response = response.get("response", "")
         faq_list = [q.strip("- ").strip() for q in raw_response.split("\n") if q.strip()]
         if faq_list and faq_list[0].lower().startswith("here are"):
             faq_list = faq_list[1:]
         return JSONResponse(content={"faqs": faq_list})
     
+    except QueueFullError:
+        raise
     except Exception as e:
         return ({
             'error': str(e),
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from ..services.metrics import render_metrics
+from prometheus_client import CONTENT_TYPE_LATEST
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: request and stage latency histograms plus LLM, index and cache gauges of all workers."""
+    return Response(content=await render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Response, Request
+from fastapi import APIRouter, Response, Request, Query
+from typing import Optional
 #from ..services.auth_service import authorize
 from ..services.format_res import format_response
 from ..services.call_ollama import call_ollama_api
 from ..services.prompt_gen import generate_prompt
+from ..services.sse import wants_event_stream, stream_generation
+from ..services.llm_scheduler import QueueFullError
 from ..models.request_models import QueryRequest
 from ..config import DEFAULT_MODEL
 
@@ -10,7 +13,7 @@ router = APIRouter()
 
 @router.post("/query")
 #@authorize()
-async def query(request: Request, query: QueryRequest, current_user=None):
+async def query(request: Request, query: QueryRequest, stream: Optional[bool] = Query(False), current_user=None):
     try:
         
         prompt = generate_prompt(query.domain, query.sub_domain, query.options)
@@ -23,6 +26,9 @@ async def query(request: Request, query: QueryRequest, current_user=None):
         
         if query.options:
             payload["options"] = query.options
+
+        if wants_event_stream(request, stream):
+            return stream_generation(payload, format_output=query.format_output)
             
         response = await call_ollama_api("api/generate", method="POST", json_data=payload)
         raw_response = response.get("response", "")
@@ -35,6 +41,8 @@ async def query(request: Request, query: QueryRequest, current_user=None):
         
         return Response(content=formatted_response, media_type="text/html")
         
+    except QueueFullError:
+        raise
     except Exception as e:
         return ({
             'error': str(e),
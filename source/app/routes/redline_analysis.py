@@ -1,46 +1,59 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Response, Form, status, Request
+from fastapi import APIRouter, UploadFile, File, HTTPException, Response, Form, status, Request, Query
 #from ..services.auth_service import authorize
-from fastapi.responses import JSONResponse
-from typing import Optional
-import json
-import re
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, List, Optional, Tuple
+from contextlib import aclosing
+import asyncio
 from ..config import DEFAULT_MODEL
-from ..services import extract_text_from_pdf, compare_texts, highlight_differences, call_ollama_api, format_response
+from ..services import highlight_differences, call_ollama_api, stream_ollama_api, format_response
+from ..services.llm_scheduler import QueueFullError, check_admission
+from ..services.llm_cache import is_cacheable, get_cached_response, store_response
+from ..services.json_stream import JsonArrayStream
+from ..services.sse import wants_event_stream, sse_event, event_stream_response
+from ..services.token_budget import budget_prompt
+from ..services.compare_pdf_text import compare_documents
+from ..services.pdf_document import load_pdf_document
+from ..services.uploads import temporary_upload
+from ..services.jobs import job_handler, new_job_id, save_job_upload, submit_job
 
 router = APIRouter()
 
-def generate_llm_prompt(formatted_data: dict, file2_text: str) -> str:
-    prompt = "You are a legal document analyzer.You are provided with the differences between two legal documents. Review the changes and respond ONLY in JSON array format.\n\n"
+def generate_llm_prompt(formatted_data: dict, file2_text: str, model: Optional[str] = None) -> Tuple[str, Dict]:
+    """
+    Builds the deep-search prompt and its Ollama options. When the prompt is too long
+    the file2 context is trimmed before the list of changes.
+    """
+    header = "You are a legal document analyzer.You are provided with the differences between two legal documents. Review the changes and respond ONLY with a JSON object of the form {\"changes\": [...]}.\n\n"
+    changes = ""
 
     if "added" in formatted_data and isinstance(formatted_data["added"], list):
-        prompt += "### Added Lines:\n"
+        changes += "### Added Lines:\n"
         for idx, line_content in enumerate(formatted_data["added"], start=1):
-            prompt += f"- (Added Line {idx}): {line_content}\n"
-    prompt += "\n"
+            changes += f"- (Added Line {idx}): {line_content}\n"
+    changes += "\n"
 
     if "removed" in formatted_data and isinstance(formatted_data["removed"], list):
-        prompt += "### Removed Lines:\n"
+        changes += "### Removed Lines:\n"
         for idx, line_content in enumerate(formatted_data["removed"], start=1):
-            prompt += f"- (Removed Line {idx}): {line_content}\n"
-    prompt += "\n"
+            changes += f"- (Removed Line {idx}): {line_content}\n"
+    changes += "\n"
 
     if "changed_lines" in formatted_data and isinstance(formatted_data["changed_lines"], list):
-        prompt += "### Changed Lines:\n"
+        changes += "### Changed Lines:\n"
         for change in formatted_data["changed_lines"]:
-            prompt += f"Original: {change['original']['content']}\n"
-            prompt += f"Modified: {change['modified']['content']}\n"
-    prompt += "\n"
+            changes += f"Original: {change['original']['content']}\n"
+            changes += f"Modified: {change['modified']['content']}\n"
+    changes += "\n"
 
     if "unified_diff" in formatted_data:
-        prompt += "### Unified Diff:\n"
-        prompt += f"{formatted_data['unified_diff']}\n\n"
+        changes += "### Unified Diff:\n"
+        changes += f"{formatted_data['unified_diff']}\n\n"
 
-    prompt += f"Below is the extracted text from file2 for context:\n{file2_text}\n\n"
-    prompt += '''You are a legal document analyzer.
+    instructions = '''You are a legal document analyzer.
 
-Your task is to analyze a set of differences between two versions of a legal document and return your findings in a **strict JSON array**.
+Your task is to analyze a set of differences between two versions of a legal document and return your findings as a **strict JSON object** whose "changes" key holds an array of findings.
 
-Each object in the array MUST contain the following depending on the change type:
+Each object in the "changes" array MUST contain the following depending on the change type:
 
 ---
 
@@ -70,11 +83,128 @@ Each object in the array MUST contain the following depending on the change type
 
 ⚠️ You must NEVER leave any required field as null or undefined. If the input data does not include the required field, infer it or say “Unknown - please verify manually.”
 
-You MUST return only valid JSON — no markdown, no commentary, no extra text.
-].'''
-
-    return prompt
-
+You MUST return only valid JSON — no markdown, no commentary, no extra text.'''
+
+    return budget_prompt(
+        lambda changes, file2_text: header + changes + f"Below is the extracted text from file2 for context:\n{file2_text}\n\n" + instructions,
+        {"changes": changes, "file2_text": file2_text},
+        model,
+        priorities={"changes": 0, "file2_text": 1},
+        output_tokens=2048
+    )
+
+
+def _analysis_item(item, text1_lines: List[str], text2_lines: List[str]) -> Optional[Dict]:
+    """Normalises one finding from the LLM; returns None for items that can't be used."""
+    if not isinstance(item, dict) or not isinstance(item.get("type"), str):
+        return None
+    analysis_item = {"type": item["type"].lower()}
+    if "line_number" in item:
+        analysis_item["line_number"] = item["line_number"]
+
+    if analysis_item["type"] == "modified":
+        original_content = item.get("original")
+        modified_content = item.get("modified")
+        analysis_item["original"] = original_content
+        analysis_item["modified"] = modified_content
+        # Try to find line numbers (can be unreliable with difflib)
+        original_line_number = text1_lines.index(original_content) + 1 if original_content in text1_lines else None
+        modified_line_number = text2_lines.index(modified_content) + 1 if modified_content in text2_lines else None
+        analysis_item["line_number"] = original_line_number or modified_line_number
+
+    elif analysis_item["type"] == "added":
+        analysis_item["content"] = item.get("content") or item.get("modified")
+
+        if "line_number" not in item or item["line_number"] is None:
+            line_number = text2_lines.index(analysis_item["content"]) + 1 if analysis_item["content"] in text2_lines else None
+            analysis_item["line_number"] = line_number
+
+    elif analysis_item["type"] == "removed":
+        analysis_item["content"] = item.get("content") or item.get("original")
+
+        if not analysis_item["content"]:
+            return None  # skip this item entirely
+
+        if "line_number" not in item or item["line_number"] is None:
+            line_number = text1_lines.index(analysis_item["content"]) + 1 if analysis_item["content"] in text1_lines else None
+            analysis_item["line_number"] = line_number
+
+    analysis_item["Significance"] = item.get("Significance")
+    analysis_item["description"] = item.get("description")
+    return analysis_item
+
+def _deep_search_payload(text2: str, comparison: dict, model: str) -> Dict:
+    prompt, options = generate_llm_prompt(comparison, text2, model)
+    # JSON mode keeps the output parseable: no markdown fences or commentary around the findings
+    return {"model": model, "prompt": prompt, "stream": False, "format": "json", "options": options}
+
+async def run_deep_search(text1: str, text2: str, comparison: dict, model: str) -> Dict:
+    """Asks the LLM to explain each change between the two documents, with its significance."""
+    response = await call_ollama_api("api/generate", method="POST", json_data=_deep_search_payload(text2, comparison, model))
+    parser = JsonArrayStream(key="changes")
+    llm_analysis = parser.feed(response.get("response", ""))
+    if not parser.started:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not find JSON in LLM response")
+    if parser.skipped:
+        print(f"Deep search: skipped {parser.skipped} malformed item(s) in the LLM response")
+
+    text1_lines = text1.splitlines()
+    text2_lines = text2.splitlines()
+    detailed_analysis = [item for item in (_analysis_item(item, text1_lines, text2_lines) for item in llm_analysis) if item]
+    return {"detailed_analysis": detailed_analysis}
+
+def stream_deep_search(text1: str, text2: str, comparison: dict, model: str) -> StreamingResponse:
+    """
+    Streams the deep-search findings as SSE: one `item` event per finding as soon as the
+    LLM has written it, then a `done` event with the counts. Generation is stopped once
+    the findings array is closed, so nothing the model writes after it is paid for.
+    """
+    payload = _deep_search_payload(text2, comparison, model)
+    check_admission(model)
+    text1_lines = text1.splitlines()
+    text2_lines = text2.splitlines()
+    parser = JsonArrayStream(key="changes")
+
+    async def generated_text():
+        cached = await get_cached_response(payload) if is_cacheable("api/generate", payload) else None
+        if cached is not None:
+            yield cached.get("response", "")
+            return
+        response = ""
+        async with aclosing(stream_ollama_api("api/generate", payload)) as chunks:
+            async for chunk in chunks:
+                response += chunk.get("response", "")
+                yield chunk.get("response", "")
+                if parser.closed:
+                    # Leaving the stream closes the connection, which makes Ollama stop generating
+                    break
+        if parser.closed and is_cacheable("api/generate", payload):
+            await store_response(payload, {"done": True, "model": payload["model"], "response": response})
+
+    async def events():
+        count = 0
+        async for text in generated_text():
+            for item in parser.feed(text):
+                analysis_item = _analysis_item(item, text1_lines, text2_lines)
+                if analysis_item:
+                    count += 1
+                    yield sse_event(analysis_item, "item")
+        if not parser.started:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not find JSON in LLM response")
+        yield sse_event({"count": count, "skipped": parser.skipped, "complete": parser.closed}, "done")
+
+    return event_stream_response(events())
+
+async def _compare_pdf_files(path1: str, path2: str) -> Tuple[str, str, dict]:
+    document1, document2 = await asyncio.gather(load_pdf_document(path1), load_pdf_document(path2))
+    return document1.text(), document2.text(), await asyncio.to_thread(compare_documents, document1, document2)
+
+@job_handler("redline_deep_search")
+async def redline_deep_search_job(params: Dict, progress) -> Dict:
+    await progress("Comparing documents", 0.0)
+    text1, text2, comparison = await _compare_pdf_files(params["file1_path"], params["file2_path"])
+    await progress("Analysing changes", 0.2)
+    return await run_deep_search(text1, text2, comparison, params["model"])
 
 @router.post("/redline_analysis")
 #@authorize()
@@ -84,84 +214,29 @@ async def redline_analysis(
     file2: UploadFile = File(...),
     model: Optional[str] = Form(DEFAULT_MODEL),
     deep_search: bool = Form(False),
+    stream: Optional[bool] = Query(False),
     current_user=None
 ):
     try:
         if not file1.filename.endswith(".pdf") or not file2.filename.endswith(".pdf"):
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
-        text1, pdf_stream1 = extract_text_from_pdf(file1)
-        text2, pdf_stream2 = extract_text_from_pdf(file2)
-
-        text1_lines = text1.splitlines()
-        text2_lines = text2.splitlines()
+        # One parse per file, read from disk by the extraction processes: text, diff and highlight boxes
+        # all come from the same document model
+        async with temporary_upload(file1) as (path1, digest1), temporary_upload(file2) as (path2, digest2):
+            document1, document2 = await asyncio.gather(load_pdf_document(path1, digest1), load_pdf_document(path2, digest2))
+        text1, text2 = document1.text(), document2.text()
 
         # Compare documents
-        comparison = compare_texts("\n".join(text1_lines), "\n".join(text2_lines))
+        comparison = compare_documents(document1, document2)
+        if deep_search and wants_event_stream(request, stream):
+            return stream_deep_search(text1, text2, comparison, model)
         if deep_search:
-            prompt = generate_llm_prompt(comparison, text2)
-            response = await call_ollama_api("api/generate", method="POST", json_data={"model": model, "prompt": prompt, "stream": False})
-            raw_response = response.get("response", "")
-
-            # Attempt to find the JSON within the markdown code block
-            json_start = raw_response.find('[')
-            json_end = raw_response.rfind(']')
-            if json_start != -1 and json_end != -1 and json_start < json_end:
-                json_string = raw_response[json_start:json_end + 1]
-                # Clean up non-standard whitespace and control characters
-                #cleaned_json_string = re.sub(r'\s', ' ', json_string).replace('\\', '')  
-                cleaned_json_string = re.sub(r'[^\x20-\x7E]', '', json_string)
-                # print(cleaned_json_string)
-                try:
-                    llm_analysis = json.loads(cleaned_json_string)
-                    detailed_analysis = []
-                    text1_lines = text1.splitlines()
-                    text2_lines = text2.splitlines()
-
-                    for item in llm_analysis:
-                        analysis_item = {"type": item.get("type").lower()}
-                        if "line_number" in item:
-                            analysis_item["line_number"] = item["line_number"]
-
-                        if analysis_item["type"] == "modified":
-                            original_content = item.get("original")
-                            modified_content = item.get("modified")
-                            analysis_item["original"] = original_content
-                            analysis_item["modified"] = modified_content
-                            # Try to find line numbers (can be unreliable with difflib)
-                            original_line_number = text1_lines.index(original_content) + 1 if original_content in text1_lines else None
-                            modified_line_number = text2_lines.index(modified_content) + 1 if modified_content in text2_lines else None
-                            analysis_item["line_number"] = original_line_number or modified_line_number
-
-                        elif analysis_item["type"] == "added":
-                            analysis_item["content"] = item.get("content") or item.get("modified")
-
-                            if "line_number" not in item or item["line_number"] is None:
-                                line_number = text2_lines.index(analysis_item["content"]) + 1 if analysis_item["content"] in text2_lines else None
-                                analysis_item["line_number"] = line_number
-
-                        elif analysis_item["type"] == "removed":
-                            analysis_item["content"] = item.get("content") or item.get("original")
-
-                            if not analysis_item["content"]:
-                                continue  # skip this item entirely
-
-                            if "line_number" not in item or item["line_number"] is None:
-                                line_number = text1_lines.index(analysis_item["content"]) + 1 if analysis_item["content"] in text1_lines else None
-                                analysis_item["line_number"] = line_number
-
-                        analysis_item["Significance"] = item.get("Significance")
-                        analysis_item["description"] = item.get("description")
-                        detailed_analysis.append(analysis_item)
-
-                    return {"detailed_analysis": detailed_analysis}
-                except json.JSONDecodeError as e:
-                    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to decode LLM response as JSON after aggressive cleaning {e}")
-            else:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not find JSON in LLM response")
+            return await run_deep_search(text1, text2, comparison, model)
         else:
             try:
-                highlighted_pdf = highlight_differences(pdf_stream2, comparison)
+                await file2.seek(0)
+                highlighted_pdf = highlight_differences(await file2.read(), comparison, document2)
                 return Response(content=highlighted_pdf, media_type="application/pdf")
             except Exception as e:
                 return JSONResponse(
@@ -172,6 +247,36 @@ async def redline_analysis(
                 "error_file_details": f"error on line {e.__traceback__.tb_lineno} inside {__file__}"
                 })
 
+    except QueueFullError:
+        raise
+    except Exception as e:
+        return JSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={
+            "error": str(e),
+            "error_type": type(e).__name__,
+            "error_file_details": f"error on line {e.__traceback__.tb_lineno} inside {__file__}"
+        })
+
+@router.post("/redline_analysis/jobs")
+async def submit_redline_analysis_job(
+    file1: UploadFile = File(...),
+    file2: UploadFile = File(...),
+    model: Optional[str] = Form(DEFAULT_MODEL)
+):
+    """Queues a deep_search redline analysis as a background job; poll /api/jobs/{job_id} for progress and the result."""
+    try:
+        if not file1.filename.endswith(".pdf") or not file2.filename.endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are supported")
+        job_id = new_job_id()
+        # Saved under distinct names: both uploads may have the same filename
+        file1.filename, file2.filename = f"original_{file1.filename}", f"revised_{file2.filename}"
+        params = {
+            "file1_path": await save_job_upload(job_id, file1),
+            "file2_path": await save_job_upload(job_id, file2),
+            "model": model
+        }
+        return await submit_job("redline_deep_search", params, job_id)
     except Exception as e:
         return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -179,4 +284,4 @@ async def redline_analysis(
             "error": str(e),
             "error_type": type(e).__name__,
             "error_file_details": f"error on line {e.__traceback__.tb_lineno} inside {__file__}"
-        })
\ No newline at end of file
+        })
@@ -1,44 +1,36 @@
 from fastapi import APIRouter, Response, UploadFile, File, Form, Query, Request
 #from ..services.auth_service import authorize
 from fastapi.responses import JSONResponse
+import asyncio
 import json
 from typing import Optional, Any
 from ..services.call_ollama import call_ollama_api
 from ..services.format_res import format_response
 from ..services.extract_text import extract_text_from_file
+from ..services.summarize import needs_map_reduce, condense_document
+from ..services.token_budget import budget_prompt
+from ..services.sse import wants_event_stream, stream_generation
+from ..services.llm_scheduler import QueueFullError
 from ..config import DEFAULT_MODEL
 
 router = APIRouter()
 
-@router.post("/summarize_file")
-#@authorize()
-async def summarize_file(
-    request: Request,
-    file: UploadFile = File(...),
-    model: Optional[str] = Form(DEFAULT_MODEL),
-    options: Optional[str] = Form(None),
-    analysis_type: str = Form(enum=["summary", "intent", "legal_analysis"]),
-    current_user=None
-):
-    try:
-        content = extract_text_from_file(file)
-        # Convert options string to dict if provided
-        options_dict = json.loads(options) if options else {}
-        
-        if analysis_type == "summary":
-            prompt = f"""You are a legal document specialist. I'm sending you a document for analysis.
-            Please provide a comprehensive summary of the document, including:
-            1. Document type and purpose
-            2. Key parties involved
-            3. Main terms and conditions
-            4. Important dates or deadlines
-            5. Any notable clauses or provisions
-            6. Any potential legal issues or concerns
-            Here's the document content:
-            {content}
-            """
-        elif analysis_type == "intent":
-            prompt = f"""Analyze the provided legal document to determine its type based on content and intent.
+def build_analysis_prompt(analysis_type: str, content: str) -> str:
+    """Analysis prompt for the uploaded document's text (or its condensed summary)."""
+    if analysis_type == "summary":
+        return f"""You are a legal document specialist. I'm sending you a document for analysis.
+        Please provide a comprehensive summary of the document, including:
+        1. Document type and purpose
+        2. Key parties involved
+        3. Main terms and conditions
+        4. Important dates or deadlines
+        5. Any notable clauses or provisions
+        6. Any potential legal issues or concerns
+        Here's the document content:
+        {content}
+        """
+    elif analysis_type == "intent":
+        return f"""Analyze the provided legal document to determine its type based on content and intent.
 
 Document Text:
 
@@ -67,10 +59,10 @@ For a document detailing the transfer of property ownership, the output would be
 Note:
 
 If the full text is too lengthy, include a concise summary that preserves key terms and context to aid accurate classification. The file content is: 
-            {content}
-            """
-        elif analysis_type == "legal_analysis":
-            prompt = f"""You are an expert legal analyst specializing in Indian law, providing detailed legal analysis for lawyers. Analyze the given legal document using a structured reasoning approach (IRAC/FIRAC) based on its nature. Your response should include:
+        {content}
+        """
+    elif analysis_type == "legal_analysis":
+        return f"""You are an expert legal analyst specializing in Indian law, providing detailed legal analysis for lawyers. Analyze the given legal document using a structured reasoning approach (IRAC/FIRAC) based on its nature. Your response should include:
  
 Key Legal Element Extraction : Identify and explicitly outline the core legal elements in the document.
 Legal Reasoning : Apply expert-level legal reasoning, citing relevant case precedents, statutory provisions, and applicable legal principles.
@@ -81,18 +73,48 @@ Strategic Legal Insights : Offer possible legal strategies, arguments, or risk a
 Ensure clarity, precision, and strict adherence to Indian legal principles while maintaining a professional and structured format suitable for legal practitioners. 
  
 Find below the text of the uploaded document:
-            {content}
-            """
+        {content}
+        """
+    raise ValueError(f"Unsupported analysis type: {analysis_type}")
+
+@router.post("/summarize_file")
+#@authorize()
+async def summarize_file(
+    request: Request,
+    file: UploadFile = File(...),
+    model: Optional[str] = Form(DEFAULT_MODEL),
+    options: Optional[str] = Form(None),
+    analysis_type: str = Form(enum=["summary", "intent", "legal_analysis"]),
+    hierarchical: Optional[bool] = Form(None),
+    stream: Optional[bool] = Query(False),
+    current_user=None
+):
+    try:
+        content = await extract_text_from_file(file)
+        # Convert options string to dict if provided
+        options_dict = json.loads(options) if options else {}
+
+        # Documents too long for one prompt are condensed chunk by chunk first (hierarchical=None means auto)
+        if hierarchical or (hierarchical is None and await asyncio.to_thread(needs_map_reduce, content, model)):
+            content = await condense_document(content, model, options_dict)
+        
+        prompt, options_dict = budget_prompt(
+            lambda content: build_analysis_prompt(analysis_type, content),
+            {"content": content},
+            model,
+            options=options_dict
+        )
         
         # Send to model and process response
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False
+            "stream": False,
+            "options": options_dict
         }
-        
-        if options_dict:
-            payload["options"] = options_dict
+
+        if wants_event_stream(request, stream):
+            return stream_generation(payload)
             
         response = await call_ollama_api("api/generate", method="POST", json_data=payload)
         raw_response = response.get("response", "")
@@ -105,6 +127,8 @@ Find below the text of the uploaded document:
             content={"error": "Invalid options format. Please provide a valid JSON."},
             status_code=400
         )
+    except QueueFullError:
+        raise
     except Exception as e:
         return ({
             'error': str(e),
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from ..services.llm_cache import get_cache_stats
+from ..services.extraction_cache import get_extraction_cache_stats
+from ..services.embeddings import get_embedding_stats
+from ..services.single_flight import get_single_flight_stats
+from ..services.llm_scheduler import get_scheduler_stats
+from ..services.ollama_backends import get_backend_stats
+from ..services.tracing import get_trace, get_slow_traces
+from ..services.warmup import get_readiness
+from ..config import TRACE_ENDPOINTS_ENABLED
+
+router = APIRouter()
+
+@router.get("/ready")
+async def ready():
+    """Readiness probe: 503 until this worker has loaded the models, embeddings and tokenizers."""
+    readiness = get_readiness()
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content=readiness)
+    return readiness
+
+@router.get("/llm_cache/stats")
+async def llm_cache_stats():
+    """Hit/miss counters and size of the shared LLM response cache."""
+    try:
+        return await get_cache_stats()
+    except Exception as e:
+        return ({
+            'error': str(e),
+            'error_type': str(type(e).__name__),
+            'error_file_details': f'error on line {e.__traceback__.tb_lineno} inside {__file__}'
+        })
+
+@router.get("/extraction_cache/stats")
+async def extraction_cache_stats():
+    """Hit/miss counters and size of the shared cache of extracted document text."""
+    return await get_extraction_cache_stats()
+
+@router.get("/embeddings/stats")
+async def embeddings_stats():
+    """Embedding models loaded by this worker, with their load time and weight memory."""
+    return get_embedding_stats()
+
+@router.get("/single_flight/stats")
+async def single_flight_stats():
+    """How many LLM calls in this worker were started vs. joined an identical in-flight call."""
+    return get_single_flight_stats()
+
+@router.get("/scheduler/stats")
+async def scheduler_stats():
+    """Per-model generation slots, queue depth by priority and queue wait times for this worker."""
+    return get_scheduler_stats()
+
+@router.get("/backends/stats")
+async def backends_stats():
+    """Health, outstanding requests and loaded models of each Ollama backend, as seen by this worker."""
+    return get_backend_stats()
+
+def traces_enabled():
+    """Hides the trace endpoints unless TRACE_ENDPOINTS_ENABLED is set."""
+    if not TRACE_ENDPOINTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@router.get("/traces/slow", dependencies=[Depends(traces_enabled)])
+async def slow_traces(limit: int = Query(20, ge=1, le=500)):
+    """Most recent requests slower than TRACE_SLOW_THRESHOLD_MS, across all workers, newest first."""
+    return await get_slow_traces(limit)
+
+@router.get("/traces/{trace_id}", dependencies=[Depends(traces_enabled)])
+async def trace_detail(trace_id: str):
+    """Span tree of one request, by the id returned in its X-Trace-Id header."""
+    trace = await get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found. Only slow requests are kept by every worker.")
+    return trace
@@ -1,29 +1,50 @@
-from .format_res import format_response
-from .call_ollama import call_ollama_api
+from .format_res import format_response, format_response_stream
+from .llm_cache import get_cache_stats
+from .call_ollama import call_ollama_api, stream_ollama_api, init_ollama_client, close_ollama_client
 from .prompt_gen import generate_prompt
+from .summarize import condense_document, split_into_chunks
+from .uploads import save_upload, temporary_upload
 from .extract_text import extract_text_from_file, extract_text_from_file_path
+from .tabular import TABULAR_EXTENSIONS, tabular_text
 from .custom_prompt import customised_prompt
-from .compare_pdf_text import compare_texts
+from .compare_pdf_text import compare_texts, compare_documents
+from .pdf_document import PdfDocument, load_pdf_document
 from .extract_pdf_text import extract_text_from_pdf
 from .highlight_diff import highlight_differences
-from .chat_with_rag import get_or_create_conversation_chain, clear_session_history, get_session_conversation_chain, get_general_conversation_chain, update_general_chat_history, preprocess_text
+from .chat_with_rag import get_or_create_conversation_chain, clear_session_history, get_session_conversation_chain, get_general_conversation_chain, update_general_chat_history, update_document_chat_history, stream_conversation_answer, preprocess_text
 from .court_proceedings import is_likely_case_file, parse_conversation, _load_simulation_data, _save_simulation_data, load_vector_store_of_case, create_vector_store_from_case, _get_simulation_file_path, get_court_proceedings_conversation_chain, court_proceedings_conversation_chain, extract_conversational_lines_from_chat_history
 
 __all__ = ['format_response',
+           'format_response_stream',
            'call_ollama_api',
+           'stream_ollama_api',
+           'get_cache_stats',
+           'init_ollama_client',
+           'close_ollama_client',
            'generate_prompt',
+           'condense_document',
+           'split_into_chunks',
            'extract_text_from_file',
            'customised_prompt',
            'compare_texts',
+           'compare_documents',
+           'PdfDocument',
+           'load_pdf_document',
            'extract_text_from_pdf',
            'highlight_differences',
            'get_or_create_conversation_chain',
            'extract_text_from_file_path',
+           'save_upload',
+           'temporary_upload',
+           'TABULAR_EXTENSIONS',
+           'tabular_text',
            'clear_session_history',
            'get_session_conversation_chain',
            'get_general_conversation_chain',
            '_load_session_data',
            'update_general_chat_history',
+           'update_document_chat_history',
+           'stream_conversation_answer',
            'preprocess_text',
            'parse_conversation',
            'is_likely_case_file',
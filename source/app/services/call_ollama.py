@@ -1,24 +1,138 @@
 from fastapi import HTTPException
-import requests
-from typing import Dict
-from ..config import OLLAMA_BASE_URL
-
-async def call_ollama_api(endpoint: str, method: str = "GET", json_data: Dict = None) -> Dict:
-    """Make request to Ollama API using requests library"""
-    url = f"{OLLAMA_BASE_URL}/{endpoint}"
-    
-    try:
-        if method == "GET":
-            response = requests.get(url, timeout=60.0)
-        elif method == "POST":
-            response = requests.post(url, json=json_data, timeout=600.0)
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        response.raise_for_status()
-        return response.json()
-        
-    except requests.exceptions.RequestException as exc:
-        raise HTTPException(status_code=503, detail=f"Error communicating with Ollama: {str(exc)}")
-    except requests.exceptions.HTTPError as exc:
-        raise HTTPException(status_code=exc.response.status_code, detail=f"Ollama API error: {exc.response.text}")
\ No newline at end of file
+import json
+import httpx
+from typing import AsyncIterator, Dict, Optional, Set
+from ..config import OLLAMA_CONNECT_TIMEOUT, OLLAMA_MAX_RETRIES, OLLAMA_KEEP_ALIVE
+from .llm_cache import CACHEABLE_ENDPOINTS, make_cache_key, is_cacheable, get_cached_response, store_response
+from .single_flight import single_flight
+from .llm_scheduler import DEFAULT, llm_slot
+from .metrics import timed, stage
+from .tracing import current_span, record_llm_usage
+from .ollama_backends import CONNECTION_ERRORS, use_backend, wait_before_retry, start_backends, close_backends
+
+async def init_ollama_client():
+    """Probes the Ollama backends and starts their health checks. Called once from the app lifespan."""
+    await start_backends()
+
+async def close_ollama_client():
+    """Stops the health checks and closes every backend's pooled connections."""
+    await close_backends()
+
+def _with_keep_alive(endpoint: str, json_data: Optional[Dict]) -> Optional[Dict]:
+    """
+    Generations carry OLLAMA_KEEP_ALIVE unless the caller set one: Ollama resets a model's
+    unload timer to each request's keep_alive, so one request without it would shorten it.
+    """
+    if endpoint in CACHEABLE_ENDPOINTS and json_data is not None and "keep_alive" not in json_data:
+        return {**json_data, "keep_alive": OLLAMA_KEEP_ALIVE}
+    return json_data
+
+async def _send_request(endpoint: str, method: str, json_data: Optional[Dict]) -> Dict:
+    """
+    Sends one request to the least-loaded backend that has the model, failing over
+    to the other backends (then retrying with jitter) on connection errors.
+    """
+    model = (json_data or {}).get("model")
+    tried: Set[str] = set()
+    attempt = 0
+    while True:
+        async with use_backend(model, exclude=tried) as backend:
+            client = backend.get_client()
+            try:
+                if method == "GET":
+                    response = await client.get(f"/{endpoint}", timeout=httpx.Timeout(60.0, connect=OLLAMA_CONNECT_TIMEOUT))
+                else:
+                    response = await client.post(f"/{endpoint}", json=_with_keep_alive(endpoint, json_data))
+                response.raise_for_status()
+                backend.record_success()
+                return response.json()
+
+            except CONNECTION_ERRORS as exc:
+                backend.record_failure(exc)
+                tried.add(backend.url)
+                if attempt >= OLLAMA_MAX_RETRIES:
+                    raise HTTPException(status_code=503, detail=f"Error communicating with Ollama: {str(exc)}")
+            except httpx.HTTPStatusError as exc:
+                raise HTTPException(status_code=exc.response.status_code, detail=f"Ollama API error: {exc.response.text}")
+            except httpx.HTTPError as exc:
+                raise HTTPException(status_code=503, detail=f"Error communicating with Ollama: {str(exc)}")
+        await wait_before_retry(tried, attempt)
+        attempt += 1
+
+async def _generate(endpoint: str, json_data: Dict, use_cache: bool, priority: int) -> Dict:
+    """Answers a non-streaming generation from the response cache, or from Ollama on a miss."""
+    cacheable = use_cache and is_cacheable(endpoint, json_data)
+    if cacheable:
+        cached = await get_cached_response(json_data)
+        if cached is not None:
+            if current_span() is not None:
+                current_span().set(cached=True)
+            return cached
+
+    async with llm_slot(json_data.get("model"), priority):
+        response = await _send_request(endpoint, "POST", json_data)
+    if cacheable:
+        await store_response(json_data, response)
+    return response
+
+@timed("ollama_call")
+async def call_ollama_api(endpoint: str, method: str = "GET", json_data: Dict = None, use_cache: bool = True, priority: int = DEFAULT) -> Dict:
+    """
+    Make request to Ollama API through the least-loaded healthy backend that has the model.
+
+    Non-streaming generations are served from the response cache when the same
+    (model, prompt, options) was answered before; pass use_cache=False to force a fresh one.
+    Identical generations already in flight in this worker are joined rather than repeated,
+    and new ones wait for a slot in the model's queue in `priority` order.
+    """
+    if method not in ("GET", "POST"):
+        raise ValueError(f"Unsupported HTTP method: {method}")
+
+    if method == "POST" and endpoint in CACHEABLE_ENDPOINTS and json_data and json_data.get("stream") is False:
+        key = f"{endpoint}:{use_cache}:{make_cache_key(json_data)}"
+        response = await single_flight(key, lambda: _generate(endpoint, json_data, use_cache, priority))
+        record_llm_usage(current_span(), response)
+        return response
+
+    return await _send_request(endpoint, method, json_data)
+
+async def stream_ollama_api(endpoint: str, json_data: Dict, priority: int = DEFAULT) -> AsyncIterator[Dict]:
+    """Streams an Ollama generation, yielding each NDJSON chunk as a dict as soon as it arrives."""
+    with stage("ollama_stream", activate=False) as span:
+        async with llm_slot(json_data.get("model"), priority):
+            async for chunk in _stream_request(endpoint, json_data):
+                if chunk.get("done"):
+                    record_llm_usage(span, chunk)
+                yield chunk
+
+async def _stream_request(endpoint: str, json_data: Dict) -> AsyncIterator[Dict]:
+    payload = {**_with_keep_alive(endpoint, json_data), "stream": True}
+    tried: Set[str] = set()
+    attempt = 0
+    while True:
+        async with use_backend(json_data.get("model"), exclude=tried) as backend:
+            try:
+                async with backend.get_client().stream("POST", f"/{endpoint}", json=payload) as response:
+                    if response.is_error:
+                        body = await response.aread()
+                        raise HTTPException(status_code=response.status_code, detail=f"Ollama API error: {body.decode(errors='replace')}")
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if "error" in chunk:
+                            raise HTTPException(status_code=502, detail=f"Ollama API error: {chunk['error']}")
+                        yield chunk
+                backend.record_success()
+                return
+
+            except CONNECTION_ERRORS as exc:
+                # Connection errors happen before the first chunk, so retrying can't duplicate output
+                backend.record_failure(exc)
+                tried.add(backend.url)
+                if attempt >= OLLAMA_MAX_RETRIES:
+                    raise HTTPException(status_code=503, detail=f"Error communicating with Ollama: {str(exc)}")
+            except httpx.HTTPError as exc:
+                raise HTTPException(status_code=503, detail=f"Error communicating with Ollama: {str(exc)}")
+        await wait_before_retry(tried, attempt)
+        attempt += 1
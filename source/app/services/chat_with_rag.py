@@ -1,10 +1,8 @@
 import re
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple, Union
 from fastapi import HTTPException
 import numpy as np
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-from langchain_ollama import OllamaLLM
 from langchain.memory import VectorStoreRetrieverMemory, ConversationBufferMemory
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.messages import AIMessage, HumanMessage
@@ -14,11 +12,14 @@ import os
 import json
 import shutil
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from .ollama_llm import ManagedOllamaLLM
+from .llm_scheduler import INTERACTIVE
+from .metrics import timed, stage, track_index
+from .tracing import span, trace_config
+from .embeddings import get_embeddings, build_faiss_index
 from ..config import (
     FAISS_INDEX_PATH,
-    EMBEDDING_MODEL,
     DEFAULT_MODEL,
-    DEVICE,
     OLLAMA_BASE_URL
 )
 
@@ -68,31 +69,54 @@ def _load_session_data(session_id: str) -> Optional[dict]:
     return None
 
 # Initialize global components using configurations from config.py
-embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, model_kwargs={'device': DEVICE})
 # tokenizer = AutoTokenizer.from_pretrained(DEFAULT_MODEL)
 # model = AutoModelForCausalLM.from_pretrained(DEFAULT_MODEL)
 # llm_pipeline = pipeline("text-generation", model=model, tokenizer=tokenizer, max_length=MAX_LENGTH, temperature=TEMPERATURE, device=DEVICE)
-llm = OllamaLLM(base_url=OLLAMA_BASE_URL, model=DEFAULT_MODEL)
+llm = ManagedOllamaLLM(base_url=OLLAMA_BASE_URL, model=DEFAULT_MODEL, priority=INTERACTIVE)
 vectorstore: FAISS = None
 conversation_chain: ConversationalRetrievalChain = None
 
+@timed("create_vector_store")
 def create_vector_store_from_text(document_text: str, session_id: str) -> FAISS:
     """Creates a FAISS index from the provided text content."""
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    texts = text_splitter.split_text(document_text)
-    vectorstore = FAISS.from_texts(texts, embedding=embeddings)
+    with span("chunking", characters=len(document_text)):
+        texts = text_splitter.split_text(document_text)
+    with span("embedding", chunks=len(texts)):
+        vectorstore = build_faiss_index(texts)
     session_faiss_path = os.path.join(FAISS_INDEX_PATH, session_id)
     os.makedirs(session_faiss_path, exist_ok=True)
     vectorstore.save_local(session_faiss_path)
     # vectorstore.save_local(FAISS_INDEX_PATH)
-    return vectorstore
+    return track_index(vectorstore)
 
+@timed("create_vector_store")
+def create_vector_store_from_documents(documents: List[Tuple[str, str]], session_id: str) -> FAISS:
+    """
+    Creates a FAISS index from several (filename, text) documents. Each file's chunks are
+    tagged with the file as their `namespace`, so answers can be traced back to (and
+    retrieval filtered by) the document they came from.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    with span("chunking", documents=len(documents)):
+        chunks = text_splitter.create_documents(
+            [preprocess_text(text) for _, text in documents],
+            metadatas=[{"namespace": filename, "source": filename} for filename, _ in documents]
+        )
+    with span("embedding", chunks=len(chunks)):
+        vectorstore = build_faiss_index([chunk.page_content for chunk in chunks], [chunk.metadata for chunk in chunks])
+    session_faiss_path = os.path.join(FAISS_INDEX_PATH, session_id)
+    os.makedirs(session_faiss_path, exist_ok=True)
+    vectorstore.save_local(session_faiss_path)
+    return track_index(vectorstore)
+
+@timed("load_vector_store")
 def load_vector_store(session_id: str) -> Optional[FAISS]:
     """Loads an existing FAISS index for a specific session."""
     session_faiss_path = os.path.join(FAISS_INDEX_PATH, session_id)
     try:
-        vectorstore = FAISS.load_local(session_faiss_path, embeddings)
-        return vectorstore
+        vectorstore = FAISS.load_local(session_faiss_path, get_embeddings())
+        return track_index(vectorstore)
     except Exception:
         return None
 
@@ -183,6 +207,13 @@ def update_general_chat_history(session_id: str, memory: ConversationBufferMemor
         session_data['general_conversation_chain_memory'] = memory.model_dump()
         _save_session_data(session_id, session_data)
 
+def update_document_chat_history(session_id: str, memory: ConversationBufferMemory):
+    """Updates the document chat history in the session data."""
+    session_data = _load_session_data(session_id) or {}
+    if session_data and session_data.get('conversation_chain'):
+        session_data['chat_memory'] = memory.model_dump()
+        _save_session_data(session_id, session_data)
+
 def clear_session_history(session_id: str, with_file: bool = False):
     """Clears the chat history for a specific session, optionally for general or document-related chats."""
     session_data = _load_session_data(session_id)
@@ -203,12 +234,23 @@ def clear_session_history(session_id: str, with_file: bool = False):
                 }
         _save_session_data(session_id, session_data)
 
-def get_or_create_conversation_chain(session_id: str, document_text: Optional[str] = None) -> ConversationalRetrievalChain:
-    """Gets or creates the conversational retrieval chain for a specific session, handling file uploads."""
+def get_or_create_conversation_chain(
+    session_id: str,
+    document_text: Optional[str] = None,
+    documents: Optional[List[Tuple[str, str]]] = None
+) -> ConversationalRetrievalChain:
+    """
+    Gets or creates the conversational retrieval chain for a specific session, handling file uploads.
+    When the uploaded files are passed as (filename, text) `documents`, each one is indexed
+    under its own namespace instead of indexing `document_text` as a single blob.
+    """
     session_data = _load_session_data(session_id) or {}
     if document_text:
-        text = preprocess_text(document_text)
-        vectorstore = create_vector_store_from_text(text, session_id)
+        if documents:
+            vectorstore = create_vector_store_from_documents(documents, session_id)
+        else:
+            text = preprocess_text(document_text)
+            vectorstore = create_vector_store_from_text(text, session_id)
         session_data['vectorstore_path'] = os.path.join(FAISS_INDEX_PATH, session_id)
         session_data['has_document'] = True
         # Create and save the conversation chain immediately after vector store creation
@@ -257,7 +299,8 @@ def get_session_conversation_chain(session_id: str) -> Optional[ConversationalRe
     session_data = _load_session_data(session_id)
     if session_data and session_data.get('conversation_chain'):
         memory_data = session_data.get('chat_memory', {})
-        chat_messages = memory_data.get('messages', []) # Assuming 'messages' key
+        # Saved either as a flat message list or as a dumped ConversationBufferMemory
+        chat_messages = memory_data.get('messages') or memory_data.get('chat_memory', {}).get('messages', [])
         history = ChatMessageHistory()
         for msg in chat_messages:
             if msg.get('type') == 'human':
@@ -281,5 +324,32 @@ def get_session_conversation_chain(session_id: str) -> Optional[ConversationalRe
             return conversation_chain
     return None
 
+async def stream_conversation_answer(
+    conversation: Union[ConversationalRetrievalChain, ConversationChain],
+    inputs: dict
+) -> AsyncIterator[Tuple[str, Union[str, dict]]]:
+    """
+    Streams the answer of a conversation chain as ("token", text) items, ending with
+    a single ("output", result) item once the chain (and its memory update) completes.
+
+    For a ConversationalRetrievalChain only tokens from the answering call are yielded,
+    not the ones from the question-condensing call that runs first.
+    """
+    combine_docs_chain = getattr(conversation, 'combine_docs_chain', None)
+    answer_chain_name = combine_docs_chain.get_name() if combine_docs_chain else None
+    answer_run_ids = set()
 
- 
\ No newline at end of file
+    with stage("chain_stream", activate=False) as chain_span:
+        async for event in conversation.astream_events(inputs, config=trace_config(chain_span), version="v2"):
+            kind = event["event"]
+            if kind == "on_chain_start" and answer_chain_name and event["name"] == answer_chain_name:
+                answer_run_ids.add(event["run_id"])
+            elif kind == "on_llm_stream":
+                if answer_chain_name and not answer_run_ids.intersection(event.get("parent_ids", [])):
+                    continue
+                chunk = event["data"].get("chunk")
+                token = getattr(chunk, "text", None) or getattr(chunk, "content", None) or ""
+                if token:
+                    yield "token", token
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                yield "output", event["data"].get("output") or {}
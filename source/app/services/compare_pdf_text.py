@@ -1,8 +1,17 @@
 import difflib
+from typing import List
+from .metrics import timed
 
+@timed("compare_texts")
 def compare_texts(text1: str, text2: str) -> dict:
-    lines1 = text1.splitlines()
-    lines2 = text2.splitlines()
+    return compare_lines(text1.splitlines(), text2.splitlines())
+
+@timed("compare_texts")
+def compare_documents(document1, document2) -> dict:
+    """`compare_texts` for two `PdfDocument`s, line by line as the model holds them."""
+    return compare_lines(document1.lines(), document2.lines())
+
+def compare_lines(lines1: List[str], lines2: List[str]) -> dict:
     d = difflib.ndiff(lines1, lines2)
     added = [line[2:] for line in d if line.startswith("+ ") and not any(removed_line[2:] == line[2:] for removed_line in d if removed_line.startswith("- "))]
     removed = [line[2:] for line in d if line.startswith("- ") and not any(added_line[2:] == line[2:] for added_line in d if added_line.startswith("+ "))]
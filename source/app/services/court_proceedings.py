@@ -1,9 +1,12 @@
 from fastapi import HTTPException
 from typing import Optional
-from langchain_huggingface import HuggingFaceEmbeddings
-from ..config import EMBEDDING_MODEL, DEVICE, OLLAMA_BASE_URL, DEFAULT_MODEL, FAISS_INDEX_PATH
+from .ollama_llm import ManagedOllamaLLM
+from .llm_scheduler import INTERACTIVE
+from .metrics import timed, track_index
+from .tracing import span
+from .embeddings import get_embeddings, build_faiss_index
+from ..config import OLLAMA_BASE_URL, DEFAULT_MODEL, FAISS_INDEX_PATH
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_ollama import OllamaLLM
 from langchain.memory import VectorStoreRetrieverMemory, ConversationBufferMemory
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.messages import AIMessage, HumanMessage
@@ -15,8 +18,7 @@ import os
 import json
 
 # Initialize global components using configurations from config.py
-embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, model_kwargs={'device': DEVICE})
-llm = OllamaLLM(base_url=OLLAMA_BASE_URL, model=DEFAULT_MODEL)
+llm = ManagedOllamaLLM(base_url=OLLAMA_BASE_URL, model=DEFAULT_MODEL, priority=INTERACTIVE)
 vectorstore: FAISS = None
 conversation_chain: ConversationalRetrievalChain = None
 
@@ -65,25 +67,29 @@ def _load_simulation_data(session_id: str) -> Optional[dict]:
                 }
     return None
 
+@timed("create_vector_store")
 def create_vector_store_from_case(document_text: str, session_id: str) -> FAISS:
     """Creates a FAISS index from the provided text content."""
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    texts = text_splitter.split_text(document_text)
-    vectorstore = FAISS.from_texts(texts, embedding=embeddings)
+    with span("chunking", characters=len(document_text)):
+        texts = text_splitter.split_text(document_text)
+    with span("embedding", chunks=len(texts)):
+        vectorstore = build_faiss_index(texts)
     simulation_faiss_path = os.path.join(FAISS_INDEX_PATH, session_id)
     os.makedirs(simulation_faiss_path, exist_ok=True)
     vectorstore.save_local(simulation_faiss_path)
     # vectorstore.save_local(FAISS_INDEX_PATH)
-    return vectorstore
+    return track_index(vectorstore)
 
+@timed("load_vector_store")
 def load_vector_store_of_case(session_id: str) -> Optional[FAISS]:
     """Loads an existing FAISS index for a specific session."""
     simulation_faiss_path = os.path.join(FAISS_INDEX_PATH, session_id)
     try:
-        vectorstore = FAISS.load_local(simulation_faiss_path, embeddings, allow_dangerous_deserialization=True)
+        vectorstore = FAISS.load_local(simulation_faiss_path, get_embeddings(), allow_dangerous_deserialization=True)
         if vectorstore is None:
             raise ValueError("FAISS.load_local returned None unexpectedly.")
-        return vectorstore
+        return track_index(vectorstore)
     except Exception as e:
         return {
             'error': str(e),
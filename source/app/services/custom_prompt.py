@@ -8,7 +8,7 @@ async def customised_prompt(file: UploadFile, model: Optional[str] = Form(DEFAUL
     """Generate Prompts from custom documents uploaded."""
     try:
         content = ""
-        content = extract_text_from_file(file)
+        content = await extract_text_from_file(file)
         prompt = f"""Please refer the following recommended prompt technique to generate a a prompt first, this newly generated prompt is then to be used to generate the legal document.
  
 The Recommended Prompting Technique: The Enhanced KOF Framework with Role Assignment and Few-Shot Guidance
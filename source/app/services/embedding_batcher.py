@@ -0,0 +1,87 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Callable, Dict, List, Sequence, Tuple
+from ..config import EMBEDDING_BATCH_WAIT_MS, EMBEDDING_BATCH_MAX_ITEMS
+
+class MicroBatcher:
+    """
+    Embeds the texts of concurrent requests together. A request waits at most EMBEDDING_BATCH_WAIT_MS
+    for others to join it, up to EMBEDDING_BATCH_MAX_ITEMS texts; `embed` runs once on all of them
+    (sentence-transformers sorts the batch by length and pads each forward pass to its longest text)
+    and every request gets back the rows of its own texts.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], Sequence], max_items: int = EMBEDDING_BATCH_MAX_ITEMS,
+                 wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        self._embed = embed
+        self.max_items = max_items
+        self.wait = wait_ms / 1000
+        self._queue: queue.Queue[Tuple[List[str], Future]] = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._texts = 0
+
+    def submit(self, texts: List[str]) -> Future:
+        """Queues `texts`; the future resolves to their vectors, in order."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future
+
+    def embed(self, texts: List[str]) -> Sequence:
+        return self.submit(texts).result()
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.wait
+        while size < self.max_items:
+            try:
+                # Whatever arrived while the previous batch ran is taken without waiting
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+            size += len(batch[-1][0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            self._requests += len(batch)
+            self._batches += 1
+            self._texts += len(texts)
+            try:
+                vectors = self._embed(texts) if texts else []
+            except Exception as e:
+                for _, future in batch:
+                    try:
+                        future.set_exception(e)
+                    except InvalidStateError:
+                        pass
+                continue
+            offset = 0
+            for request_texts, future in batch:
+                try:
+                    future.set_result(vectors[offset:offset + len(request_texts)])
+                except InvalidStateError:
+                    pass  # The caller gave up on it
+                offset += len(request_texts)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self._requests,
+            "batches": self._batches,
+            "texts": self._texts,
+            "requests_per_batch": round(self._requests / self._batches, 2) if self._batches else None,
+            "wait_ms": self.wait * 1000,
+            "max_items": self.max_items
+        }
@@ -0,0 +1,62 @@
+import json
+import socket
+import struct
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from ..config import EMBEDDING_SERVER_SOCKET, EMBEDDING_SERVER_TIMEOUT
+
+# Embedding server protocol. A frame is a 4-byte big-endian length and a body. Requests are JSON {"texts": [...]};
+# a response is b"V", the row count and dimension (4 bytes each) and the row-major little-endian float32 vectors,
+# or b"E" and an error message.
+LENGTH = struct.Struct("!I")
+SHAPE = struct.Struct("!II")
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("connection closed by the embedding server")
+        received += n
+    return buffer
+
+def encode_vectors(vectors: np.ndarray) -> List[bytes]:
+    """Response frame of a (rows, dimension) array, as pieces to write without joining them."""
+    data = np.ascontiguousarray(vectors, dtype="<f4")
+    return [LENGTH.pack(1 + SHAPE.size + data.nbytes), b"V", SHAPE.pack(*data.shape), data.data]
+
+def decode_vectors(body: bytearray) -> np.ndarray:
+    """The vectors of a response body, as an array over the body itself (no copy)."""
+    rows, dimension = SHAPE.unpack_from(body, 1)
+    return np.frombuffer(body, dtype="<f4", count=rows * dimension, offset=1 + SHAPE.size).reshape(rows, dimension)
+
+class RemoteEmbeddings(Embeddings):
+    """Embeddings computed by the shared embedding server (see embedding_server) rather than a model in this process."""
+
+    def __init__(self, socket_path: Optional[str] = None):
+        self.socket_path = socket_path or EMBEDDING_SERVER_SOCKET
+
+    def embed_vectors(self, texts: List[str]) -> np.ndarray:
+        request = json.dumps({"texts": texts}).encode("utf-8")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(EMBEDDING_SERVER_TIMEOUT)
+                sock.connect(self.socket_path)
+                sock.sendall(LENGTH.pack(len(request)) + request)
+                body = _recv_exactly(sock, LENGTH.unpack(_recv_exactly(sock, LENGTH.size))[0])
+        except OSError as e:
+            raise RuntimeError(f"Embedding server at {self.socket_path} is unavailable: {e}")
+        if body[:1] == b"E":
+            raise RuntimeError(f"Embedding server error: {body[1:].decode('utf-8', errors='replace')}")
+        return decode_vectors(body)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.embed_vectors(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_vectors([text])[0].tolist()
@@ -0,0 +1,64 @@
+"""
+Embedding server: one process that holds the embedding model for every uvicorn worker on the machine.
+Run it with `python -m source.app.services.embedding_server` and point the workers at it by setting
+EMBEDDING_SERVER_SOCKET; requests arriving together, from any worker, are embedded as one batch.
+"""
+import asyncio
+import json
+import os
+import signal
+from typing import List
+import numpy as np
+from .embedding_client import LENGTH, encode_vectors
+from .embedding_batcher import MicroBatcher
+from .embeddings import embedding_registry
+from ..config import EMBEDDING_SERVER_SOCKET
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return np.asarray(embedding_registry.get().embed_documents(texts), dtype=np.float32)
+
+async def _handle(batcher: MicroBatcher, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(LENGTH.size)
+            except asyncio.IncompleteReadError:
+                return  # The worker is done with this connection
+            request = json.loads(await reader.readexactly(LENGTH.unpack(header)[0]))
+            try:
+                writer.writelines(encode_vectors(await asyncio.wrap_future(batcher.submit(request["texts"]))))
+            except Exception as e:
+                message = f"{type(e).__name__}: {e}".encode("utf-8")
+                writer.writelines([LENGTH.pack(1 + len(message)), b"E", message])
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(socket_path: str):
+    batcher = MicroBatcher(_encode)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # Left behind by a server that didn't shut down cleanly
+    server = await asyncio.start_unix_server(lambda reader, writer: _handle(batcher, reader, writer), path=socket_path)
+    os.chmod(socket_path, 0o660)
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+    print(f"Embedding server listening on {socket_path}")
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def main():
+    if not EMBEDDING_SERVER_SOCKET:
+        raise SystemExit("Set EMBEDDING_SERVER_SOCKET to the Unix socket path the embedding server should listen on.")
+    # Load the model before accepting requests, so the first ones don't wait for it
+    embedding_registry.warm(["warm-up"])
+    asyncio.run(serve(EMBEDDING_SERVER_SOCKET))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+from .embedding_batcher import MicroBatcher
+from .embedding_client import RemoteEmbeddings
+from ..config import EMBEDDING_MODEL, DEVICE, EMBEDDING_SERVER_SOCKET, EMBEDDING_BATCHING_ENABLED
+
+class BatchedEmbeddings(Embeddings):
+    """A model whose document embeddings are batched with those of concurrent requests; queries go straight to it."""
+
+    def __init__(self, model: Embeddings):
+        self.model = model
+        self.batcher = MicroBatcher(model.embed_documents)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.batcher.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+class EmbeddingRegistry:
+    """
+    The embedding models of this process, one per (model name, device), loaded on first use
+    and shared by every service. Loading happens once even when several threads ask at once.
+    """
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, Optional[str]], HuggingFaceEmbeddings] = {}
+        self._load_seconds: Dict[Tuple[str, Optional[str]], float] = {}
+        self._batched: Dict[Tuple[str, Optional[str]], BatchedEmbeddings] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: Optional[str] = None, device: Optional[str] = None) -> HuggingFaceEmbeddings:
+        key = (model_name or EMBEDDING_MODEL, device or DEVICE)
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    started = time.monotonic()
+                    model = HuggingFaceEmbeddings(model_name=key[0], model_kwargs={'device': key[1]})
+                    self._load_seconds[key] = round(time.monotonic() - started, 2)
+                    self._models[key] = model
+        return model
+
+    def batched(self, model_name: Optional[str] = None, device: Optional[str] = None) -> BatchedEmbeddings:
+        """The model of `get`, with the document embeddings of concurrent callers batched together."""
+        key = (model_name or EMBEDDING_MODEL, device or DEVICE)
+        embeddings = self._batched.get(key)
+        if embeddings is None:
+            model = self.get(*key)
+            with self._lock:
+                embeddings = self._batched.setdefault(key, BatchedEmbeddings(model))
+        return embeddings
+
+    def warm(self, texts: List[str], model_name: Optional[str] = None, device: Optional[str] = None) -> List[List[float]]:
+        """Loads a model and runs a first batch through it; returns the vectors of `texts`."""
+        return self.get(model_name, device).embed_documents(texts)
+
+    def stats(self) -> Dict:
+        """Loaded models with their load time and the memory held by their weights."""
+        models = []
+        for (model_name, device), model in list(self._models.items()):
+            try:
+                client = model._client
+                weight_bytes = sum(
+                    tensor.numel() * tensor.element_size()
+                    for tensor in [*client.parameters(), *client.buffers()]
+                )
+            except Exception:
+                weight_bytes = None
+            models.append({
+                "model": model_name,
+                "device": device,
+                "load_seconds": self._load_seconds.get((model_name, device)),
+                "weight_bytes": weight_bytes,
+                "batching": self._batched[(model_name, device)].batcher.stats() if (model_name, device) in self._batched else None
+            })
+        return {"models": models, "weight_bytes": sum(model["weight_bytes"] or 0 for model in models)}
+
+embedding_registry = EmbeddingRegistry()
+
+_remote: Optional[RemoteEmbeddings] = None
+
+def get_embeddings(model_name: Optional[str] = None, device: Optional[str] = None) -> Embeddings:
+    """
+    The embeddings every service uses: the embedding server's when EMBEDDING_SERVER_SOCKET is set,
+    otherwise the shared model of this process (EMBEDDING_MODEL on DEVICE unless given), loaded on first use
+    and batching concurrent requests unless EMBEDDING_BATCHING_ENABLED is off.
+    """
+    global _remote
+    if EMBEDDING_SERVER_SOCKET and model_name is None and device is None:
+        if _remote is None:
+            _remote = RemoteEmbeddings(EMBEDDING_SERVER_SOCKET)
+        return _remote
+    if EMBEDDING_BATCHING_ENABLED:
+        return embedding_registry.batched(model_name, device)
+    return embedding_registry.get(model_name, device)
+
+def build_faiss_index(texts: List[str], metadatas: Optional[List[dict]] = None) -> FAISS:
+    """
+    FAISS index of `texts` embedded with get_embeddings(). The embedding server's float32 rows go into
+    the index as they are, rather than through the Python float lists embed_documents returns.
+    """
+    embeddings = get_embeddings()
+    if isinstance(embeddings, RemoteEmbeddings) and texts:
+        vectors = list(embeddings.embed_vectors(texts))
+    else:
+        vectors = embeddings.embed_documents(texts)
+    return FAISS.from_embeddings(zip(texts, vectors), embeddings, metadatas=metadatas)
+
+def warm_embeddings(texts: List[str]) -> List[List[float]]:
+    """Embeds `texts` the way requests will: loads the model here, or checks that the embedding server answers."""
+    if EMBEDDING_SERVER_SOCKET:
+        return get_embeddings().embed_documents(texts)
+    return embedding_registry.warm(texts)
+
+def get_embedding_stats() -> Dict:
+    return {**embedding_registry.stats(), "server": EMBEDDING_SERVER_SOCKET or None}
@@ -1,13 +1,12 @@
-from fastapi import UploadFile, HTTPException
-import pdfplumber
+from fastapi import UploadFile
 import io
+from .metrics import timed
+from .pdf_document import load_pdf_document
 
-def extract_text_from_pdf(file: UploadFile) -> str:
-    try:
-        content = ""
-        pdf_stream = io.BytesIO(file.file.read())
-        with pdfplumber.open(pdf_stream) as pdf:
-            content = "\n".join([page.extract_text() for page in pdf.pages if page.extract_text()])
-        return content,pdf_stream
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
\ No newline at end of file
+@timed("extract_pdf")
+async def extract_text_from_pdf_bytes(data: bytes):
+    document = await load_pdf_document(data)
+    return document.text(),io.BytesIO(data)
+
+async def extract_text_from_pdf(file: UploadFile) -> str:
+    return await extract_text_from_pdf_bytes(await file.read())
@@ -1,43 +1,58 @@
 from fastapi import UploadFile, HTTPException, status
 from fastapi.responses import JSONResponse
-import PyPDF2
-import io
+from typing import List, Optional
+import asyncio
+from .metrics import timed
+from .pdf_document import load_pdf_document
+from .uploads import temporary_upload
+from .tabular import TABULAR_EXTENSIONS, tabular_text
 
-def extract_text_from_file(file: UploadFile) -> str:
-    
-    file_content = file.file.read()
-    content = ""
-    if file.filename.endswith('.pdf'):
-        pdf_file = io.BytesIO(file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            content += page.extract_text() + "\n"
-    elif file.filename.endswith(('.txt', '.md', '.html')):
+def _join_pages(pages: List[str]) -> str:
+    return "".join(page + "\n" for page in pages)
+
+@timed("extract_text")
+async def extract_text_from_file(file: UploadFile) -> str:
+    if not file.filename.endswith(('.pdf', '.txt', '.md', '.html')):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file format. Please upload a PDF, TXT, MD, or HTML file.")
+    # Spooled to disk and read from there, so a large upload is never held in memory whole
+    async with temporary_upload(file) as (file_path, digest):
+        if file.filename.endswith('.pdf'):
+            document = await load_pdf_document(file_path, digest)
+            return _join_pages(document.page_texts())
         try:
-            content = file_content.decode("utf-8")
+            return await asyncio.to_thread(_read_text_file, file_path, "strict")
         except UnicodeDecodeError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Could not decode the text file. Please check encoding.")
+
+def _read_text_file(file_path: str, errors: str = 'ignore') -> str:
+    with open(file_path, 'rb') as f:
+        return f.read().decode("utf-8", errors=errors) # Handle potential decoding issues
+
+@timed("extract_text")
+async def _extract_text_from_path(file_path: str, digest: Optional[str] = None) -> str:
+    content = ""
+    path = file_path.lower()
+    if path.endswith('.pdf'):
+        document = await load_pdf_document(file_path, digest)
+        content = _join_pages(document.page_texts())
+    elif path.endswith(('.txt', '.md', '.html')):
+        content = await asyncio.to_thread(_read_text_file, file_path)
+    elif path.endswith(TABULAR_EXTENSIONS):
+        content = await asyncio.to_thread(tabular_text, file_path)
     else:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file format. Please upload a PDF, TXT, MD, or HTML file.")
+        print(f"Unsupported file format: {file_path}")
     return content
 
-async def extract_text_from_file_path(file_path: str) -> str:
-    """Extracts text from a file given its path."""
-    content = ""
+async def extract_text_from_file_path(file_path: str, digest: Optional[str] = None) -> str:
+    """
+    Extracts text from a file given its path. PDFs are parsed in extraction worker processes, so several files can be extracted at once.
+    Pass the `digest` returned by `save_upload` to skip re-hashing the file for the extraction cache.
+    """
     try:
-        with open(file_path, 'rb') as f:
-            if file_path.endswith('.pdf'):
-                pdf_reader = PyPDF2.PdfReader(f)
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    content += page.extract_text() + "\n"
-            elif file_path.endswith(('.txt', '.md', '.html')):
-                content = f.read().decode("utf-8", errors='ignore') # Handle potential decoding issues
-            else:
-                print(f"Unsupported file format: {file_path}")
-        return content
+        return await _extract_text_from_path(file_path, digest)
     except FileNotFoundError:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"File not found: {file_path}")
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error extracting text from {file_path}: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error extracting text from {file_path}: {e}")
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from ..config import EXTRACTION_CACHE_ENABLED, EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_BYTES
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_local = threading.local()
+
+def _connect() -> sqlite3.Connection:
+    """This thread's connection to the extraction cache, shared by all workers like the LLM cache."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(EXTRACTION_CACHE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(EXTRACTION_CACHE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "key TEXT PRIMARY KEY, pages TEXT NOT NULL, page_count INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS documents_accessed_at ON documents (accessed_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        _local.conn = conn
+    return conn
+
+def file_digest(file_path: str) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _key(digest: str, extractor: str) -> str:
+    # Extractors differ in their output for the same bytes, so each gets its own entry
+    return f"{extractor}:{digest}"
+
+def _count(conn: sqlite3.Connection, name: str):
+    conn.execute(
+        "INSERT INTO stats (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+        (name,)
+    )
+
+def _get(key: str) -> Optional[List[Any]]:
+    conn = _connect()
+    row = conn.execute("SELECT pages FROM documents WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        _count(conn, "misses")
+        return None
+    conn.execute("UPDATE documents SET accessed_at = ? WHERE key = ?", (time.time(), key))
+    _count(conn, "hits")
+    return json.loads(row[0])
+
+def _evict(conn: sqlite3.Connection):
+    """Drops least-recently-used documents until the cache fits EXTRACTION_CACHE_MAX_BYTES."""
+    total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+    while total_bytes > EXTRACTION_CACHE_MAX_BYTES:
+        rows = conn.execute("SELECT key, size FROM documents ORDER BY accessed_at ASC LIMIT 100").fetchall()
+        if not rows:
+            break
+        conn.executemany("DELETE FROM documents WHERE key = ?", [(key,) for key, _ in rows])
+        total_bytes -= sum(size for _, size in rows)
+
+def _set(key: str, pages: List[Any]):
+    conn = _connect()
+    value = json.dumps(pages, ensure_ascii=False)
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO documents (key, pages, page_count, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (key, value, len(pages), len(value.encode("utf-8")), now, now)
+    )
+    _evict(conn)
+
+async def cached_pages(digest: str, extractor: str, extract: Callable[[], Awaitable[List[Any]]]) -> List[Any]:
+    """
+    Per-page extraction output (JSON-serialisable) of the document with SHA-256 `digest`:
+    from the cache when any endpoint has extracted it before, otherwise by awaiting
+    `extract()` and caching its result.
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return await extract()
+    key = _key(digest, extractor)
+    try:
+        pages = await asyncio.to_thread(_get, key)
+        if pages is not None:
+            return pages
+    except sqlite3.Error as e:
+        print(f"Extraction cache read failed: {e}")
+    pages = await extract()
+    try:
+        await asyncio.to_thread(_set, key, pages)
+    except sqlite3.Error as e:
+        print(f"Extraction cache write failed: {e}")
+    return pages
+
+def _stats() -> Dict:
+    conn = _connect()
+    counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+    documents, pages, total_bytes = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(page_count), 0), COALESCE(SUM(size), 0) FROM documents"
+    ).fetchone()
+    hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+    return {
+        "enabled": EXTRACTION_CACHE_ENABLED,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "documents": documents,
+        "pages": pages,
+        "bytes": total_bytes,
+        "max_bytes": EXTRACTION_CACHE_MAX_BYTES
+    }
+
+async def get_extraction_cache_stats() -> Dict:
+    """Hit/miss counters and size of the extraction cache, shared by all workers."""
+    return await asyncio.to_thread(_stats)
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import subprocess
+import sys
+from multiprocessing.connection import Connection
+from typing import Any, List, Optional, Tuple, Union
+from fastapi import HTTPException, status
+from .extraction_worker import EXTRACTORS
+from ..config import EXTRACTION_WORKERS, EXTRACTION_PAGES_PER_TASK, EXTRACTION_TASK_TIMEOUT, EXTRACTION_MEMORY_LIMIT_MB
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extraction_worker.py")
+
+class _Worker:
+    """
+    One extraction process. It is started as a fresh interpreter rather than forked from
+    the server, whose threads may hold locks (MuPDF's among them) at the time of a fork.
+    """
+
+    def __init__(self):
+        request_read, request_write = os.pipe()
+        result_read, result_write = os.pipe()
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, str(request_read), str(result_write), str(EXTRACTION_MEMORY_LIMIT_MB)],
+            pass_fds=(request_read, result_write)
+        )
+        os.close(request_read)
+        os.close(result_write)
+        self.requests = Connection(request_write, readable=False)
+        self.results = Connection(result_read, writable=False)
+
+    def run(self, extractor: str, source, start: int, end: int) -> Tuple[int, List[Any]]:
+        try:
+            self.requests.send((extractor, source, start, end))
+            if not self.results.poll(EXTRACTION_TASK_TIMEOUT):
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"Text extraction of pages {start + 1}-{end} timed out after {EXTRACTION_TASK_TIMEOUT:.0f}s"
+                )
+            ok, result = self.results.recv()
+        except (EOFError, OSError):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Text extraction of pages {start + 1}-{end} crashed (exit code {self.process.wait(5)})"
+            )
+        if not ok:
+            raise ValueError(result)
+        return result
+
+    def close(self):
+        self.requests.close()
+        self.results.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+
+_idle: List[_Worker] = []
+_slots: Optional[asyncio.Semaphore] = None
+
+async def _run(extractor: str, source, start: int, end: int) -> Tuple[int, List[Any]]:
+    """Extracts one page range on an idle extraction process. One that fails or times out is killed, not reused."""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(EXTRACTION_WORKERS)
+    async with _slots:
+        worker = None
+        while _idle and worker is None:
+            worker = _idle.pop()
+            if worker.process.poll() is not None:
+                worker.close()  # Died while idle
+                worker = None
+        try:
+            if worker is None:
+                worker = await asyncio.to_thread(_Worker)
+            result = await asyncio.to_thread(worker.run, extractor, source, start, end)
+        except BaseException:
+            if worker is not None:
+                worker.close()
+            raise
+        _idle.append(worker)
+        return result
+
+async def extract_pages(extractor: str, source: Union[str, bytes]) -> List[Any]:
+    """
+    Output of `extractor` (a name in extraction_worker.EXTRACTORS) for every page of a PDF,
+    produced off the event loop by at most EXTRACTION_WORKERS extraction processes.
+    The first range also reports the page count; the rest of a long document is
+    then split into ranges that are extracted in parallel and reassembled in order.
+    Raises HTTPException (422) when a range times out or its process dies, and
+    ValueError with the extractor's error otherwise.
+    """
+    if EXTRACTION_WORKERS <= 0:
+        _, pages = await asyncio.to_thread(EXTRACTORS[extractor], source, 0, sys.maxsize)
+        return pages
+    page_count, pages = await _run(extractor, source, 0, EXTRACTION_PAGES_PER_TASK)
+    ranges = [
+        (start, min(start + EXTRACTION_PAGES_PER_TASK, page_count))
+        for start in range(EXTRACTION_PAGES_PER_TASK, page_count, EXTRACTION_PAGES_PER_TASK)
+    ]
+    results = await asyncio.gather(*(_run(extractor, source, start, end) for start, end in ranges))
+    for _, range_pages in results:
+        pages.extend(range_pages)
+    return pages
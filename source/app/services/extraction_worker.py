@@ -0,0 +1,84 @@
+"""
+PDF extraction worker. extraction_pool runs this file as a script, so a worker only loads
+the PDF library and not the app; it then extracts one page range per request it receives.
+Nothing here may import from the app package.
+"""
+import sys
+
+if __name__ == "__main__":
+    # Run as a script: don't let sibling service modules shadow installed packages
+    sys.path.pop(0)
+
+import os
+import resource
+from multiprocessing.connection import Connection
+from typing import Dict, List, Tuple, Union
+import fitz
+
+def document_pages(source: Union[str, bytes], start: int, end: int) -> Tuple[int, List[Dict]]:
+    """
+    Page count, and the text lines of pages [start, end) with their bounding boxes,
+    from a single PyMuPDF pass.
+    """
+    with fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf") as doc:
+        pages = []
+        for page_num in range(start, min(end, doc.page_count)):
+            lines = []
+            for block in doc[page_num].get_text("dict")["blocks"]:
+                for line in block.get("lines", []):
+                    text = "".join(span["text"] for span in line["spans"]).strip()
+                    if text:
+                        lines.append([text, *(round(value, 2) for value in line["bbox"])])
+            pages.append({"lines": lines})
+        return doc.page_count, pages
+
+def docx_layout_pages(source: Union[str, bytes], start: int, end: int) -> Tuple[int, List[Dict]]:
+    """
+    Page count, and pdf2docx's parsed layout of pages [start, end): the same per-range parse
+    pdf2docx does in its own multi-processing mode, to be assembled into one .docx by the caller.
+    """
+    from pdf2docx import Converter  # Only conversions need it
+    converter = Converter(source) if isinstance(source, str) else Converter(stream=source)
+    try:
+        settings = converter.default_settings
+        converter.load_pages(start, end).parse_document(**settings).parse_pages(**settings)
+        return len(converter.pages), [page.store() for page in converter.pages if page.finalized]
+    finally:
+        converter.close()
+
+EXTRACTORS = {"pymupdf": document_pages, "pdf2docx": docx_layout_pages}
+
+def _limit_memory(limit_mb: int):
+    """Caps how much more memory this process may map, on top of what it has after start-up."""
+    if limit_mb <= 0:
+        return
+    try:
+        with open("/proc/self/statm") as f:
+            baseline = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = baseline + limit_mb * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def main(request_fd: int, result_fd: int, memory_limit_mb: int):
+    requests = Connection(request_fd, writable=False)
+    results = Connection(result_fd, readable=False)
+    _limit_memory(memory_limit_mb)
+    while True:
+        try:
+            extractor, source, start, end = requests.recv()
+        except EOFError:
+            return  # The server closed the pipe or exited
+        try:
+            results.send((True, EXTRACTORS[extractor](source, start, end)))
+        except MemoryError as e:
+            results.send((False, f"MemoryError: {e}"))
+            return  # Start afresh rather than keep a fragmented heap
+        except Exception as e:
+            results.send((False, f"{type(e).__name__}: {e}"))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]))
@@ -1,94 +1,114 @@
 from io import BytesIO
-import pandas as pd
+import asyncio
+import itertools
 from docx import Document
-from pptx import Presentation
 import os
-import fitz  # PyMuPDF for PDFs
+from typing import IO, Iterator, List, Optional
 from fastapi import UploadFile
 from starlette.datastructures import UploadFile as StarletteUploadFile
 from pdf2docx import Converter  # Import pdf2docx
 import markdown  # To parse Markdown files
-
-async def convert_file_to_docx(file: UploadFile) -> UploadFile:
+from .extraction_cache import cached_pages
+from .extraction_pool import extract_pages
+from .uploads import temporary_upload
+from .tabular import iter_rows, iter_pptx_lines, capped
+from ..config import TABULAR_BATCH_ROWS
+
+def _pdf_to_docx(pdf_path: str, pages: list) -> bytes:
+    """Assembles the .docx from the page layouts parsed by the extraction processes."""
+    cv = Converter(pdf_path)
+    try:
+        settings = cv.default_settings
+        cv.restore({"page_cnt": len(cv.fitz_doc), "pages": pages})
+        output_buffer = BytesIO()
+        cv.make_docx(output_buffer, **settings)
+        return output_buffer.getvalue()
+    finally:
+        cv.close()
+
+def _batches(rows: Iterator, size: int) -> Iterator[list]:
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+def _write_rows(doc, rows: Iterator[List[str]], summary_rows: Optional[int]):
+    """
+    Writes spreadsheet rows as they are read: TABULAR_BATCH_ROWS tab-separated rows per paragraph,
+    up to TABULAR_MAX_ROWS. With `summary_rows`, a table of the header and that many rows instead.
+    """
+    header = next(rows, None)
+    if header is None:
+        return
+    if summary_rows is not None:
+        table = doc.add_table(rows=1, cols=len(header))
+        for cell, value in zip(table.rows[0].cells, header):
+            cell.text = value
+        for row in itertools.islice(rows, summary_rows):
+            for cell, value in zip(table.add_row().cells, row):
+                cell.text = value
+        shown = len(table.rows) - 1
+        doc.add_paragraph(f"{shown} of {shown + sum(1 for _ in rows)} rows shown.")
+        return
+    lines = ("\t".join(row) for row in itertools.chain([header], rows))
+    for batch in _batches(capped(lines), TABULAR_BATCH_ROWS):
+        doc.add_paragraph("\n".join(batch))
+    skipped = sum(1 for _ in rows)
+    if skipped:
+        doc.add_paragraph(f"[{skipped} more rows not converted]")
+
+def _convert_to_docx(ext: str, source: IO[bytes], summary_rows: Optional[int] = None) -> bytes:
+    """Converts a non-PDF upload to .docx in memory; spreadsheets and decks are streamed from `source`."""
+
+    # Create a Word document
+    doc = Document()
+
+    if ext in (".csv", ".xlsx"):
+        _write_rows(doc, iter_rows(ext, source), summary_rows)
+
+    elif ext == ".docx":
+        existing_doc = Document(source)
+        for para in existing_doc.paragraphs:
+            doc.add_paragraph(para.text)
+
+    elif ext == ".pptx":
+        for line in capped(iter_pptx_lines(source)):
+            doc.add_paragraph(line)
+
+    elif ext in (".txt", ".html"):
+        doc.add_paragraph(source.read().decode("utf-8"))
+
+    elif ext == ".md":
+        md_content = source.read().decode("utf-8")
+        html_content = markdown.markdown(md_content)  # Convert MD to HTML
+        doc.add_paragraph(html_content)  # Add Markdown as plain text
+
+    else:
+        doc.add_paragraph("[Unsupported file type for conversion]")
+
+    # Save the Word document into memory
+    output_buffer = BytesIO()
+    doc.save(output_buffer)
+    return output_buffer.getvalue()
+
+async def convert_file_to_docx(file: UploadFile, summary_rows: Optional[int] = None) -> UploadFile:
+    """
+    Converts an upload to .docx without shared files on disk, so conversions can run concurrently.
+    PDFs are parsed page range by page range in the extraction processes, and the parsed
+    layout is cached by content hash; other formats are converted in memory, spreadsheets
+    row by row. Pass `summary_rows` to turn a spreadsheet into a table of its first rows.
+    """
     _, ext = os.path.splitext(file.filename.lower())
 
     try:
-        content = await file.read()
-        buffer = BytesIO(content)
-
-        # Save the uploaded file temporarily (for PDFs)
-        temp_pdf_path = "temp_input.pdf"
-        with open(temp_pdf_path, "wb") as f:
-            f.write(content)
-
-        # Create a Word document
-        doc = Document()
-
-        if ext == ".txt":
-            doc.add_paragraph(content.decode("utf-8"))
-
-        elif ext == ".csv":
-            df = pd.read_csv(buffer)
-            for row in df.itertuples(index=False):
-                doc.add_paragraph("\t".join(map(str, row)))
-
-        elif ext == ".xlsx":
-            df = pd.read_excel(buffer)
-            for row in df.itertuples(index=False):
-                doc.add_paragraph("\t".join(map(str, row)))
-
-        elif ext == ".docx":
-            existing_doc = Document(buffer)
-            for para in existing_doc.paragraphs:
-                doc.add_paragraph(para.text)
-
-        elif ext == ".pdf":
-            output_path = "converted.docx"
-
-            # Convert PDF to DOCX using pdf2docx
-            cv = Converter(temp_pdf_path)
-            cv.convert(output_path, start=0, end=None)
-            cv.close()
-
-            # Load the saved DOCX file into memory buffer
-            with open(output_path, "rb") as f:
-                output_buffer = BytesIO(f.read())
-
-            upload_file = StarletteUploadFile(filename="converted.docx", file=output_buffer)
-            
-            # Clean up temp file
-            os.remove(temp_pdf_path)
-
-            return upload_file
-
-        elif ext == ".pptx":
-            prs = Presentation(buffer)
-            for i, slide in enumerate(prs.slides):
-                doc.add_paragraph(f"Slide {i+1}")
-                for shape in slide.shapes:
-                    if hasattr(shape, "text"):
-                        doc.add_paragraph(shape.text)
-
-        elif ext == ".html":
-            doc.add_paragraph(content.decode("utf-8"))
-
-        elif ext == ".md":
-            md_content = content.decode("utf-8")
-            html_content = markdown.markdown(md_content)  # Convert MD to HTML
-            doc.add_paragraph(html_content)  # Add Markdown as plain text
-
+        if ext == ".pdf":
+            # pdf2docx reads the PDF by path, so the upload gets a file of its own for the conversion
+            async with temporary_upload(file) as (pdf_path, digest):
+                pages = await cached_pages(digest, "pdf2docx", lambda: extract_pages("pdf2docx", pdf_path))
+                content = await asyncio.to_thread(_pdf_to_docx, pdf_path, pages)
         else:
-            doc.add_paragraph("[Unsupported file type for conversion]")
-
-        # Save the Word document
-        output_path = "converted.docx"
-        doc.save(output_path)
-
-        # Load the saved file into memory buffer
-        with open(output_path, "rb") as f:
-            output_buffer = BytesIO(f.read())
+            # Read straight from the spooled upload, never whole
+            content = await asyncio.to_thread(_convert_to_docx, ext, file.file, summary_rows)
 
-        upload_file = StarletteUploadFile(filename="converted.docx", file=output_buffer)
+        upload_file = StarletteUploadFile(filename="converted.docx", file=BytesIO(content))
 
     except Exception as e:
         error_msg = f"Error converting file: {str(e)}"
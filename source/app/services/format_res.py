@@ -68,4 +68,44 @@ def format_response(text):
     html_version = re.sub(r'\n', '<br>', html_version)
     html_version = f"<p>{html_version}</p>"
     
-    return html_version #return only the html string.
\ No newline at end of file
+    return html_version #return only the html string.
+
+def _find_block_boundary(text):
+    """Returns the index of the first paragraph break that is not inside a fenced code block."""
+    start = 0
+    while True:
+        index = text.find("\n\n", start)
+        if index == -1:
+            return None
+        if text.count("```", 0, index) % 2 == 0:
+            return index
+        start = index + 2
+
+async def format_response_stream(tokens):
+    """
+    Formats a token stream paragraph by paragraph as it arrives.
+
+    Each completed block is passed through format_response, so the concatenated
+    output matches formatting the full text at once. Responses that start as JSON
+    are buffered and formatted whole, since they can't be split safely.
+    """
+    buffer = ""
+    is_json = None
+    async for token in tokens:
+        buffer += token
+        if is_json is None and buffer.strip():
+            is_json = buffer.lstrip()[0] in "{["
+        if is_json:
+            continue
+
+        while True:
+            buffer = buffer.lstrip("\n")
+            boundary = _find_block_boundary(buffer)
+            if boundary is None:
+                break
+            block, buffer = buffer[:boundary], buffer[boundary:]
+            if block.strip():
+                yield format_response(block)
+
+    if buffer.strip():
+        yield format_response(buffer)
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from fastapi import HTTPException, UploadFile, status
+from .llm_scheduler import background_priority
+from .uploads import save_upload
+from ..config import (
+    JOB_STORAGE_PATH,
+    JOB_CONCURRENCY,
+    JOB_RESULT_TTL,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_STALE_AFTER,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL
+)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+JOB_DB_PATH = os.path.join(JOB_STORAGE_PATH, "jobs.sqlite3")
+CLEANUP_INTERVAL = 60
+
+# A handler gets the job's params and an async progress(message, fraction=None) callback, and returns the result
+JobHandler = Callable[[Dict, Callable[..., Awaitable[None]]], Awaitable[Any]]
+
+_handlers: Dict[str, JobHandler] = {}
+_local = threading.local()
+_running: Dict[str, asyncio.Task] = {}  # jobs this worker is running
+_cancelling: Set[str] = set()           # ... of which a client asked to cancel these
+_tasks: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+
+def job_handler(kind: str):
+    """Registers the function that runs jobs of `kind`. Every worker imports the routes, so every worker can run any job."""
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+    return decorator
+
+def _connect() -> sqlite3.Connection:
+    """This thread's connection to the job database, which every worker shares (WAL mode, like the LLM cache)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(JOB_STORAGE_PATH, exist_ok=True)
+        conn = sqlite3.connect(JOB_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "progress TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0, worker INTEGER, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, heartbeat_at REAL, expires_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+        _local.conn = conn
+    return conn
+
+def job_dir(job_id: str) -> str:
+    """Directory holding a job's uploaded files; removed together with the job when its result expires."""
+    return os.path.join(JOB_STORAGE_PATH, job_id)
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+async def save_job_upload(job_id: str, file: UploadFile) -> str:
+    """Stores an uploaded file with the job, so the job can still run after a restart. Returns its path."""
+    folder = job_dir(job_id)
+    os.makedirs(folder, exist_ok=True)
+    file_path = os.path.join(folder, os.path.basename(file.filename))
+    try:
+        await save_upload(file, file_path)
+    except BaseException:
+        # The job is never submitted, so nothing else would clean up its folder
+        shutil.rmtree(folder, ignore_errors=True)
+        raise
+    return file_path
+
+def _insert(job_id: str, kind: str, params: Dict):
+    _connect().execute(
+        "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+        (job_id, kind, QUEUED, json.dumps(params), time.time())
+    )
+
+async def submit_job(kind: str, params: Dict, job_id: Optional[str] = None) -> Dict:
+    """Queues a job of a registered kind and returns its id; `params` must be JSON-serializable."""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job_id = job_id or new_job_id()
+    await asyncio.to_thread(_insert, job_id, kind, params)
+    if _wakeup is not None:
+        _wakeup.set()
+    return {"job_id": job_id, "status": QUEUED}
+
+def _describe(row: sqlite3.Row) -> Dict:
+    return {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "progress": json.loads(row["progress"]) if row["progress"] else None,
+        "error": row["error"],
+        "attempts": row["attempts"],
+        "cancel_requested": bool(row["cancel_requested"]),
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+        "expires_at": row["expires_at"]
+    }
+
+def _get(job_id: str) -> Optional[sqlite3.Row]:
+    row = _connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None or (row["expires_at"] is not None and row["expires_at"] < time.time()):
+        return None
+    return row
+
+async def get_job(job_id: str) -> Dict:
+    """Status and progress of a job."""
+    row = await asyncio.to_thread(_get, job_id)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found or its result has expired.")
+    return _describe(row)
+
+async def get_job_result(job_id: str) -> Any:
+    """Result of a succeeded job; 409 while it is still queued or running, or if it failed or was cancelled."""
+    row = await asyncio.to_thread(_get, job_id)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found or its result has expired.")
+    if row["status"] != SUCCEEDED:
+        detail = f"Job is {row['status']}" + (f": {row['error']}" if row["error"] else ".")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+    return json.loads(row["result"])
+
+def _finish(job_id: str, job_status: str, result: Any = None, error: Optional[str] = None):
+    now = time.time()
+    _connect().execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ?, worker = NULL "
+        "WHERE id = ? AND status IN (?, ?)",
+        (job_status, json.dumps(result, default=str) if result is not None else None, error,
+         now, now + JOB_RESULT_TTL, job_id, QUEUED, RUNNING)
+    )
+
+def _request_cancel(job_id: str):
+    conn = _connect()
+    now = time.time()
+    conn.execute(
+        "UPDATE jobs SET status = ?, finished_at = ?, expires_at = ? WHERE id = ? AND status = ?",
+        (CANCELLED, now, now + JOB_RESULT_TTL, job_id, QUEUED)
+    )
+    conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+
+async def cancel_job(job_id: str) -> Dict:
+    """
+    Cancels a job: a queued one at once, a running one as soon as the worker running it
+    notices (immediately if that is this worker, else within JOB_HEARTBEAT_INTERVAL).
+    """
+    await get_job(job_id)
+    await asyncio.to_thread(_request_cancel, job_id)
+    _cancel_local(job_id)
+    return await get_job(job_id)
+
+def _cancel_local(job_id: str):
+    task = _running.get(job_id)
+    if task is not None and not task.done():
+        _cancelling.add(job_id)
+        task.cancel()
+
+def _claim() -> Optional[sqlite3.Row]:
+    """
+    Takes the oldest queued job for this worker. Running jobs whose worker stopped sending
+    heartbeats (it crashed or was killed) are first put back in the queue, or failed once
+    they have used up JOB_MAX_ATTEMPTS.
+    """
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stale = now - JOB_STALE_AFTER
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat_at < ? AND attempts < ?",
+            (QUEUED, RUNNING, stale, JOB_MAX_ATTEMPTS)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ?, worker = NULL "
+            "WHERE status = ? AND heartbeat_at < ?",
+            (FAILED, "The worker running this job stopped too many times.", now, now + JOB_RESULT_TTL, RUNNING, stale)
+        )
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (RUNNING, os.getpid(), now, now, row["id"])
+            )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+def _requeue(job_id: str):
+    """Hands a job back to the queue when this worker shuts down; the interrupted attempt doesn't count."""
+    _connect().execute(
+        "UPDATE jobs SET status = ?, worker = NULL, attempts = MAX(attempts - 1, 0) WHERE id = ? AND status = ?",
+        (QUEUED, job_id, RUNNING)
+    )
+
+def _set_progress(job_id: str, progress: Dict):
+    _connect().execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+def _heartbeat(job_ids: List[str]) -> List[str]:
+    """Marks this worker's jobs as alive and returns those a client asked to cancel."""
+    conn = _connect()
+    placeholders = ",".join("?" for _ in job_ids)
+    conn.execute(f"UPDATE jobs SET heartbeat_at = ? WHERE id IN ({placeholders})", (time.time(), *job_ids))
+    rows = conn.execute(f"SELECT id FROM jobs WHERE id IN ({placeholders}) AND cancel_requested = 1", job_ids).fetchall()
+    return [row["id"] for row in rows]
+
+def _delete_expired():
+    conn = _connect()
+    rows = conn.execute("SELECT id FROM jobs WHERE expires_at < ?", (time.time(),)).fetchall()
+    for row in rows:
+        shutil.rmtree(job_dir(row["id"]), ignore_errors=True)
+        conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+
+async def _run_job(row: sqlite3.Row):
+    job_id = row["id"]
+
+    async def progress(message: str, fraction: Optional[float] = None):
+        await asyncio.to_thread(_set_progress, job_id, {"message": message, "fraction": fraction})
+
+    handler = _handlers.get(row["kind"])
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {row['kind']}")
+        with background_priority():
+            result = await handler(json.loads(row["params"]), progress)
+        await asyncio.to_thread(_finish, job_id, SUCCEEDED, result)
+    except asyncio.CancelledError:
+        if job_id in _cancelling:
+            await asyncio.to_thread(_finish, job_id, CANCELLED)
+        else:
+            await asyncio.to_thread(_requeue, job_id)
+            raise
+    except HTTPException as e:
+        await asyncio.to_thread(_finish, job_id, FAILED, None, str(e.detail))
+    except Exception as e:
+        print(f"Job {job_id} ({row['kind']}) failed: {e}")
+        await asyncio.to_thread(_finish, job_id, FAILED, None, f"{type(e).__name__}: {e}")
+    finally:
+        _running.pop(job_id, None)
+        _cancelling.discard(job_id)
+
+async def _runner():
+    """Runs queued jobs one at a time; JOB_CONCURRENCY of these run in each worker."""
+    while True:
+        try:
+            row = await asyncio.to_thread(_claim)
+        except sqlite3.Error as e:
+            print(f"Could not claim a job: {e}")
+            row = None
+        if row is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+        task = asyncio.create_task(_run_job(row))
+        _running[row["id"]] = task
+        # A cancelled job ends its own task, not this runner
+        await asyncio.wait({task})
+
+async def _heartbeat_loop():
+    last_cleanup = 0.0
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        try:
+            if _running:
+                for job_id in await asyncio.to_thread(_heartbeat, list(_running)):
+                    _cancel_local(job_id)
+            if time.monotonic() - last_cleanup > CLEANUP_INTERVAL:
+                await asyncio.to_thread(_delete_expired)
+                last_cleanup = time.monotonic()
+        except sqlite3.Error as e:
+            print(f"Job heartbeat failed: {e}")
+
+def start_job_workers():
+    """Starts this worker's job runners and heartbeat. Called from the app lifespan."""
+    global _wakeup
+    if _tasks:
+        return
+    _wakeup = asyncio.Event()
+    _tasks.extend(asyncio.create_task(_runner()) for _ in range(JOB_CONCURRENCY))
+    _tasks.append(asyncio.create_task(_heartbeat_loop()))
+
+async def stop_job_workers():
+    """Stops the runners; jobs still running go back to the queue for another worker or the next start."""
+    for task in _tasks:
+        task.cancel()
+    jobs = list(_running.values())
+    for task in jobs:
+        task.cancel()
+    await asyncio.gather(*_tasks, *jobs, return_exceptions=True)
+    _tasks.clear()
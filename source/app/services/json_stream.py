@@ -0,0 +1,95 @@
+import json
+import re
+from typing import Any, List, Optional
+
+class JsonArrayStream:
+    """
+    Incremental parser for a JSON array that arrives in pieces, such as LLM tokens.
+
+    `feed` returns the array elements completed by each piece, so callers can act on
+    them before the rest of the output arrives. Text before the array (a preamble, or the
+    start of a wrapping object) is skipped: with `key`, the array is the value of that key
+    (or the output itself, when it starts with `[`); without, it starts at the first `[`
+    outside a JSON string. `closed` turns True at the matching `]`. An element that is not valid JSON is dropped on its own and counted in `skipped`;
+    raw newlines and other control characters inside strings are accepted.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self._key = re.compile(r'"%s"\s*:\s*$' % re.escape(key)) if key else None
+        self._preamble = ""
+        self._preamble_in_string = False
+        self._preamble_escaped = False
+        self.started = False
+        self.closed = False
+        self.skipped = 0
+        self._item: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[Any]:
+        items = []
+        for char in text:
+            if self.closed:
+                break
+            if not self.started:
+                self.started = char == "[" and self._at_array_start()
+                if not self.started:
+                    self._skip(char)
+                continue
+            if self._in_string:
+                self._item.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if self._depth == 0 and char in ",]":
+                self._finish_item(items)
+                self.closed = char == "]"
+                continue
+            if self._depth == 0 and not self._item and char.isspace():
+                continue
+            self._item.append(char)
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth <= 0:
+                    self._depth = 0
+                    # Objects and arrays are complete at their closing bracket; no need to wait for the comma
+                    self._finish_item(items)
+        return items
+
+    def _at_array_start(self) -> bool:
+        if self._key:
+            return not self._preamble.strip() or bool(self._key.search(self._preamble))
+        return not self._preamble_in_string
+
+    def _skip(self, char: str):
+        """Follows the text before the array: the strings it is in, and enough of its end to find the key."""
+        self._preamble = self._preamble[-256:] + char
+        if self._preamble_escaped:
+            self._preamble_escaped = False
+        elif char == "\\" and self._preamble_in_string:
+            self._preamble_escaped = True
+        elif char == '"':
+            self._preamble_in_string = not self._preamble_in_string
+
+    def _finish_item(self, items: List[Any]):
+        raw = "".join(self._item).strip()
+        self._item = []
+        if not raw:
+            return
+        try:
+            items.append(json.loads(raw, strict=False))
+        except ValueError:
+            self.skipped += 1
+
+def parse_json_array(text: str, key: Optional[str] = None) -> List[Any]:
+    """Parses the first JSON array in `text` (the value of `key`, if given) with `JsonArrayStream`, skipping malformed elements."""
+    return JsonArrayStream(key).feed(text)
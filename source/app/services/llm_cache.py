@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from ..config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_TTL
+)
+
+# Only generation endpoints are worth caching; everything else is cheap or stateful
+CACHEABLE_ENDPOINTS = ("api/generate", "api/chat")
+
+# Request fields that change what Ollama generates
+KEY_FIELDS = ("model", "prompt", "messages", "system", "template", "suffix", "format", "options", "images", "raw")
+
+_local = threading.local()
+
+def _connect() -> sqlite3.Connection:
+    """
+    Returns this thread's connection to the cache database. SQLite in WAL mode lets
+    every uvicorn worker read and write the same file, and the cache survives restarts.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        _local.conn = conn
+    return conn
+
+def make_cache_key(payload: Dict) -> str:
+    """Content-addressed key: SHA-256 over the fields that determine the generation."""
+    key_data = {field: payload.get(field) for field in KEY_FIELDS if payload.get(field) is not None}
+    encoded = json.dumps(key_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def is_cacheable(endpoint: str, payload: Optional[Dict]) -> bool:
+    """Whether a request can be answered from, and stored in, the response cache."""
+    return LLM_CACHE_ENABLED and endpoint in CACHEABLE_ENDPOINTS and bool(payload)
+
+def _count(conn: sqlite3.Connection, name: str):
+    conn.execute(
+        "INSERT INTO stats (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+        (name,)
+    )
+
+def _get(key: str) -> Optional[Dict]:
+    conn = _connect()
+    now = time.time()
+    row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+    if row is None or now - row[1] > LLM_CACHE_TTL:
+        if row is not None:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        _count(conn, "misses")
+        return None
+    conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+    _count(conn, "hits")
+    return json.loads(row[0])
+
+def _evict(conn: sqlite3.Connection):
+    """Drops expired entries, then least-recently-used ones until both size bounds hold."""
+    conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - LLM_CACHE_TTL,))
+    entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+    if entries > LLM_CACHE_MAX_ENTRIES:
+        conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+            (entries - LLM_CACHE_MAX_ENTRIES,)
+        )
+    while total_bytes > LLM_CACHE_MAX_BYTES:
+        rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC LIMIT 100").fetchall()
+        if not rows:
+            break
+        conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        total_bytes -= sum(size for _, size in rows)
+
+def _set(key: str, response: Dict):
+    conn = _connect()
+    value = json.dumps(response, ensure_ascii=False)
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+        (key, value, len(value.encode("utf-8")), now, now)
+    )
+    _evict(conn)
+
+def _stats() -> Dict:
+    conn = _connect()
+    counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+    entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+    hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+    return {
+        "enabled": LLM_CACHE_ENABLED,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "entries": entries,
+        "bytes": total_bytes,
+        "max_entries": LLM_CACHE_MAX_ENTRIES,
+        "max_bytes": LLM_CACHE_MAX_BYTES,
+        "ttl_seconds": LLM_CACHE_TTL
+    }
+
+async def get_cached_response(payload: Dict) -> Optional[Dict]:
+    """Returns the cached Ollama response for this payload, or None on a miss."""
+    try:
+        return await asyncio.to_thread(_get, make_cache_key(payload))
+    except sqlite3.Error as e:
+        print(f"LLM cache read failed: {e}")
+        return None
+
+async def store_response(payload: Dict, response: Dict):
+    """Stores a completed Ollama response. The token `context` array is dropped to keep entries small."""
+    if not response.get("done", True):
+        return
+    entry = {key: value for key, value in response.items() if key != "context"}
+    try:
+        await asyncio.to_thread(_set, make_cache_key(payload), entry)
+    except sqlite3.Error as e:
+        print(f"LLM cache write failed: {e}")
+
+async def get_cache_stats() -> Dict:
+    """Hit/miss counters and size of the response cache, shared by all workers."""
+    return await asyncio.to_thread(_stats)
@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from fastapi import HTTPException, status
+from .metrics import LLM_IN_FLIGHT, LLM_QUEUED
+from ..config import LLM_MAX_CONCURRENCY, LLM_MODEL_CONCURRENCY, LLM_MAX_QUEUE_DEPTH
+
+# Priority classes: lower value is served first
+INTERACTIVE = 0
+DEFAULT = 1
+BATCH = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", DEFAULT: "default", BATCH: "batch"}
+
+# Set while running background jobs: their generations are demoted to BATCH and wait instead
+# of being rejected, since the number of jobs is already bounded by JOB_CONCURRENCY
+_background: ContextVar[bool] = ContextVar("llm_background", default=False)
+
+class QueueFullError(HTTPException):
+    """Raised when a model's queue is at LLM_MAX_QUEUE_DEPTH; surfaces as 429 with Retry-After."""
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many pending generations for model '{model}'. Please retry later.",
+            headers={"Retry-After": str(retry_after)}
+        )
+        self.retry_after = retry_after
+
+class _ModelQueue:
+    """Bounded concurrency for one model, with waiters released in priority order (FIFO within a class)."""
+
+    def __init__(self, model: str, limit: int):
+        self.model = model
+        self.limit = limit
+        self.active = 0
+        self.waiters: List[list] = []  # heap of [priority, sequence, future]
+        self.counter = itertools.count()
+        self.avg_service_seconds = 30.0
+        self.stats = {"admitted": 0, "rejected": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self.waiters if not future.done())
+
+    def retry_after(self) -> int:
+        """Rough time until a slot frees up for a new arrival, from the average service time."""
+        estimate = self.avg_service_seconds * (self.queued() + 1) / self.limit
+        return max(1, min(int(estimate), 300))
+
+    def check_capacity(self):
+        if self.active >= self.limit and self.queued() >= LLM_MAX_QUEUE_DEPTH:
+            self.stats["rejected"] += 1
+            raise QueueFullError(self.model, self.retry_after())
+
+    async def acquire(self, priority: int, check_capacity: bool = True) -> float:
+        """Waits for a slot and returns the time spent queued."""
+        if check_capacity:
+            self.check_capacity()
+        started = time.monotonic()
+        if self.active < self.limit and not self.queued():
+            self.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = [priority, next(self.counter), future]
+            heapq.heappush(self.waiters, entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # The slot was handed over just as the caller went away; pass it on
+                    self.release()
+                raise
+        waited = time.monotonic() - started
+        self.stats["admitted"] += 1
+        self.stats["wait_seconds_total"] += waited
+        self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+        return waited
+
+    def release(self, service_seconds: Optional[float] = None):
+        if service_seconds is not None:
+            self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * service_seconds
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter; `active` stays the same
+                future.set_result(None)
+                return
+        self.active -= 1
+
+_queues: Dict[str, _ModelQueue] = {}
+
+def _get_queue(model: Optional[str]) -> _ModelQueue:
+    model = model or "default"
+    queue = _queues.get(model)
+    if queue is None:
+        queue = _ModelQueue(model, LLM_MODEL_CONCURRENCY.get(model, LLM_MAX_CONCURRENCY))
+        _queues[model] = queue
+    return queue
+
+def check_admission(model: Optional[str]):
+    """Fails fast with QueueFullError when a new generation for this model would be rejected."""
+    if not _background.get():
+        _get_queue(model).check_capacity()
+
+@contextmanager
+def background_priority():
+    """Runs every generation started inside the block (and its tasks) as background work."""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+@asynccontextmanager
+async def llm_slot(model: Optional[str], priority: int = DEFAULT):
+    """
+    Holds one of the model's generation slots for the duration of the block.
+    Every call to Ollama that generates text should run inside one.
+    """
+    queue = _get_queue(model)
+    background = _background.get()
+    if background:
+        priority = max(priority, BATCH)
+    LLM_QUEUED.labels(queue.model).inc()
+    try:
+        await queue.acquire(priority, check_capacity=not background)
+    finally:
+        LLM_QUEUED.labels(queue.model).dec()
+    LLM_IN_FLIGHT.labels(queue.model).inc()
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        queue.release(time.monotonic() - started)
+        LLM_IN_FLIGHT.labels(queue.model).dec()
+
+def get_scheduler_stats() -> Dict:
+    """Per-model concurrency, queue depth and queue wait times for this worker."""
+    result = {}
+    for model, queue in _queues.items():
+        admitted = queue.stats["admitted"]
+        result[model] = {
+            "limit": queue.limit,
+            "active": queue.active,
+            "queued": queue.queued(),
+            "queued_by_priority": {
+                name: sum(1 for p, _, future in queue.waiters if p == priority and not future.done())
+                for priority, name in PRIORITY_NAMES.items()
+            },
+            "max_queue_depth": LLM_MAX_QUEUE_DEPTH,
+            "admitted": admitted,
+            "rejected": queue.stats["rejected"],
+            "wait_seconds_avg": round(queue.stats["wait_seconds_total"] / admitted, 4) if admitted else 0.0,
+            "wait_seconds_max": round(queue.stats["wait_seconds_max"], 4),
+            "service_seconds_avg": round(queue.avg_service_seconds, 2)
+        }
+    return result
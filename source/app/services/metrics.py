@@ -0,0 +1,184 @@
+import fcntl
+import functools
+import inspect
+import os
+import re
+import sqlite3
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+from ..config import METRICS_DIR, METRICS_SERVER_PID
+
+def _process_start(pid: int) -> Optional[str]:
+    """Start time of a process (Linux), to tell it from a later process that got the same pid."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+def _is_running(pid: int, start: Optional[str] = None) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return start is None or _process_start(pid) == start
+
+def _claim_metrics_dir():
+    """
+    Deletes the samples of an earlier server from METRICS_DIR, once per server: the first worker to
+    get here records the server in a marker file, and the workers after it find the server running.
+    """
+    server = [str(METRICS_SERVER_PID), _process_start(METRICS_SERVER_PID) or ""]
+    with open(os.path.join(METRICS_DIR, ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        marker = os.path.join(METRICS_DIR, ".server")
+        try:
+            with open(marker) as f:
+                previous = f.read().split()
+        except OSError:
+            previous = []
+        if previous and _is_running(int(previous[0]), previous[1] if len(previous) > 1 else None):
+            return
+        for name in os.listdir(METRICS_DIR):
+            if name.endswith(".db"):
+                os.remove(os.path.join(METRICS_DIR, name))
+        with open(marker, "w") as f:
+            f.write(" ".join(server))
+
+# prometheus_client picks its multiprocess value store at import time, from PROMETHEUS_MULTIPROC_DIR (set in config)
+os.makedirs(METRICS_DIR, exist_ok=True)
+_claim_metrics_dir()
+from prometheus_client import CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess
+from .llm_cache import get_cache_stats
+from .tracing import span, route_template
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to serve a request, up to the last byte of the response body.",
+    ["route", "method", "status"],
+    buckets=DURATION_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    "stage_duration_seconds",
+    "Time spent in one hot-path stage (extraction, indexing, LLM call, chain, diff...) of a request.",
+    ["route", "stage"],
+    buckets=DURATION_BUCKETS
+)
+LLM_IN_FLIGHT = Gauge(
+    "llm_in_flight_generations", "LLM generations holding a scheduler slot.", ["model"], multiprocess_mode="livesum"
+)
+LLM_QUEUED = Gauge(
+    "llm_queued_generations", "LLM generations waiting for a scheduler slot.", ["model"], multiprocess_mode="livesum"
+)
+FAISS_INDEXES_LOADED = Gauge(
+    "faiss_indexes_loaded", "FAISS indexes currently held in memory.", multiprocess_mode="livesum"
+)
+LLM_CACHE_ENTRIES = Gauge(
+    "llm_cache_entries", "Entries in the shared LLM response cache.", multiprocess_mode="mostrecent"
+)
+LLM_CACHE_BYTES = Gauge(
+    "llm_cache_bytes", "Size of the responses in the shared LLM response cache.", multiprocess_mode="mostrecent"
+)
+
+# Route template of the request being served; work done outside a request is labelled "background"
+_route: ContextVar[str] = ContextVar("metrics_route", default="background")
+
+@contextmanager
+def stage(name: str, activate: bool = True):
+    """
+    Times the block as stage `name` of the current route, and records it as a span of
+    the request's trace (yielded, for attributes; see `tracing.span` for `activate`).
+    """
+    started = time.perf_counter()
+    try:
+        with span(name, activate=activate) as current:
+            yield current
+    finally:
+        STAGE_DURATION.labels(_route.get(), name).observe(time.perf_counter() - started)
+
+def timed(name: str) -> Callable:
+    """Decorator form of `stage` for sync functions, coroutines and async generators."""
+    def decorator(func: Callable) -> Callable:
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with stage(name, activate=False):
+                    async for item in func(*args, **kwargs):
+                        yield item
+        elif inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with stage(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def track_index(vectorstore):
+    """Counts a FAISS index as loaded until it is garbage collected. Returns it unchanged."""
+    if vectorstore is not None:
+        FAISS_INDEXES_LOADED.inc()
+        weakref.finalize(vectorstore, FAISS_INDEXES_LOADED.dec)
+    return vectorstore
+
+class MetricsMiddleware:
+    """ASGI middleware that records request durations and sets the route label for stage timings."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = route_template(scope)
+        token = _route.set(route)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_DURATION.labels(route, scope["method"], str(status)).observe(time.perf_counter() - started)
+            _route.reset(token)
+
+async def render_metrics() -> bytes:
+    """Metrics of every worker, merged from the multiprocess directory, in Prometheus text format."""
+    try:
+        cache_stats = await get_cache_stats()
+        LLM_CACHE_ENTRIES.set(cache_stats["entries"])
+        LLM_CACHE_BYTES.set(cache_stats["bytes"])
+    except sqlite3.Error as e:
+        print(f"Could not read LLM cache size for metrics: {e}")
+    _mark_exited_workers()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+def _mark_exited_workers():
+    """Drops the live gauges of workers that exited without shutting down (crashed, killed, replaced)."""
+    for name in os.listdir(METRICS_DIR):
+        match = re.fullmatch(r"gauge_live[a-z]+_(\d+)\.db", name)
+        if match and not _is_running(int(match.group(1))):
+            multiprocess.mark_process_dead(int(match.group(1)))
+
+def mark_worker_dead():
+    """Drops this worker's live gauges (in-flight, queued, indexes) from the merged view. Called on shutdown."""
+    multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,172 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+import httpx
+from ..config import (
+    OLLAMA_BASE_URLS,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+    OLLAMA_KEEPALIVE_EXPIRY,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+    OLLAMA_RETRY_BACKOFF,
+    OLLAMA_HEALTH_CHECK_INTERVAL,
+    OLLAMA_HEALTH_CHECK_TIMEOUT,
+    OLLAMA_EJECT_AFTER_FAILURES
+)
+
+# Errors raised before a request reaches Ollama: safe to retry, on another backend if there is one.
+# The ollama client used by langchain reports refused connections as the builtin ConnectionError.
+CONNECTION_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, ConnectionError)
+
+def normalize_model_name(model: Optional[str]) -> Optional[str]:
+    """Ollama lists models with an explicit tag, so `llama3` is matched as `llama3:latest`."""
+    if model and ":" not in model:
+        return f"{model}:latest"
+    return model
+
+def _build_client(url: str) -> httpx.AsyncClient:
+    """Builds one backend's pooled async client; pool limits therefore apply per host."""
+    limits = httpx.Limits(
+        max_connections=OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections=OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY
+    )
+    timeout = httpx.Timeout(
+        connect=OLLAMA_CONNECT_TIMEOUT,
+        read=OLLAMA_READ_TIMEOUT,
+        write=OLLAMA_CONNECT_TIMEOUT,
+        pool=OLLAMA_READ_TIMEOUT
+    )
+    return httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout)
+
+class Backend:
+    """One Ollama node: its connection pool, in-flight request count and last known health."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client: Optional[httpx.AsyncClient] = None
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.models: Optional[Set[str]] = None  # None until the first successful probe
+        self.last_probe: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def get_client(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = _build_client(self.url)
+        return self.client
+
+    def has_model(self, model: Optional[str]) -> bool:
+        return model is None or self.models is None or normalize_model_name(model) in self.models
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.healthy = True
+
+    def record_failure(self, error: Exception):
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        if self.consecutive_failures >= OLLAMA_EJECT_AFTER_FAILURES:
+            self.healthy = False
+
+_backends: List[Backend] = [Backend(url) for url in OLLAMA_BASE_URLS]
+_probe_task: Optional[asyncio.Task] = None
+
+def get_backends() -> List[Backend]:
+    return _backends
+
+def pick_backend(model: Optional[str] = None, exclude: Optional[Set[str]] = None) -> Backend:
+    """
+    Least-outstanding-requests choice among healthy nodes that have `model`.
+    Falls back to any healthy node, then to every node, so a flapping health check
+    can't take the whole API down. Nodes in `exclude` (already failed for this
+    request) are skipped unless nothing else is left.
+    """
+    candidates = [backend for backend in _backends if backend.url not in (exclude or set())] or list(_backends)
+    healthy = [backend for backend in candidates if backend.healthy]
+    with_model = [backend for backend in healthy if backend.has_model(model)]
+    pool = with_model or healthy or candidates
+    fewest = min(backend.outstanding for backend in pool)
+    return random.choice([backend for backend in pool if backend.outstanding == fewest])
+
+@asynccontextmanager
+async def use_backend(model: Optional[str] = None, exclude: Optional[Set[str]] = None):
+    """Picks a backend for one request and counts it as outstanding until the block exits."""
+    backend = pick_backend(model, exclude)
+    backend.outstanding += 1
+    try:
+        yield backend
+    finally:
+        backend.outstanding -= 1
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter so workers don't retry in lockstep."""
+    return random.uniform(0, OLLAMA_RETRY_BACKOFF * (2 ** attempt))
+
+async def wait_before_retry(tried: Set[str], attempt: int):
+    """
+    Fails over to a backend this request hasn't tried yet straight away; once every
+    backend has failed, backs off with jitter and starts over.
+    """
+    if len(tried) >= len(_backends):
+        tried.clear()
+        await asyncio.sleep(retry_delay(attempt))
+
+async def probe_backend(backend: Backend):
+    """Health probe via /api/tags, which also refreshes the node's list of available models."""
+    try:
+        response = await backend.get_client().get("/api/tags", timeout=OLLAMA_HEALTH_CHECK_TIMEOUT)
+        response.raise_for_status()
+        backend.models = {model.get("name") for model in response.json().get("models", [])}
+        backend.record_success()
+    except (httpx.HTTPError, ValueError) as e:
+        backend.record_failure(e)
+        # A failed probe ejects the node right away; it rejoins on the next good probe
+        backend.healthy = False
+    finally:
+        backend.last_probe = time.time()
+
+async def probe_all_backends():
+    await asyncio.gather(*(probe_backend(backend) for backend in _backends))
+
+async def _probe_loop():
+    while True:
+        await asyncio.sleep(OLLAMA_HEALTH_CHECK_INTERVAL)
+        await probe_all_backends()
+
+async def start_backends():
+    """Runs a first health probe and starts the periodic one. Called from the app lifespan."""
+    global _probe_task
+    await probe_all_backends()
+    if _probe_task is None or _probe_task.done():
+        _probe_task = asyncio.create_task(_probe_loop())
+
+async def close_backends():
+    """Stops health probes and closes every backend's connection pool."""
+    global _probe_task
+    if _probe_task is not None:
+        _probe_task.cancel()
+        _probe_task = None
+    for backend in _backends:
+        if backend.client is not None:
+            await backend.client.aclose()
+            backend.client = None
+
+def get_backend_stats() -> List[Dict]:
+    """Health, load and model availability of each configured Ollama backend."""
+    return [
+        {
+            "url": backend.url,
+            "healthy": backend.healthy,
+            "outstanding": backend.outstanding,
+            "consecutive_failures": backend.consecutive_failures,
+            "models": sorted(backend.models) if backend.models is not None else None,
+            "last_probe": backend.last_probe,
+            "last_error": backend.last_error
+        }
+        for backend in _backends
+    ]
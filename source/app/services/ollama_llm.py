@@ -0,0 +1,97 @@
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Set, Union
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.outputs import LLMResult
+from langchain_ollama import OllamaLLM
+from ollama import AsyncClient
+from pydantic import PrivateAttr
+from ..config import OLLAMA_MAX_RETRIES, OLLAMA_KEEP_ALIVE
+from .llm_cache import make_cache_key
+from .single_flight import single_flight
+from .llm_scheduler import DEFAULT, llm_slot
+from .metrics import stage
+from .tracing import record_llm_usage
+from .ollama_backends import CONNECTION_ERRORS, Backend, use_backend, wait_before_retry
+
+class ManagedOllamaLLM(OllamaLLM):
+    """
+    OllamaLLM used by the chains and proceedings routes. Identical concurrent
+    generations (same model, prompt and options) share one in-flight Ollama call,
+    and every call waits for a slot from the scheduler at this instance's priority.
+    Async calls are sent to the least-loaded healthy backend that has the model,
+    so `base_url` only matters for the sync methods.
+
+    Only the caller that started the call receives streamed token callbacks;
+    callers that joined it get the final text.
+    """
+
+    priority: int = DEFAULT
+    """Scheduler priority class for generations made through this instance."""
+
+    keep_alive: Optional[Union[int, str]] = OLLAMA_KEEP_ALIVE
+    """How long Ollama keeps the model loaded after each call; matches the warm-up keeper."""
+
+    _backend_clients: Dict[str, AsyncClient] = PrivateAttr(default_factory=dict)
+
+    def _client_for(self, backend: Backend) -> AsyncClient:
+        client = self._backend_clients.get(backend.url)
+        if client is None:
+            client = AsyncClient(host=backend.url, **(self.client_kwargs or {}))
+            self._backend_clients[backend.url] = client
+        return client
+
+    async def _acreate_generate_stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Union[Mapping[str, Any], str]]:
+        params = self._generate_params(prompt, stop=stop, **kwargs)
+        with stage("ollama_stream", activate=False) as span:
+            async with llm_slot(self.model, self.priority):
+                tried: Set[str] = set()
+                attempt = 0
+                while True:
+                    async with use_backend(self.model, exclude=tried) as backend:
+                        started = False
+                        try:
+                            async for part in await self._client_for(backend).generate(**params):
+                                started = True
+                                if not isinstance(part, str) and part.get("done"):
+                                    record_llm_usage(span, part)
+                                yield part
+                            backend.record_success()
+                            return
+                        except CONNECTION_ERRORS as exc:
+                            backend.record_failure(exc)
+                            tried.add(backend.url)
+                            # Once tokens have reached the callbacks a retry would repeat them
+                            if started or attempt >= OLLAMA_MAX_RETRIES:
+                                raise
+                    await wait_before_retry(tried, attempt)
+                    attempt += 1
+
+    def _flight_key(self, prompt: str, stop: Optional[List[str]], **kwargs: Any) -> str:
+        params = self._generate_params(prompt, stop=stop, **kwargs)
+        return "llm:" + make_cache_key(params)
+
+    async def _agenerate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        generations = []
+        for prompt in prompts:
+            final_chunk = await single_flight(
+                self._flight_key(prompt, stop, **kwargs),
+                lambda prompt=prompt: self._astream_with_aggregation(
+                    prompt,
+                    stop=stop,
+                    run_manager=run_manager,
+                    verbose=self.verbose,
+                    **kwargs,
+                )
+            )
+            generations.append([final_chunk])
+        return LLMResult(generations=generations)
@@ -0,0 +1,56 @@
+import asyncio
+import hashlib
+from typing import Dict, List, Optional, Tuple, Union
+from fastapi import HTTPException, status
+from .extraction_cache import cached_pages, file_digest
+from .extraction_pool import extract_pages
+
+# Bounding box of a line of text: (x0, y0, x1, y1) in PDF points
+BBox = Tuple[float, float, float, float]
+
+class PdfDocument:
+    """
+    Text of one PDF, page by page and line by line, with where each line sits on its page.
+    Extraction, diffing and highlighting all read this instead of parsing the PDF again.
+    """
+
+    def __init__(self, digest: str, pages: List[Dict]):
+        self.digest = digest
+        self.pages = pages
+        self._boxes: Optional[Dict[str, List[Tuple[int, BBox]]]] = None
+
+    def page_texts(self) -> List[str]:
+        return ["\n".join(line[0] for line in page["lines"]) for page in self.pages]
+
+    def lines(self) -> List[str]:
+        return [line[0] for page in self.pages for line in page["lines"]]
+
+    def text(self) -> str:
+        return "\n".join(text for text in self.page_texts() if text)
+
+    def find_line(self, text: str) -> List[Tuple[int, BBox]]:
+        """(page number, bounding box) of every line whose text is `text`."""
+        if self._boxes is None:
+            self._boxes = {}
+            for page_num, page in enumerate(self.pages):
+                for line_text, *bbox in page["lines"]:
+                    self._boxes.setdefault(line_text, []).append((page_num, tuple(bbox)))
+        return self._boxes.get(text.strip(), [])
+
+async def load_pdf_document(source: Union[str, bytes], digest: Optional[str] = None) -> PdfDocument:
+    """
+    Builds the document model of a PDF given as bytes or a path. Models are kept in the
+    extraction cache, so a document seen by any endpoint before is not parsed again.
+    Pass the SHA-256 of the file as `digest` when it is already known.
+    """
+    try:
+        if digest is None:
+            digest = await asyncio.to_thread(
+                file_digest if isinstance(source, str) else lambda data: hashlib.sha256(data).hexdigest(), source
+            )
+        pages = await cached_pages(digest, "pymupdf", lambda: extract_pages("pymupdf", source))
+        return PdfDocument(digest, pages)
+    except (HTTPException, FileNotFoundError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Error processing PDF: {e}")
@@ -0,0 +1,35 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+# One task per key for work that is currently running in this worker
+_in_flight: Dict[str, asyncio.Task] = {}
+_stats = {"started": 0, "coalesced": 0}
+
+def _forget(key: str, task: asyncio.Task):
+    if _in_flight.get(key) is task:
+        del _in_flight[key]
+    # Mark the exception as retrieved in case every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+async def single_flight(key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Runs factory() once for all concurrent callers with the same key; later callers
+    await the result of the first one instead of starting duplicate work.
+
+    The work runs in its own task, so a caller that disconnects does not cancel it
+    for the others still waiting.
+    """
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _in_flight[key] = task
+        task.add_done_callback(lambda done, key=key: _forget(key, done))
+        _stats["started"] += 1
+    else:
+        _stats["coalesced"] += 1
+    return await asyncio.shield(task)
+
+def get_single_flight_stats() -> Dict:
+    """Calls started vs. calls that joined an identical in-flight one, for this worker."""
+    return {**_stats, "in_flight": len(_in_flight)}
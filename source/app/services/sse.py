@@ -0,0 +1,116 @@
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Dict, Optional
+import asyncio
+import json
+from .call_ollama import stream_ollama_api
+from .format_res import format_response_stream
+from .llm_cache import is_cacheable, get_cached_response, store_response
+from .llm_scheduler import DEFAULT, check_admission
+from ..config import SSE_HEARTBEAT_INTERVAL
+
+def wants_event_stream(request: Request, stream: Optional[bool] = False) -> bool:
+    """Streaming is opt-in, either with ?stream=true or an `Accept: text/event-stream` header."""
+    if stream:
+        return True
+    return "text/event-stream" in request.headers.get("accept", "")
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """Encodes one Server-Sent Event. Data is JSON so newlines in tokens survive the transport."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_error(e: Exception) -> str:
+    """Encodes an exception raised mid-stream as an `error` event."""
+    if isinstance(e, HTTPException):
+        data = {"error": e.detail, "status_code": e.status_code}
+        if e.headers and "Retry-After" in e.headers:
+            data["retry_after"] = int(e.headers["Retry-After"])
+        return sse_event(data, "error")
+    return sse_event({
+        'error': str(e),
+        'error_type': str(type(e).__name__),
+        'error_file_details': f'error on line {e.__traceback__.tb_lineno} inside {__file__}'
+    }, "error")
+
+async def _with_heartbeat(events: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Relays events from a background task and sends an SSE comment whenever nothing
+    has been produced for SSE_HEARTBEAT_INTERVAL seconds, so reverse proxies keep
+    the connection open while Ollama is still evaluating a long prompt.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def produce():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(sse_error(e))
+        finally:
+            await queue.put(finished)
+
+    producer = asyncio.create_task(produce())
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is finished:
+                break
+            yield event
+    finally:
+        # The client went away or the stream ended; stop the generation upstream too
+        producer.cancel()
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Wraps an iterator of encoded SSE events in an unbuffered streaming response."""
+    return StreamingResponse(
+        _with_heartbeat(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def stream_generation(payload: Dict, format_output: bool = True, priority: int = DEFAULT) -> StreamingResponse:
+    """
+    Streams an Ollama /api/generate call to the client as SSE.
+
+    Emits `chunk` events ({"html": ...} when formatting, {"text": ...} otherwise)
+    followed by a single `done` event carrying Ollama's generation stats. A response
+    cache hit is sent as a single chunk, and a completed stream is stored in the cache.
+    Raises QueueFullError before the response starts if the model's queue is full.
+    """
+    check_admission(payload.get("model"))
+    stats = {}
+
+    async def tokens():
+        cached = await get_cached_response(payload) if is_cacheable("api/generate", payload) else None
+        if cached is not None:
+            stats.update({key: value for key, value in cached.items() if key != "response"}, cached=True)
+            yield cached.get("response", "")
+            return
+
+        response = ""
+        async for chunk in stream_ollama_api("api/generate", payload, priority):
+            if chunk.get("done"):
+                stats.update({key: value for key, value in chunk.items() if key not in ("response", "context")})
+            if chunk.get("response"):
+                response += chunk["response"]
+                yield chunk["response"]
+        if is_cacheable("api/generate", payload):
+            await store_response(payload, {"done": False, **stats, "response": response})
+
+    async def events():
+        if format_output:
+            async for html in format_response_stream(tokens()):
+                yield sse_event({"html": html}, "chunk")
+        else:
+            async for token in tokens():
+                yield sse_event({"text": token}, "chunk")
+        yield sse_event(stats, "done")
+
+    return event_stream_response(events())
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import re
+from typing import Dict, List, Optional, Tuple
+from .call_ollama import call_ollama_api
+from .llm_scheduler import BATCH
+from .tracing import span
+from .token_budget import count_tokens, split_by_tokens, num_ctx_for
+from ..config import SUMMARY_MAX_INPUT_TOKENS, SUMMARY_CHUNK_TOKENS, SUMMARY_MAP_CONCURRENCY
+
+MAP_PROMPT = """You are a legal document specialist. Summarize the following section of a longer legal document.
+Preserve the parties, dates, amounts, obligations, clause or section numbers, citations and any legal issues it raises.
+Do not add commentary or information that is not in the section.
+
+Section:
+{chunk}
+"""
+
+REDUCE_PROMPT = """You are a legal document specialist. The following are summaries of consecutive sections of a legal document.
+Merge them into one summary, keeping every party, date, amount, obligation, citation and legal issue they mention.
+
+Summaries:
+{chunk}
+"""
+
+def needs_map_reduce(content: str, model: Optional[str] = None) -> bool:
+    """Whether the document is too long to be sent to the model in a single prompt."""
+    return count_tokens(content, model) > SUMMARY_MAX_INPUT_TOKENS
+
+def _split_oversized(paragraph: str, max_tokens: int, model: Optional[str]) -> List[Tuple[str, int]]:
+    """
+    Splits a paragraph longer than the chunk budget at sentence ends, or hard at the budget.
+    Returns (piece, tokens) pairs; each sentence is counted once and pieces add up their counts.
+    """
+    pieces, current, current_tokens = [], "", 0
+    for sentence in re.split(r"(?<=[.;:?!])\s+", paragraph):
+        tokens = count_tokens(sentence, model)
+        if tokens > max_tokens:
+            # The text before this sentence comes first; the sentence's hard-split pieces follow it
+            if current:
+                pieces.append((current, current_tokens))
+            *heads, sentence = split_by_tokens(sentence, max_tokens, model)
+            pieces.extend((head, count_tokens(head, model)) for head in heads)
+            current, current_tokens = sentence, count_tokens(sentence, model)
+        elif current and current_tokens + tokens > max_tokens:
+            pieces.append((current, current_tokens))
+            current, current_tokens = sentence, tokens
+        else:
+            current = f"{current} {sentence}" if current else sentence
+            current_tokens += tokens
+    if current:
+        pieces.append((current, current_tokens))
+    return pieces
+
+def _is_boundary(paragraph: str) -> bool:
+    return hashlib.md5(paragraph.encode("utf-8")).digest()[0] % 4 == 0
+
+def split_into_chunks(text: str, max_tokens: int = SUMMARY_CHUNK_TOKENS, model: Optional[str] = None) -> List[str]:
+    """
+    Packs paragraphs into chunks of at most `max_tokens`, adding up the counts of the
+    paragraphs (each is tokenized once). Once a chunk is half full it is also closed
+    after any paragraph whose hash picks it as a boundary, so an edit in one part of a
+    revised document only moves the chunk boundaries around that edit and the other
+    chunks (and their cached summaries) stay the same.
+    """
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph, model)
+        if tokens > max_tokens:
+            paragraphs.extend(_split_oversized(paragraph, max_tokens, model))
+        else:
+            paragraphs.append((paragraph, tokens))
+
+    chunks, current, current_tokens = [], [], 0
+    for paragraph, tokens in paragraphs:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph)
+        current_tokens += tokens
+        if current_tokens >= max_tokens // 2 and _is_boundary(paragraph):
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+async def _summarize_chunks(chunks: List[str], template: str, model: str, options: Dict) -> List[str]:
+    """
+    Summarizes chunks concurrently, at most SUMMARY_MAP_CONCURRENCY at a time for this
+    document. The prompt holds only the chunk text (no position), so the LLM response
+    cache keys each partial summary by the chunk's content and re-uploads reuse it.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_MAP_CONCURRENCY)
+
+    async def summarize(chunk: str) -> str:
+        prompt = template.format(chunk=chunk)
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {"num_ctx": num_ctx_for(count_tokens(prompt, model)), **options}
+        }
+        async with semaphore:
+            response = await call_ollama_api("api/generate", method="POST", json_data=payload, priority=BATCH)
+        return response.get("response", "").strip()
+
+    return await asyncio.gather(*(summarize(chunk) for chunk in chunks))
+
+async def condense_document(content: str, model: str, options: Optional[Dict] = None) -> str:
+    """
+    Map-reduce condensation of a long document: summarizes token-budgeted chunks in
+    parallel, then merges the partial summaries (repeatedly if needed) until they fit
+    in a single prompt. The result replaces the document text in the final analysis prompt.
+    """
+    options = options or {}
+    # Tokenizing whole documents takes a while, so it runs off the event loop
+    with span("chunking", characters=len(content)) as chunking:
+        chunks = await asyncio.to_thread(split_into_chunks, content, model=model)
+        chunking.set(chunks=len(chunks))
+    summaries = await _summarize_chunks(chunks, MAP_PROMPT, model, options)
+    combined = "\n\n".join(summaries)
+    combined_tokens = await asyncio.to_thread(count_tokens, combined, model)
+
+    while combined_tokens > SUMMARY_MAX_INPUT_TOKENS:
+        chunks = await asyncio.to_thread(split_into_chunks, combined, model=model)
+        if len(chunks) == 1:
+            break
+        summaries = await _summarize_chunks(chunks, REDUCE_PROMPT, model, options)
+        reduced = "\n\n".join(summaries)
+        reduced_tokens = await asyncio.to_thread(count_tokens, reduced, model)
+        if reduced_tokens >= combined_tokens:
+            # The model isn't shortening its input any more; stop rather than loop
+            break
+        combined, combined_tokens = reduced, reduced_tokens
+    return combined
@@ -0,0 +1,70 @@
+import itertools
+import math
+from typing import IO, Iterator, List, Optional, Union
+import openpyxl
+import pandas as pd
+from pptx import Presentation
+from ..config import TABULAR_CHUNK_ROWS, TABULAR_MAX_ROWS
+
+TABULAR_EXTENSIONS = (".csv", ".xlsx", ".pptx")
+
+Source = Union[str, IO[bytes]]
+
+def _cell(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value)
+
+def iter_csv_rows(source: Source) -> Iterator[List[str]]:
+    """
+    Header, then every row of a CSV file, read TABULAR_CHUNK_ROWS rows at a time. Cells are kept as
+    written: inferring types per chunk would turn 100 into 100.0 in chunks where the column has a gap.
+    """
+    header = True
+    for chunk in pd.read_csv(source, chunksize=TABULAR_CHUNK_ROWS, dtype=str, keep_default_na=False):
+        if header:
+            yield [str(column) for column in chunk.columns]
+            header = False
+        for row in chunk.itertuples(index=False):
+            yield [_cell(value) for value in row]
+
+def iter_xlsx_rows(source: Source) -> Iterator[List[str]]:
+    """Rows of the first sheet of a workbook, header first, streamed by openpyxl's read-only mode."""
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            cells = [_cell(value) for value in row]
+            if any(cells):
+                yield cells
+    finally:
+        workbook.close()
+
+def iter_pptx_lines(source: Source) -> Iterator[str]:
+    """A "Slide n" line per slide, followed by the text of each of its shapes."""
+    prs = Presentation(source)
+    for i, slide in enumerate(prs.slides):
+        yield f"Slide {i+1}"
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                yield shape.text
+
+def iter_rows(ext: str, source: Source) -> Iterator[List[str]]:
+    """Rows of a .csv or .xlsx file, header first."""
+    return iter_csv_rows(source) if ext == ".csv" else iter_xlsx_rows(source)
+
+def capped(rows: Iterator, max_rows: Optional[int] = None) -> Iterator:
+    """The first `max_rows` (default TABULAR_MAX_ROWS, 0: all) items of `rows`."""
+    max_rows = TABULAR_MAX_ROWS if max_rows is None else max_rows
+    return itertools.islice(rows, max_rows or None)
+
+def tabular_text(file_path: str) -> str:
+    """
+    Text of a spreadsheet (a tab-separated line per row, header first) or slide deck,
+    for the text extraction pipeline; at most TABULAR_MAX_ROWS rows or lines.
+    """
+    ext = file_path[file_path.rfind("."):].lower()
+    if ext == ".pptx":
+        lines = capped(iter_pptx_lines(file_path))
+    else:
+        lines = ("\t".join(row) for row in capped(iter_rows(ext, file_path)))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,131 @@
+import math
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+from ..config import DEFAULT_MODEL, LLM_TOKENIZERS, LLM_NUM_CTX_SIZES, LLM_OUTPUT_TOKENS
+
+TRUNCATION_MARKER = "\n[... truncated ...]"
+
+@lru_cache(maxsize=None)
+def _load_tokenizer(name: str):
+    """
+    Loads a Hugging Face `tokenizers` tokenizer from a local tokenizer.json or a hub repo id.
+    Loaded once per process; a tokenizer that can't be loaded is remembered as None.
+    """
+    try:
+        from tokenizers import Tokenizer
+        if name.endswith(".json"):
+            return Tokenizer.from_file(name)
+        return Tokenizer.from_pretrained(name)
+    except Exception as e:
+        print(f"Could not load tokenizer '{name}', falling back to estimated token counts: {e}")
+        return None
+
+def get_tokenizer(model: Optional[str] = None):
+    """Tokenizer configured for the Ollama model in LLM_TOKENIZERS, or None to use estimates."""
+    model = model or DEFAULT_MODEL
+    name = LLM_TOKENIZERS.get(model) or LLM_TOKENIZERS.get((model or "").split(":")[0])
+    return _load_tokenizer(name) if name else None
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Token count of `text` for `model`; about four characters per token when no tokenizer is configured."""
+    if not text:
+        return 0
+    tokenizer = get_tokenizer(model)
+    if tokenizer is None:
+        return len(text) // 4 + 1
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None, marker: str = TRUNCATION_MARKER) -> str:
+    """Keeps the start of `text` up to `max_tokens` tokens (marker included), marking the cut."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(marker, model))
+    tokenizer = get_tokenizer(model)
+    if tokenizer is None:
+        # Estimates are len // 4 + 1, so n tokens hold 4n - 1 characters
+        return text[:max(0, keep * 4 - 1)] + marker
+    offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+    # Text and marker can tokenize differently where they meet; give up tokens until the result fits
+    while keep and count_tokens(text[:offsets[keep - 1][1]] + marker, model) > max_tokens:
+        keep -= 1
+    end = offsets[keep - 1][1] if keep else 0
+    return text[:end] + marker
+
+def split_by_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """Cuts `text` into consecutive pieces of at most `max_tokens` tokens, tokenizing it once."""
+    tokenizer = get_tokenizer(model)
+    if tokenizer is None:
+        size = max(1, max_tokens * 4 - 1)
+        return [text[start:start + size] for start in range(0, len(text), size)]
+    offsets = tokenizer.encode(text, add_special_tokens=False).offsets
+    ends = [offsets[i][1] for i in range(max(1, max_tokens) - 1, len(offsets), max(1, max_tokens))]
+    starts = [0] + ends
+    ends = ends + [len(text)]
+    return [text[start:end] for start, end in zip(starts, ends) if text[start:end]]
+
+def num_ctx_for(prompt_tokens: int, output_tokens: int = LLM_OUTPUT_TOKENS) -> int:
+    """
+    Smallest configured context size that holds the prompt plus the expected output.
+    Ollama reloads a model whenever num_ctx changes, so sizes come from a short fixed list.
+    """
+    needed = prompt_tokens + output_tokens
+    for size in LLM_NUM_CTX_SIZES:
+        if size >= needed:
+            return size
+    return LLM_NUM_CTX_SIZES[-1]
+
+def max_prompt_tokens(output_tokens: int = LLM_OUTPUT_TOKENS) -> int:
+    """Largest prompt that still leaves room for the output in the largest context size."""
+    return LLM_NUM_CTX_SIZES[-1] - output_tokens
+
+def fit_sections(
+    sections: Dict[str, str],
+    budget: int,
+    model: Optional[str] = None,
+    priorities: Optional[Dict[str, int]] = None
+) -> Dict[str, str]:
+    """
+    Trims document sections so their total fits `budget` tokens. Sections with the
+    highest priority value are trimmed first (as with the scheduler, lower is more
+    important); sections sharing a priority are trimmed in proportion to their size.
+    """
+    counts = {name: count_tokens(text, model) for name, text in sections.items()}
+    excess = sum(counts.values()) - budget
+    if excess <= 0:
+        return dict(sections)
+
+    priorities = priorities or {}
+    fitted = dict(sections)
+    for level in sorted({priorities.get(name, 0) for name in sections}, reverse=True):
+        names = [name for name in sections if priorities.get(name, 0) == level]
+        level_tokens = sum(counts[name] for name in names)
+        if not level_tokens:
+            continue
+        cut = min(excess, level_tokens)
+        for name in names:
+            keep = counts[name] - math.ceil(cut * counts[name] / level_tokens)
+            fitted[name] = truncate_to_tokens(sections[name], keep, model) if keep > 0 else ""
+        excess -= cut
+        if excess <= 0:
+            break
+    return fitted
+
+def budget_prompt(
+    build: Callable[..., str],
+    sections: Dict[str, str],
+    model: Optional[str] = None,
+    priorities: Optional[Dict[str, int]] = None,
+    options: Optional[Dict] = None,
+    output_tokens: int = LLM_OUTPUT_TOKENS
+) -> Tuple[str, Dict]:
+    """
+    Builds a prompt with `build(**sections)`, trimming the sections by priority so the
+    prompt fits the largest context size, and returns it with Ollama options whose
+    `num_ctx` is the smallest size that fits. A num_ctx set by the caller is kept.
+    """
+    overhead = count_tokens(build(**{name: "" for name in sections}), model)
+    fitted = fit_sections(sections, max_prompt_tokens(output_tokens) - overhead, model, priorities)
+    prompt = build(**fitted)
+    options = dict(options or {})
+    options.setdefault("num_ctx", num_ctx_for(count_tokens(prompt, model), output_tokens))
+    return prompt, options
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from filelock import FileLock
+from langchain_core.callbacks import BaseCallbackHandler
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from ..config import (
+    TRACE_SLOW_THRESHOLD_MS,
+    TRACE_LOG_PATH,
+    TRACE_LOG_MAX_BYTES,
+    TRACE_LOG_BACKUPS,
+    TRACE_BUFFER_SIZE,
+    TRACE_MAX_SPANS
+)
+
+TRACE_HEADER = "X-Trace-Id"
+# Trace ids sent by a caller (e.g. a proxy) are kept if they look like ids, so traces can be joined up;
+# anything else gets a generated id, so the header never carries arbitrary text into logs and lookups
+_TRACE_ID_PATTERN = re.compile(r"[A-Za-z0-9-]{1,64}")
+
+class Span:
+    """One timed step of a request, with free-form attributes (sizes, token counts) and nested child spans."""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.end is None:
+            self.end = time.perf_counter()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict:
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration_ms(), 2),
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict(origin) for child in list(self.children)]
+        }
+
+class Trace:
+    """All spans of one HTTP request, rooted at a span named after the route."""
+
+    def __init__(self, trace_id: str, method: str, path: str, route: str):
+        self.trace_id = trace_id
+        self.method = method
+        self.path = path
+        self.route = route
+        self.status: Optional[int] = None
+        self.started_at = time.time()
+        self.root = Span(route)
+        self.span_count = 1
+        self.dropped_spans = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.root.duration_ms(), 2),
+            "dropped_spans": self.dropped_spans,
+            "root": self.root.to_dict(self.root.start)
+        }
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_span: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+# Most recent finished traces of this worker, newest last
+_recent: "OrderedDict[str, Dict]" = OrderedDict()
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.trace_id if trace else None
+
+def current_span() -> Optional[Span]:
+    return _span.get()
+
+def start_span(name: str, parent: Optional[Span] = None, **attributes) -> Span:
+    """
+    Starts a span under `parent` (default: the current span) without making it current.
+    Outside a request, or once the trace hits TRACE_MAX_SPANS, the span is timed but not recorded.
+    """
+    new_span = Span(name, attributes)
+    trace = _trace.get()
+    parent = parent or _span.get()
+    if trace is None or parent is None:
+        return new_span
+    if trace.span_count >= TRACE_MAX_SPANS:
+        trace.dropped_spans += 1
+        return new_span
+    trace.span_count += 1
+    parent.children.append(new_span)
+    return new_span
+
+@contextmanager
+def span(name: str, activate: bool = True, parent: Optional[Span] = None, **attributes):
+    """
+    Records the block as a child span and yields it, so the block can add attributes.
+    With `activate`, spans opened inside the block nest under this one. Async generators
+    must pass activate=False: a context variable set there would leak to their consumer.
+    """
+    new_span = start_span(name, parent, **attributes)
+    token = _span.set(new_span) if activate else None
+    try:
+        yield new_span
+    except BaseException as e:
+        # GeneratorExit only means a consumer stopped iterating early
+        new_span.finish(None if isinstance(e, GeneratorExit) else e)
+        raise
+    finally:
+        new_span.finish()
+        if token is not None:
+            _span.reset(token)
+
+def record_llm_usage(target: Optional[Span], response: Any):
+    """Copies model and token counts from an Ollama response (or final stream chunk) onto a span."""
+    if target is None or not response:
+        return
+    usage = {
+        "model": response.get("model"),
+        "prompt_tokens": response.get("prompt_eval_count"),
+        "output_tokens": response.get("eval_count")
+    }
+    target.set(**{key: value for key, value in usage.items() if value is not None})
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Records the retriever runs of a LangChain chain as spans under the span the chain was invoked from."""
+
+    run_inline = True
+
+    def __init__(self, parent: Optional[Span]):
+        self.parent = parent
+        self._spans: Dict[Any, Span] = {}
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._spans[run_id] = start_span("retrieval", self.parent, query_chars=len(query or ""))
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        retrieval = self._spans.pop(run_id, None)
+        if retrieval is not None:
+            retrieval.set(documents=len(documents))
+            retrieval.finish()
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        retrieval = self._spans.pop(run_id, None)
+        if retrieval is not None:
+            retrieval.finish(error)
+
+def trace_config(parent: Optional[Span] = None) -> Dict:
+    """Runnable config that adds the chain's retrieval steps to the current trace."""
+    return {"callbacks": [TraceCallbackHandler(parent or current_span())]}
+
+def route_template(scope) -> str:
+    """Path template of the route serving this request (`/api/foo/{id}`), so labels stay bounded."""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", []):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return "unmatched"
+
+def _rotate():
+    for index in range(TRACE_LOG_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{TRACE_LOG_PATH}.{index}"):
+            os.replace(f"{TRACE_LOG_PATH}.{index}", f"{TRACE_LOG_PATH}.{index + 1}")
+    if TRACE_LOG_BACKUPS > 0:
+        os.replace(TRACE_LOG_PATH, f"{TRACE_LOG_PATH}.1")
+    else:
+        os.remove(TRACE_LOG_PATH)
+
+def _write_slow_trace(record: Dict):
+    """Appends a trace to the slow-request log. The file lock keeps workers from interleaving or double-rotating."""
+    try:
+        os.makedirs(os.path.dirname(TRACE_LOG_PATH) or ".", exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with FileLock(TRACE_LOG_PATH + ".lock", timeout=10):
+            if os.path.exists(TRACE_LOG_PATH) and os.path.getsize(TRACE_LOG_PATH) + len(line) > TRACE_LOG_MAX_BYTES:
+                _rotate()
+            with open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+    except Exception as e:
+        print(f"Could not write slow trace {record.get('trace_id')}: {e}")
+
+def _finish_trace(trace: Trace):
+    record = trace.to_dict()
+    _recent[trace.trace_id] = record
+    while len(_recent) > TRACE_BUFFER_SIZE:
+        _recent.popitem(last=False)
+    if record["duration_ms"] >= TRACE_SLOW_THRESHOLD_MS:
+        print(f"Slow request: {trace.method} {trace.path} took {record['duration_ms']:.0f} ms (trace {trace.trace_id})")
+        asyncio.get_running_loop().run_in_executor(None, _write_slow_trace, record)
+
+class TracingMiddleware:
+    """ASGI middleware that opens a trace per request and returns its id in the X-Trace-Id header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace_id = Headers(scope=scope).get(TRACE_HEADER)
+        if not trace_id or not _TRACE_ID_PATTERN.fullmatch(trace_id):
+            trace_id = uuid.uuid4().hex
+        trace = Trace(trace_id, scope["method"], scope["path"], route_template(scope))
+        trace_token = _trace.set(trace)
+        span_token = _span.set(trace.root)
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                MutableHeaders(scope=message).append(TRACE_HEADER, trace_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as e:
+            trace.root.finish(e)
+            raise
+        finally:
+            trace.root.finish()
+            _span.reset(span_token)
+            _trace.reset(trace_token)
+            _finish_trace(trace)
+
+def _log_files() -> List[str]:
+    paths = [TRACE_LOG_PATH] + [f"{TRACE_LOG_PATH}.{index}" for index in range(1, TRACE_LOG_BACKUPS + 1)]
+    return [path for path in paths if os.path.exists(path)]
+
+def _read_slow_traces(limit: int, trace_id: Optional[str] = None) -> List[Dict]:
+    """Newest-first traces from the slow-request log and its rotated files, optionally only one trace id."""
+    found = []
+    for path in _log_files():
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+        for line in reversed(lines):
+            if trace_id and trace_id not in line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if trace_id and record.get("trace_id") != trace_id:
+                continue
+            found.append(record)
+            if len(found) >= limit:
+                return found
+    return found
+
+async def get_trace(trace_id: str) -> Optional[Dict]:
+    """
+    A finished trace by id: from this worker's recent traces, or from the slow-request
+    log (which every worker writes to). Fast requests served by another worker aren't found.
+    """
+    if not _TRACE_ID_PATTERN.fullmatch(trace_id):
+        return None
+    if trace_id in _recent:
+        return _recent[trace_id]
+    matches = await asyncio.to_thread(_read_slow_traces, 1, trace_id)
+    return matches[0] if matches else None
+
+async def get_slow_traces(limit: int = 20) -> List[Dict]:
+    """Summaries of the most recent slow requests of all workers, newest first."""
+    records = await asyncio.to_thread(_read_slow_traces, limit)
+    return [
+        {key: record.get(key) for key in ("trace_id", "method", "path", "route", "status", "started_at", "duration_ms")}
+        for record in records
+    ]
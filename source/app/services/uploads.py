@@ -0,0 +1,53 @@
+import hashlib
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Tuple
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+from ..config import UPLOAD_FOLDER, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+
+def _too_large(file: UploadFile) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"{file.filename} is larger than the {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB upload limit."
+    )
+
+async def save_upload(file: UploadFile, file_path: str) -> str:
+    """
+    Streams an upload to `file_path` in UPLOAD_CHUNK_SIZE pieces, hashing it on the way.
+    Returns the SHA-256 of its bytes. An upload over MAX_UPLOAD_BYTES is rejected (413)
+    before anything is written when its size is known, and as soon as it passes the limit otherwise.
+    """
+    if MAX_UPLOAD_BYTES and file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise _too_large(file)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if MAX_UPLOAD_BYTES and size > MAX_UPLOAD_BYTES:
+                    raise _too_large(file)
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return digest.hexdigest()
+
+@asynccontextmanager
+async def temporary_upload(file: UploadFile) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Saves an upload under a unique name in UPLOAD_FOLDER for the duration of the block and yields
+    (path, SHA-256). Lets a file be read by path (e.g. by the extraction processes) instead of
+    holding the whole upload in memory; the file is removed afterwards.
+    """
+    fd, file_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix=os.path.splitext(file.filename or "")[1])
+    os.close(fd)
+    try:
+        yield file_path, await save_upload(file, file_path)
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
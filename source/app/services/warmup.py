@@ -0,0 +1,105 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from langchain_community.vectorstores import FAISS
+from .ollama_backends import Backend, get_backends
+from .token_budget import count_tokens, get_tokenizer
+from .embeddings import get_embeddings, warm_embeddings
+from ..config import WARMUP_ENABLED, WARMUP_MODELS, OLLAMA_KEEP_ALIVE, OLLAMA_KEEP_ALIVE_REFRESH, OLLAMA_LOAD_TIMEOUT
+
+WARMUP_TEXTS = [
+    "The lessee shall pay the monthly rent on or before the fifth day of each month.",
+    "The appellate court set aside the decree and remanded the matter for fresh consideration.",
+    "This agreement is governed by the laws of India and subject to the jurisdiction of the courts at Mumbai."
+]
+
+# Warm-up steps of this worker: name -> {"status": "pending" | "running" | "done" | "failed", ...}
+_steps: Dict[str, Dict] = {}
+_warmup_task: Optional[asyncio.Task] = None
+_keeper_task: Optional[asyncio.Task] = None
+
+async def load_model(backend: Backend, model: str):
+    """Has one backend load `model` and keep it for OLLAMA_KEEP_ALIVE; a generate call without a prompt only loads."""
+    response = await backend.get_client().post(
+        "/api/generate",
+        json={"model": model, "keep_alive": OLLAMA_KEEP_ALIVE, "stream": False},
+        timeout=OLLAMA_LOAD_TIMEOUT
+    )
+    response.raise_for_status()
+
+async def load_model_everywhere(model: str) -> int:
+    """Loads `model` on every healthy backend that has it; returns how many loaded it."""
+    backends = [backend for backend in get_backends() if backend.healthy and backend.has_model(model)]
+    if not backends:
+        raise RuntimeError(f"No healthy Ollama backend has model '{model}'")
+    results = await asyncio.gather(*(load_model(backend, model) for backend in backends), return_exceptions=True)
+    errors = [f"{backend.url}: {result}" for backend, result in zip(backends, results) if isinstance(result, Exception)]
+    if len(errors) == len(backends):
+        raise RuntimeError("; ".join(errors))
+    return len(backends) - len(errors)
+
+def _warm_embeddings():
+    """Loads the shared embedding model (or reaches the embedding server), runs a first batch, a FAISS index build and a search."""
+    vectors = warm_embeddings(WARMUP_TEXTS)
+    index = FAISS.from_embeddings(list(zip(WARMUP_TEXTS, vectors)), get_embeddings())
+    index.similarity_search_by_vector(vectors[0], k=1)
+
+def _warm_tokenizers():
+    for model in WARMUP_MODELS:
+        if get_tokenizer(model) is None:
+            print(f"No tokenizer configured for {model} (LLM_TOKENIZERS); prompt token counts are estimated")
+        count_tokens(WARMUP_TEXTS[0], model)
+
+async def _run_step(name: str, step: Callable[[], Awaitable]):
+    _steps[name] = {"status": "running"}
+    started = time.monotonic()
+    try:
+        await step()
+        _steps[name] = {"status": "done", "seconds": round(time.monotonic() - started, 2)}
+    except Exception as e:
+        print(f"Warm-up step '{name}' failed: {e}")
+        _steps[name] = {"status": "failed", "seconds": round(time.monotonic() - started, 2), "error": str(e)}
+
+async def _warm_up():
+    steps = {f"model:{model}": (lambda model=model: load_model_everywhere(model)) for model in WARMUP_MODELS}
+    steps["embeddings"] = lambda: asyncio.to_thread(_warm_embeddings)
+    steps["tokenizers"] = lambda: asyncio.to_thread(_warm_tokenizers)
+    for name in steps:
+        _steps[name] = {"status": "pending"}
+    started = time.monotonic()
+    await asyncio.gather(*(_run_step(name, step) for name, step in steps.items()))
+    print(f"Warm-up finished in {time.monotonic() - started:.1f}s")
+
+async def _keep_models_loaded():
+    """Re-touches the warm-up models before Ollama's keep-alive runs out, so they are never unloaded while idle."""
+    while True:
+        await asyncio.sleep(OLLAMA_KEEP_ALIVE_REFRESH)
+        for model in WARMUP_MODELS:
+            try:
+                await load_model_everywhere(model)
+            except Exception as e:
+                print(f"Keep-alive refresh of model '{model}' failed: {e}")
+
+def start_warmup():
+    """
+    Starts warm-up and the keep-alive keeper in the background, so the server answers
+    the readiness probe (as not ready) while models load. Called from the app lifespan
+    once the backends have been probed.
+    """
+    global _warmup_task, _keeper_task
+    if WARMUP_ENABLED and (_warmup_task is None or _warmup_task.done()):
+        _warmup_task = asyncio.create_task(_warm_up())
+    if WARMUP_MODELS and OLLAMA_KEEP_ALIVE_REFRESH > 0 and (_keeper_task is None or _keeper_task.done()):
+        _keeper_task = asyncio.create_task(_keep_models_loaded())
+
+async def stop_warmup():
+    global _warmup_task, _keeper_task
+    for task in (_warmup_task, _keeper_task):
+        if task is not None and not task.done():
+            task.cancel()
+    _warmup_task = _keeper_task = None
+
+def get_readiness() -> Dict:
+    """Whether this worker has finished warming up, with the outcome of each step. Failed steps don't block readiness."""
+    ready = not WARMUP_ENABLED or (_warmup_task is not None and _warmup_task.done())
+    return {"ready": ready, "steps": dict(_steps), "keep_alive": OLLAMA_KEEP_ALIVE}
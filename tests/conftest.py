@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+# The app reads its settings from the environment when source.app.config is imported; give the
+# tests throwaway storage and the minimum settings an unconfigured checkout lacks.
+_storage = tempfile.mkdtemp(prefix="legal_assistant_tests_")
+for name, value in {
+    "OLLAMA_BASE_URL": "http://127.0.0.1:11434",
+    "DEFAULT_MODEL": "llama3",
+    "UPLOAD_FOLDER": os.path.join(_storage, "uploads"),
+    "FAISS_INDEX_PATH": os.path.join(_storage, "faiss"),
+    "MAX_LENGTH": "512",
+    "TEMPERATURE": "0.1",
+    "SQLALCHEMY_DATABASE_URL": f"sqlite:///{os.path.join(_storage, 'app.sqlite3')}",
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+    "LLM_CACHE_PATH": os.path.join(_storage, "llm_cache.sqlite3"),
+    "EXTRACTION_CACHE_PATH": os.path.join(_storage, "extraction_cache.sqlite3"),
+    "JOB_STORAGE_PATH": os.path.join(_storage, "jobs"),
+    "TRACE_LOG_PATH": os.path.join(_storage, "slow_traces.jsonl"),
+    "PROMETHEUS_MULTIPROC_DIR": os.path.join(_storage, "metrics"),
+    "LLM_TOKENIZERS": "",
+}.items():
+    os.environ.setdefault(name, value)
+os.makedirs(os.environ["UPLOAD_FOLDER"], exist_ok=True)
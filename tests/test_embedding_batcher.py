@@ -0,0 +1,59 @@
+import threading
+import pytest
+from source.app.services.embedding_batcher import MicroBatcher
+
+class _Model:
+    """Embeds a text as [its length]; holds the first batch until released, so later requests queue up."""
+
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.release.wait(5)
+        if "fail" in texts:
+            raise ValueError("cannot embed")
+        return [[len(text)] for text in texts]
+
+def test_queued_requests_share_one_batch_and_get_their_own_rows():
+    model = _Model()
+    batcher = MicroBatcher(model, max_items=10, wait_ms=0)
+    first = batcher.submit(["a"])
+    while not model.batches:
+        pass
+    queued = [batcher.submit(["bb", "ccc"]), batcher.submit(["dddd"]), batcher.submit(["eeeee", "ffffff"])]
+    model.release.set()
+    assert first.result(5) == [[1]]
+    assert [future.result(5) for future in queued] == [[[2], [3]], [[4]], [[5], [6]]]
+    assert model.batches == [["a"], ["bb", "ccc", "dddd", "eeeee", "ffffff"]]
+    stats = batcher.stats()
+    assert (stats["requests"], stats["batches"], stats["texts"]) == (4, 2, 6)
+
+def test_batches_stop_at_max_items():
+    model = _Model()
+    batcher = MicroBatcher(model, max_items=2, wait_ms=0)
+    first = batcher.submit(["a"])
+    while not model.batches:
+        pass
+    queued = [batcher.submit([text]) for text in ("b", "c", "d")]
+    model.release.set()
+    first.result(5)
+    for future in queued:
+        future.result(5)
+    assert model.batches == [["a"], ["b", "c"], ["d"]]
+
+def test_failure_reaches_every_request_of_the_batch():
+    model = _Model()
+    batcher = MicroBatcher(model, max_items=10, wait_ms=0)
+    first = batcher.submit(["a"])
+    while not model.batches:
+        pass
+    failing, other = batcher.submit(["fail"]), batcher.submit(["b"])
+    model.release.set()
+    first.result(5)
+    for future in (failing, other):
+        with pytest.raises(ValueError, match="cannot embed"):
+            future.result(5)
+    # The batcher keeps serving later requests
+    assert batcher.embed(["next"]) == [[4]]
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import tempfile
+import numpy as np
+import pytest
+from source.app.services import embedding_server, embeddings
+from source.app.services.embedding_client import LENGTH, RemoteEmbeddings, decode_vectors, encode_vectors
+
+def _fake_encode(texts):
+    if "fail" in texts:
+        raise ValueError("cannot embed")
+    return np.array([[len(text), i, 0.5] for i, text in enumerate(texts)], dtype=np.float32)
+
+def test_frame_round_trip():
+    vectors = np.arange(12, dtype=np.float64).reshape(4, 3) / 7
+    pieces = encode_vectors(vectors)
+    frame = b"".join(bytes(piece) for piece in pieces)
+    (length,) = LENGTH.unpack_from(frame)
+    assert length == len(frame) - LENGTH.size
+    decoded = decode_vectors(bytearray(frame[LENGTH.size:]))
+    assert decoded.dtype == np.dtype("<f4")
+    assert decoded.shape == (4, 3)
+    np.testing.assert_array_equal(decoded, vectors.astype(np.float32))
+
+def test_empty_frame_round_trip():
+    frame = b"".join(bytes(piece) for piece in encode_vectors(np.zeros((0, 5))))
+    assert decode_vectors(bytearray(frame[LENGTH.size:])).shape == (0, 5)
+
+def _with_server(monkeypatch, check):
+    """Runs the embedding server on a temporary socket (with a fake model) while `check(socket_path)` runs in a thread."""
+    monkeypatch.setattr(embedding_server, "_encode", _fake_encode)
+    socket_path = os.path.join(tempfile.mkdtemp(), "embeddings.sock")
+
+    async def run():
+        server = asyncio.create_task(embedding_server.serve(socket_path))
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        try:
+            return await asyncio.to_thread(check, socket_path)
+        finally:
+            server.cancel()
+
+    return asyncio.run(run())
+
+def test_remote_embeddings_through_the_server(monkeypatch):
+    def check(socket_path):
+        client = RemoteEmbeddings(socket_path)
+        return client.embed_vectors(["a", "bbb"]), client.embed_documents(["cc"]), client.embed_query("dddd")
+
+    vectors, documents, query = _with_server(monkeypatch, check)
+    np.testing.assert_array_equal(vectors, [[1, 0, 0.5], [3, 1, 0.5]])
+    # The langchain interface still returns plain Python lists
+    assert documents == [[2.0, 0.0, 0.5]]
+    assert query == [4.0, 0.0, 0.5]
+    assert all(type(value) is float for value in documents[0])
+
+def test_server_error_frame_is_raised(monkeypatch):
+    def check(socket_path):
+        with pytest.raises(RuntimeError, match="ValueError: cannot embed"):
+            RemoteEmbeddings(socket_path).embed_vectors(["fail"])
+
+    _with_server(monkeypatch, check)
+
+def test_unavailable_server():
+    client = RemoteEmbeddings(os.path.join(tempfile.mkdtemp(), "missing.sock"))
+    with pytest.raises(RuntimeError, match="is unavailable"):
+        client.embed_documents(["text"])
+    assert client.embed_documents([]) == []
+
+def test_faiss_index_from_server_rows(monkeypatch):
+    def check(socket_path):
+        monkeypatch.setattr(embeddings, "get_embeddings", lambda: RemoteEmbeddings(socket_path))
+        index = embeddings.build_faiss_index(["a", "bbb"], metadatas=[{"page": 1}, {"page": 2}])
+        return index.similarity_search_by_vector([3, 1, 0.5], k=1)
+
+    (document,) = _with_server(monkeypatch, check)
+    assert document.page_content == "bbb"
+    assert document.metadata == {"page": 2}
@@ -0,0 +1,60 @@
+import asyncio
+import fitz
+import openpyxl
+import pytest
+from source.app.services.extract_text import extract_text_from_file_path
+from source.app.services.tabular import capped, iter_csv_rows, tabular_text
+
+def _extract(path):
+    return asyncio.run(extract_text_from_file_path(str(path)))
+
+def _write_pdf(path, text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+
+@pytest.mark.parametrize("name", ["judgment.pdf", "Judgment.PDF"])
+def test_pdf_extension_case_is_ignored(tmp_path, name):
+    _write_pdf(tmp_path / name, "The appeal is dismissed.")
+    assert "The appeal is dismissed." in _extract(tmp_path / name)
+
+@pytest.mark.parametrize("name", ["notes.txt", "NOTES.TXT", "Readme.Md"])
+def test_text_extension_case_is_ignored(tmp_path, name):
+    (tmp_path / name).write_text("Hearing on Monday.", encoding="utf-8")
+    assert _extract(tmp_path / name) == "Hearing on Monday."
+
+def test_csv_rows_become_tab_separated_lines(tmp_path):
+    path = tmp_path / "Rent.CSV"
+    path.write_text("party,amount\nTenant,100\nLandlord,\n", encoding="utf-8")
+    assert _extract(path) == "party\tamount\nTenant\t100\nLandlord\t\n"
+
+def test_xlsx_rows_skip_empty_lines(tmp_path):
+    path = tmp_path / "book.xlsx"
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["party", "amount"])
+    sheet.append([None, None])
+    sheet.append(["Tenant", 100])
+    workbook.save(path)
+    assert tabular_text(str(path)) == "party\tamount\nTenant\t100\n"
+
+def test_csv_is_read_in_chunks_and_capped(tmp_path, monkeypatch):
+    from source.app.services import tabular
+    monkeypatch.setattr(tabular, "TABULAR_CHUNK_ROWS", 3)
+    path = tmp_path / "big.csv"
+    path.write_text("n\n" + "".join(f"{i}\n" for i in range(10)), encoding="utf-8")
+    rows = list(iter_csv_rows(str(path)))
+    assert rows == [["n"]] + [[str(i)] for i in range(10)]
+    assert len(list(capped(iter(rows), 4))) == 4
+
+def test_csv_cells_read_the_same_in_every_chunk(tmp_path, monkeypatch):
+    from source.app.services import tabular
+    monkeypatch.setattr(tabular, "TABULAR_CHUNK_ROWS", 2)
+    path = tmp_path / "gaps.csv"
+    path.write_text("amount\n1\n2\n3\n\n007\n", encoding="utf-8")
+    assert list(iter_csv_rows(str(path))) == [["amount"], ["1"], ["2"], ["3"], ["007"]]
+
+def test_unsupported_files_extract_to_nothing(tmp_path):
+    (tmp_path / "image.png").write_bytes(b"\x89PNG")
+    assert _extract(tmp_path / "image.png") == ""
@@ -0,0 +1,37 @@
+import fitz
+from source.app.services.extraction_worker import document_pages
+from source.app.services.highlight_diff import highlight_differences
+from source.app.services.pdf_document import PdfDocument
+
+def _pdf(lines, line_height):
+    doc = fitz.open()
+    page = doc.new_page()
+    for i, line in enumerate(lines):
+        page.insert_text((72, 72 + i * line_height), line, fontsize=12)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def _highlighted_lines(pdf_bytes):
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page = doc[0]
+        return sorted(
+            page.get_textbox(annot.rect).strip()
+            for annot in page.annots()
+            if annot.type[1] == "Highlight"
+        ), page.get_text()
+
+def test_highlights_next_to_redacted_lines_survive():
+    # Lines close together: the redacted line sits between two highlighted ones
+    data = _pdf(["Clause one stays.", "Clause two was removed.", "Clause three was added.", "Clause four changed."], 16)
+    _, pages = document_pages(data, 0, 1)
+    document = PdfDocument("digest", pages)
+    diff = {
+        "added": ["Clause three was added."],
+        "removed": ["Clause two was removed."],
+        "changed_lines": [{"modified": {"content": "Clause one stays."}}],
+    }
+    highlighted, text = _highlighted_lines(highlight_differences(data, diff, document))
+    assert len(highlighted) == 2
+    assert "Clause two was removed." not in text
+    assert "Clause three was added." in text
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from source.app.services import jobs
+
+@pytest.fixture(autouse=True)
+def job_store(monkeypatch, tmp_path):
+    """An empty job database of its own, and no runners left over from another test."""
+    monkeypatch.setattr(jobs, "JOB_STORAGE_PATH", str(tmp_path))
+    monkeypatch.setattr(jobs, "JOB_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "_local", threading.local())
+    monkeypatch.setattr(jobs, "_handlers", {})
+    monkeypatch.setattr(jobs, "_wakeup", None)
+    monkeypatch.setattr(jobs, "JOB_POLL_INTERVAL", 0.05)
+    yield
+    assert not jobs._tasks and not jobs._running
+
+async def _wait_for(job_id, *statuses):
+    for _ in range(200):
+        job = await jobs.get_job(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {job['status']}")
+
+def test_job_runs_and_keeps_its_result():
+    @jobs.job_handler("echo")
+    async def echo(params, progress):
+        await progress("halfway", 0.5)
+        return {"echo": params["text"]}
+
+    async def run():
+        jobs.start_job_workers()
+        try:
+            submitted = await jobs.submit_job("echo", {"text": "hello"})
+            job = await _wait_for(submitted["job_id"], jobs.SUCCEEDED)
+            return submitted, job, await jobs.get_job_result(submitted["job_id"])
+        finally:
+            await jobs.stop_job_workers()
+
+    submitted, job, result = asyncio.run(run())
+    assert submitted["status"] == jobs.QUEUED
+    assert job["progress"] == {"message": "halfway", "fraction": 0.5}
+    assert job["attempts"] == 1
+    assert result == {"echo": "hello"}
+
+def test_failed_job_reports_its_error():
+    @jobs.job_handler("broken")
+    async def broken(params, progress):
+        raise ValueError("bad input")
+
+    async def run():
+        jobs.start_job_workers()
+        try:
+            job_id = (await jobs.submit_job("broken", {}))["job_id"]
+            job = await _wait_for(job_id, jobs.FAILED)
+            with pytest.raises(HTTPException) as conflict:
+                await jobs.get_job_result(job_id)
+            return job, conflict.value
+        finally:
+            await jobs.stop_job_workers()
+
+    job, conflict = asyncio.run(run())
+    assert job["error"] == "ValueError: bad input"
+    assert conflict.status_code == 409
+
+def test_unknown_kind_and_job_are_rejected():
+    async def run():
+        with pytest.raises(ValueError):
+            await jobs.submit_job("missing", {})
+        with pytest.raises(HTTPException) as not_found:
+            await jobs.get_job("no-such-job")
+        return not_found.value
+
+    assert asyncio.run(run()).status_code == 404
+
+def test_cancelling_a_queued_job_stops_it_from_running():
+    ran = []
+
+    @jobs.job_handler("never")
+    async def never(params, progress):
+        ran.append(params)
+
+    async def run():
+        job_id = (await jobs.submit_job("never", {}))["job_id"]
+        cancelled = await jobs.cancel_job(job_id)
+        jobs.start_job_workers()
+        try:
+            await asyncio.sleep(0.2)
+        finally:
+            await jobs.stop_job_workers()
+        return cancelled, await jobs.get_job(job_id)
+
+    cancelled, job = asyncio.run(run())
+    assert cancelled["status"] == jobs.CANCELLED
+    assert job["status"] == jobs.CANCELLED
+    assert ran == []
+
+def test_cancelling_a_running_job_interrupts_it():
+    started, interrupted = asyncio.Event(), []
+
+    @jobs.job_handler("slow")
+    async def slow(params, progress):
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            interrupted.append(True)
+            raise
+
+    async def run():
+        jobs.start_job_workers()
+        try:
+            job_id = (await jobs.submit_job("slow", {}))["job_id"]
+            await asyncio.wait_for(started.wait(), 5)
+            await jobs.cancel_job(job_id)
+            return await _wait_for(job_id, jobs.CANCELLED)
+        finally:
+            await jobs.stop_job_workers()
+
+    job = asyncio.run(run())
+    assert interrupted == [True]
+    assert job["cancel_requested"]
+
+def test_shutdown_puts_running_jobs_back_in_the_queue():
+    started = asyncio.Event()
+
+    @jobs.job_handler("slow")
+    async def slow(params, progress):
+        started.set()
+        await asyncio.sleep(30)
+
+    async def run():
+        jobs.start_job_workers()
+        try:
+            job_id = (await jobs.submit_job("slow", {}))["job_id"]
+            await asyncio.wait_for(started.wait(), 5)
+        finally:
+            await jobs.stop_job_workers()
+        return await jobs.get_job(job_id)
+
+    job = asyncio.run(run())
+    assert job["status"] == jobs.QUEUED
+    # The interrupted attempt doesn't count against JOB_MAX_ATTEMPTS
+    assert job["attempts"] == 0
+
+def test_jobs_of_a_dead_worker_are_retried_then_failed(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 2)
+    jobs._insert("stuck-job", "stuck", {})
+
+    def claim_and_die():
+        row = jobs._claim()
+        # The worker stops heart-beating, as if it had been killed
+        jobs._connect().execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 3600, row["id"]))
+        return row
+
+    assert claim_and_die()["id"] == "stuck-job"
+    assert claim_and_die()["id"] == "stuck-job"
+    assert jobs._claim() is None
+    row = jobs._get("stuck-job")
+    assert row["status"] == jobs.FAILED
+    assert row["attempts"] == 2
+    assert "stopped too many times" in row["error"]
+
+def test_expired_jobs_are_deleted_with_their_files():
+    jobs._insert("old-job", "echo", {})
+    os.makedirs(jobs.job_dir("old-job"))
+    jobs._finish("old-job", jobs.SUCCEEDED, {"done": True})
+    jobs._connect().execute("UPDATE jobs SET expires_at = ? WHERE id = ?", (time.time() - 1, "old-job"))
+    jobs._delete_expired()
+    assert jobs._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 0
+    assert not os.path.exists(jobs.job_dir("old-job"))
@@ -0,0 +1,38 @@
+from source.app.services.json_stream import JsonArrayStream, parse_json_array
+
+def test_items_are_returned_as_they_complete():
+    parser = JsonArrayStream(key="changes")
+    assert parser.feed('{"changes": [{"type": "Added"') == []
+    assert parser.feed('}, {"type": "Removed"}') == [{"type": "Added"}, {"type": "Removed"}]
+    assert not parser.closed
+    assert parser.feed("]}") == []
+    assert parser.closed
+
+def test_prose_with_brackets_before_the_keyed_array_is_skipped():
+    text = 'Here are the findings (see [1] and ["a", "b"]):\n{"note": "[x]", "changes": [{"n": 1}, {"n": 2}]}'
+    parser = JsonArrayStream(key="changes")
+    assert parser.feed(text) == [{"n": 1}, {"n": 2}]
+    assert parser.skipped == 0
+
+def test_bare_array_is_accepted_with_a_key():
+    assert parse_json_array('  [{"n": 1}]', key="changes") == [{"n": 1}]
+
+def test_brackets_inside_strings_do_not_start_the_array():
+    assert parse_json_array('{"summary": "items [1] and [2]", "changes": [1, 2]}') == [1, 2]
+
+def test_key_split_across_pieces():
+    parser = JsonArrayStream(key="changes")
+    items = []
+    for piece in ['{"chan', 'ges"', ' :', ' [', '{"n"', ': 1}]']:
+        items += parser.feed(piece)
+    assert items == [{"n": 1}]
+
+def test_malformed_items_are_skipped_and_counted():
+    parser = JsonArrayStream(key="changes")
+    assert parser.feed('{"changes": [{"n": 1}, {"n": oops}, "multi\nline"]}') == [{"n": 1}, "multi\nline"]
+    assert parser.skipped == 1
+
+def test_no_array_leaves_parser_unstarted():
+    parser = JsonArrayStream(key="changes")
+    assert parser.feed("I could not find any changes [sorry].") == []
+    assert not parser.started
@@ -0,0 +1,47 @@
+import asyncio
+import io
+import os
+import pytest
+from fastapi import HTTPException, UploadFile
+from source.app.services import uploads
+from source.app.routes import legal_bot
+
+def _upload(filename, content):
+    return UploadFile(file=io.BytesIO(content.encode("utf-8")), filename=filename)
+
+def test_uploads_with_the_same_name_keep_their_own_text(monkeypatch, tmp_path):
+    monkeypatch.setattr(uploads, "UPLOAD_FOLDER", str(tmp_path))
+    files = [_upload("terms.csv", "party,amount\nTenant,100\n"), _upload("terms.csv", "party,amount\nLandlord,250\n")]
+    combined, documents = asyncio.run(legal_bot.process_uploaded_files(files))
+    assert documents == [("terms.csv", "party\tamount\nTenant\t100\n"), ("terms.csv", "party\tamount\nLandlord\t250\n")]
+    assert "Tenant\t100" in combined and "Landlord\t250" in combined
+    # Both temporary files are removed
+    assert os.listdir(tmp_path) == []
+
+def test_single_upload_is_returned_as_is():
+    combined, documents = asyncio.run(legal_bot.process_uploaded_files([_upload("only.csv", "a,b\n1,2\n")]))
+    assert combined == "a\tb\n1\t2\n"
+    assert documents is None
+
+def test_unsupported_upload_is_rejected():
+    with pytest.raises(HTTPException) as rejected:
+        asyncio.run(legal_bot.process_uploaded_files([_upload("notes.docx", "text")]))
+    assert rejected.value.status_code == 400
+
+def test_files_over_the_budget_are_compressed_pairwise(monkeypatch):
+    prompts = []
+
+    async def compress(text):
+        prompts.append(text)
+        return f"summary {len(prompts)}"
+
+    monkeypatch.setattr(legal_bot, "LEGAL_BOT_INDEX_TOKEN_BUDGET", 5)
+    monkeypatch.setattr(legal_bot, "compress_text_via_prompt", compress)
+    texts = [(f"file{n}.pdf", f"the text of file {n} " * 5) for n in range(3)]
+    combined, documents = asyncio.run(legal_bot.combine_texts(texts))
+    assert documents is None
+    # Level one pairs files 0 and 1 and leaves file 2 alone; level two merges the two results
+    assert prompts[0].startswith("--- file0.pdf ---") and "--- file1.pdf ---" in prompts[0]
+    assert prompts[1].startswith("--- file2.pdf ---")
+    assert prompts[2] in ("summary 1\n\nsummary 2", "summary 2\n\nsummary 1")
+    assert combined == "summary 3"
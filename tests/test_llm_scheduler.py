@@ -0,0 +1,120 @@
+import asyncio
+from concurrent.futures import Future
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from source.app.services import llm_scheduler
+from source.app.services.llm_scheduler import (BATCH, DEFAULT, INTERACTIVE, QueueFullError, background_priority,
+                                               check_admission, get_scheduler_stats, llm_slot)
+from source.app.services.sse import stream_generation
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    """Fresh queues with one generation slot per model and room for two waiters."""
+    monkeypatch.setattr(llm_scheduler, "_queues", {})
+    monkeypatch.setattr(llm_scheduler, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(llm_scheduler, "LLM_MODEL_CONCURRENCY", {})
+    monkeypatch.setattr(llm_scheduler, "LLM_MAX_QUEUE_DEPTH", 2)
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+async def _generate(order, release, name, priority=DEFAULT):
+    async with llm_slot("m", priority):
+        order.append(name)
+        await release.wait()
+
+def test_waiters_are_served_by_priority_then_arrival(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "LLM_MAX_QUEUE_DEPTH", 10)
+
+    async def run():
+        order, release = [], asyncio.Event()
+        tasks = []
+        for name, priority in [("holder", DEFAULT), ("batch", BATCH), ("default-1", DEFAULT),
+                               ("interactive", INTERACTIVE), ("default-2", DEFAULT)]:
+            tasks.append(asyncio.create_task(_generate(order, release, name, priority)))
+            await _settle()
+        release.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["holder", "interactive", "default-1", "default-2", "batch"]
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def run():
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_generate(order, release, name)) for name in ("holder", "first", "second")]
+        await _settle()
+        with pytest.raises(QueueFullError) as rejected:
+            check_admission("m")
+        with pytest.raises(QueueFullError):
+            async with llm_slot("m", INTERACTIVE):
+                pass
+        stats = get_scheduler_stats()["m"]
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected.value, stats, order
+
+    error, stats, order = asyncio.run(run())
+    assert error.status_code == 429
+    assert 1 <= int(error.headers["Retry-After"]) <= 300
+    assert stats["active"] == 1
+    assert stats["queued"] == 2
+    assert stats["rejected"] == 2
+    assert order == ["holder", "first", "second"]
+
+def test_background_generations_wait_instead_of_being_rejected():
+    async def run():
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_generate(order, release, name)) for name in ("holder", "first", "second")]
+        await _settle()
+        with background_priority():
+            check_admission("m")
+            background = asyncio.create_task(_generate(order, release, "background", INTERACTIVE))
+        await _settle()
+        queued = get_scheduler_stats()["m"]["queued_by_priority"]
+        release.set()
+        await asyncio.gather(*tasks, background)
+        return queued, order
+
+    queued, order = asyncio.run(run())
+    # Demoted to the batch class, so it runs after the waiters that were already there
+    assert queued == {"interactive": 0, "default": 2, "batch": 1}
+    assert order == ["holder", "first", "second", "background"]
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        order, release = [], asyncio.Event()
+        holder = asyncio.create_task(_generate(order, release, "holder"))
+        await _settle()
+        cancelled = asyncio.create_task(_generate(order, release, "cancelled"))
+        waiting = asyncio.create_task(_generate(order, release, "waiting"))
+        await _settle()
+        cancelled.cancel()
+        await _settle()
+        release.set()
+        await asyncio.gather(holder, waiting)
+        return order, get_scheduler_stats()["m"]
+
+    order, stats = asyncio.run(run())
+    assert order == ["holder", "waiting"]
+    assert stats["active"] == 0
+    assert stats["queued"] == 0
+
+def test_streaming_endpoint_answers_429_before_the_stream_starts():
+    app = FastAPI()
+
+    @app.post("/generate")
+    async def generate():
+        return stream_generation({"model": "m", "prompt": "hello"})
+
+    # A model already at its limit, with LLM_MAX_QUEUE_DEPTH generations waiting
+    queue = llm_scheduler._get_queue("m")
+    queue.active = queue.limit
+    queue.waiters = [[DEFAULT, n, Future()] for n in range(2)]
+
+    response = TestClient(app).post("/generate")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "Too many pending generations for model 'm'" in response.json()["detail"]
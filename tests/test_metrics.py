@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import pytest
+from source.app.services import metrics
+
+@pytest.fixture
+def metrics_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "METRICS_SERVER_PID", os.getpid())
+    return tmp_path
+
+@pytest.fixture(scope="module")
+def exited_pid():
+    """Pid of a process that has already exited."""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def _touch(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(b"")
+
+def test_samples_of_an_earlier_server_are_deleted(metrics_dir, exited_pid):
+    _touch(metrics_dir, "histogram_1.db", "gauge_livesum_2.db")
+    (metrics_dir / ".server").write_text(f"{exited_pid} 12345")
+    metrics._claim_metrics_dir()
+    assert not list(metrics_dir.glob("*.db"))
+    pid, start = (metrics_dir / ".server").read_text().split()
+    assert int(pid) == os.getpid()
+    assert start == metrics._process_start(os.getpid())
+
+def test_first_worker_clears_a_directory_without_marker(metrics_dir):
+    _touch(metrics_dir, "histogram_1.db")
+    metrics._claim_metrics_dir()
+    assert not list(metrics_dir.glob("*.db"))
+    assert (metrics_dir / ".server").exists()
+
+def test_later_workers_of_the_same_server_keep_the_samples(metrics_dir):
+    metrics._claim_metrics_dir()
+    _touch(metrics_dir, "histogram_1.db", "gauge_livesum_2.db")
+    metrics._claim_metrics_dir()
+    assert sorted(path.name for path in metrics_dir.glob("*.db")) == ["gauge_livesum_2.db", "histogram_1.db"]
+
+def test_reused_server_pid_is_not_mistaken_for_the_server(metrics_dir):
+    _touch(metrics_dir, "histogram_1.db")
+    # Same pid as a running process, but a different start time: the earlier server is gone
+    (metrics_dir / ".server").write_text(f"{os.getpid()} 1")
+    metrics._claim_metrics_dir()
+    assert not list(metrics_dir.glob("*.db"))
+
+def test_live_gauges_of_exited_workers_are_dropped(metrics_dir, exited_pid):
+    running = os.getpid()
+    _touch(metrics_dir, f"gauge_livesum_{exited_pid}.db", f"gauge_liveall_{exited_pid}.db",
+           f"gauge_livesum_{running}.db", f"histogram_{exited_pid}.db", f"gauge_mostrecent_{exited_pid}.db")
+    metrics._mark_exited_workers()
+    assert sorted(path.name for path in metrics_dir.glob("*.db")) == sorted([
+        f"gauge_livesum_{running}.db", f"histogram_{exited_pid}.db", f"gauge_mostrecent_{exited_pid}.db"
+    ])
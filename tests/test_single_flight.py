@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from source.app.services.single_flight import get_single_flight_stats, single_flight
+
+def _counting_factory(calls, result, release):
+    async def factory():
+        calls.append(result)
+        await release.wait()
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return factory
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        calls, release = [], asyncio.Event()
+        before = get_single_flight_stats()
+        waiters = [asyncio.create_task(single_flight("same", _counting_factory(calls, "answer", release))) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert get_single_flight_stats()["in_flight"] == before["in_flight"] + 1
+        release.set()
+        results = await asyncio.gather(*waiters)
+        after = get_single_flight_stats()
+        return calls, results, before, after
+
+    calls, results, before, after = asyncio.run(run())
+    assert calls == ["answer"]
+    assert results == ["answer"] * 5
+    assert after["started"] - before["started"] == 1
+    assert after["coalesced"] - before["coalesced"] == 4
+    assert after["in_flight"] == before["in_flight"]
+
+def test_different_keys_run_separately():
+    async def run():
+        calls, release = [], asyncio.Event()
+        release.set()
+        return calls, await asyncio.gather(
+            single_flight("first", _counting_factory(calls, 1, release)),
+            single_flight("second", _counting_factory(calls, 2, release))
+        )
+
+    calls, results = asyncio.run(run())
+    assert sorted(calls) == [1, 2]
+    assert results == [1, 2]
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def run():
+        calls, release = [], asyncio.Event()
+        first = asyncio.create_task(single_flight("shared", _counting_factory(calls, "done", release)))
+        second = asyncio.create_task(single_flight("shared", _counting_factory(calls, "unused", release)))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return calls, first, await second
+
+    calls, first, result = asyncio.run(run())
+    assert first.cancelled()
+    assert calls == ["done"]
+    assert result == "done"
+
+def test_failure_reaches_every_caller_and_is_not_kept():
+    async def run():
+        calls, release = [], asyncio.Event()
+        waiters = [asyncio.create_task(single_flight("failing", _counting_factory(calls, ValueError("boom"), release))) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        outcomes = await asyncio.gather(*waiters, return_exceptions=True)
+        # The next call after the failure starts over
+        retried = await single_flight("failing", _counting_factory(calls, "recovered", release))
+        return calls, outcomes, retried
+
+    calls, outcomes, retried = asyncio.run(run())
+    assert len(calls) == 2
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert retried == "recovered"
+
+def test_work_finishes_when_every_caller_is_cancelled():
+    async def run():
+        calls, release = [], asyncio.Event()
+        waiter = asyncio.create_task(single_flight("abandoned", _counting_factory(calls, ValueError("late"), release)))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return calls, get_single_flight_stats()
+
+    calls, stats = asyncio.run(run())
+    assert calls
+    assert stats["in_flight"] == 0
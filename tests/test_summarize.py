@@ -0,0 +1,44 @@
+import random
+import re
+from source.app.services.summarize import _split_oversized, split_into_chunks
+from source.app.services.token_budget import count_tokens
+
+def _normalized(text):
+    return re.sub(r"\s+", "", text)
+
+def test_text_before_a_hard_split_sentence_stays_first():
+    text = "Alpha short. " + "B" * 300 + " end."
+    pieces = [piece for piece, _ in _split_oversized(text, 40, None)]
+    assert pieces[0] == "Alpha short."
+    assert _normalized("".join(pieces)) == _normalized(text)
+
+def test_pieces_fit_the_budget_and_report_their_counts():
+    text = " ".join(f"Sentence number {i} is here." for i in range(200))
+    for piece, tokens in _split_oversized(text, 30, None):
+        assert tokens <= 30
+        assert count_tokens(piece) <= tokens
+
+def test_chunks_keep_the_order_and_content_of_the_document():
+    rng = random.Random(7)
+    words = ["The", "tenant", "shall", "pay.", "rent;", "Clause", "4:", "notice?"]
+    for _ in range(200):
+        paragraphs = [
+            " ".join(rng.choice(words + ["X" * rng.randint(1, 200)]) for _ in range(rng.randint(1, 80)))
+            for _ in range(rng.randint(1, 6))
+        ]
+        text = "\n\n".join(paragraphs)
+        max_tokens = rng.choice([5, 20, 60])
+        chunks = split_into_chunks(text, max_tokens)
+        assert _normalized("".join(chunks)) == _normalized(text)
+        assert all(count_tokens(chunk) <= max_tokens for chunk in chunks)
+
+def test_small_documents_are_one_chunk():
+    assert split_into_chunks("One paragraph.\n\nAnother one.", 100) == ["One paragraph.\n\nAnother one."]
+
+def test_unchanged_paragraphs_keep_their_chunks_after_an_edit():
+    paragraphs = [f"Paragraph {i} of the agreement sets out obligation {i}." for i in range(60)]
+    before = split_into_chunks("\n\n".join(paragraphs), 60)
+    paragraphs[45] = "Paragraph 45 was rewritten entirely in the revised draft."
+    after = split_into_chunks("\n\n".join(paragraphs), 60)
+    # Chunk boundaries before the edit don't move
+    assert before[:5] == after[:5]
@@ -0,0 +1,67 @@
+import pytest
+from source.app.services import token_budget
+from source.app.services.token_budget import (
+    TRUNCATION_MARKER, budget_prompt, count_tokens, fit_sections, num_ctx_for, split_by_tokens, truncate_to_tokens
+)
+
+@pytest.fixture(params=["estimate", "tokenizer"])
+def model(request, tmp_path, monkeypatch):
+    """Runs a test with estimated counts, and with a small BPE tokenizer trained for it."""
+    if request.param == "estimate":
+        return None
+    from tokenizers import Tokenizer, models, pre_tokenizers, trainers
+    tokenizer = Tokenizer(models.BPE(unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=300, special_tokens=["[UNK]"], initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    tokenizer.train_from_iterator(["The tenant shall pay rent monthly. Clause 4 applies; see section 12."] * 20, trainer)
+    path = str(tmp_path / "tokenizer.json")
+    tokenizer.save(path)
+    monkeypatch.setattr(token_budget, "LLM_TOKENIZERS", {"test-model": path})
+    assert token_budget.get_tokenizer("test-model") is not None
+    return "test-model"
+
+TEXTS = [
+    "The tenant shall pay rent monthly. " * 40,
+    "x" * 997,
+    "Clause 4 applies; see section 12.\n" * 25,
+]
+
+def test_count_tokens_estimate():
+    assert count_tokens("") == 0
+    assert count_tokens("abcd" * 10) == 11
+
+@pytest.mark.parametrize("max_tokens", [1, 2, 7, 50, 199])
+def test_truncated_text_fits_the_budget(model, max_tokens):
+    for text in TEXTS:
+        for marker in ("", TRUNCATION_MARKER):
+            truncated = truncate_to_tokens(text, max_tokens, model, marker=marker)
+            assert count_tokens(truncated, model) <= max(max_tokens, count_tokens(marker, model))
+            assert text.startswith(truncated[:len(truncated) - len(marker)])
+
+def test_text_within_budget_is_unchanged(model):
+    assert truncate_to_tokens("short", 100, model) == "short"
+
+@pytest.mark.parametrize("max_tokens", [1, 3, 16, 100])
+def test_split_by_tokens_covers_the_text(model, max_tokens):
+    for text in TEXTS:
+        pieces = split_by_tokens(text, max_tokens, model)
+        assert "".join(pieces) == text
+        if model is None:
+            assert all(count_tokens(piece) <= max_tokens for piece in pieces)
+
+def test_fit_sections_trims_lowest_priority_first():
+    sections = {"question": "q" * 40, "document": "d" * 4000}
+    fitted = fit_sections(sections, 200, priorities={"question": 0, "document": 1})
+    assert fitted["question"] == sections["question"]
+    assert sum(count_tokens(text) for text in fitted.values()) <= 200
+
+def test_budget_prompt_picks_the_smallest_context_that_fits():
+    prompt, options = budget_prompt(lambda document: f"Summarize: {document}", {"document": "word " * 100})
+    assert prompt.startswith("Summarize: word")
+    assert options["num_ctx"] == num_ctx_for(count_tokens(prompt))
+
+def test_budget_prompt_keeps_a_callers_num_ctx():
+    _, options = budget_prompt(lambda document: document, {"document": "text"}, options={"num_ctx": 1234})
+    assert options["num_ctx"] == 1234
@@ -0,0 +1,41 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from source.app.routes import system
+from source.app.services.tracing import TRACE_HEADER, TracingMiddleware
+
+def _client():
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.include_router(system.router, prefix="/api/system")
+    return TestClient(app)
+
+def test_well_formed_trace_id_is_kept():
+    response = _client().get("/ping", headers={TRACE_HEADER: "proxy-Trace-42"})
+    assert response.headers[TRACE_HEADER] == "proxy-Trace-42"
+
+@pytest.mark.parametrize("trace_id", ["x" * 65, "abc def", "abc_def", "../../etc", "abc/def", '{"a":1}'])
+def test_malformed_trace_id_is_replaced(trace_id):
+    response = _client().get("/ping", headers={TRACE_HEADER: trace_id})
+    assert response.headers[TRACE_HEADER] != trace_id
+    assert len(response.headers[TRACE_HEADER]) == 32
+
+def test_trace_endpoints_are_off_by_default():
+    client = _client()
+    assert client.get("/api/system/traces/slow").status_code == 404
+    trace_id = client.get("/ping").headers[TRACE_HEADER]
+    assert client.get(f"/api/system/traces/{trace_id}").status_code == 404
+
+def test_trace_endpoints_when_enabled(monkeypatch):
+    monkeypatch.setattr(system, "TRACE_ENDPOINTS_ENABLED", True)
+    client = _client()
+    trace_id = client.get("/ping").headers[TRACE_HEADER]
+    trace = client.get(f"/api/system/traces/{trace_id}").json()
+    assert trace["trace_id"] == trace_id
+    assert trace["path"] == "/ping"
+    assert client.get("/api/system/traces/slow").status_code == 200